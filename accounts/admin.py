@@ -9,8 +9,8 @@ admin.site.index_title = 'NexTalk Dashboard'
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
-    list_display = ['username', 'email', 'first_name', 'last_name', 'is_verified', 'is_online', 'created_at']
-    list_filter = ['is_verified', 'is_online', 'is_staff', 'is_private', 'created_at']
+    list_display = ['username', 'email', 'first_name', 'last_name', 'is_verified', 'last_seen', 'created_at']
+    list_filter = ['is_verified', 'is_staff', 'is_private', 'created_at']
     search_fields = ['username', 'email', 'first_name', 'last_name']
     ordering = ['-created_at']
 
@@ -22,6 +22,6 @@ class UserAdmin(BaseUserAdmin):
             'fields': ('followers_count', 'following_count', 'posts_count')
         }),
         ('Account Settings', {
-            'fields': ('is_private', 'is_verified', 'is_online', 'last_seen')
+            'fields': ('is_private', 'is_verified', 'last_seen')
         }),
     )
\ No newline at end of file
@@ -0,0 +1,42 @@
+"""
+Address-book matching for contact import.
+
+Clients never upload raw contacts. They send SHA-256 hex digests of the
+normalized email (trimmed, lowercased) or phone number (digits only), and
+User keeps the same digests of its own email and phone_number in indexed
+columns, so a whole address book is matched with one indexed IN lookup.
+"""
+import hashlib
+import re
+
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+
+HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def hash_value(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest() if value else ''
+
+
+def hash_email(email):
+    return hash_value((email or '').strip().lower())
+
+
+def hash_phone(phone_number):
+    return hash_value(''.join(char for char in phone_number or '' if char.isdigit()))
+
+
+def find_users(email_hashes, phone_hashes, exclude=None):
+    """Users whose email or phone number digest is among the given ones"""
+    condition = Q()
+    if email_hashes:
+        condition |= Q(email_hash__in=set(email_hashes))
+    if phone_hashes:
+        condition |= Q(phone_hash__in=set(phone_hashes))
+    if not condition:
+        return get_user_model().objects.none()
+    users = get_user_model().objects.filter(condition)
+    if exclude is not None:
+        users = users.exclude(id=exclude.id)
+    return users
@@ -0,0 +1,76 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from accounts import search
+from accounts.models import User
+
+SYLLABLES = ['an', 'be', 'ca', 'da', 'el', 'fi', 'go', 'ha', 'is', 'jo', 'ka', 'li', 'mo', 'na', 'or',
+             'pa', 'ri', 'sa', 'te', 'ul', 'va', 'wi', 'xe', 'ya', 'zo']
+
+
+class Command(BaseCommand):
+    help = 'Measures typeahead user search latency over seeded users; all data is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000000)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        first_names = sorted({self.make_name(rng, 2, 3) for _ in range(3000)})
+        last_names = sorted({self.make_name(rng, 2, 4) for _ in range(20000)})
+        backend = search.get_backend()
+
+        with transaction.atomic():
+            viewer = User.objects.create_user(
+                username='benchmark_viewer',
+                email='benchmark_viewer@example.com',
+                password='benchmark'
+            )
+
+            start = time.perf_counter()
+            for offset in range(0, options['users'], options['batch_size']):
+                users = []
+                for i in range(offset, min(offset + options['batch_size'], options['users'])):
+                    first, last = rng.choice(first_names), rng.choice(last_names)
+                    users.append(User(
+                        username=f'{first}{last[:3]}{i}',
+                        email=f'benchmark{i}@example.com',
+                        password='!',
+                        first_name=first.title(),
+                        last_name=last.title(),
+                        followers_count=int(rng.paretovariate(1.2)) - 1,
+                        is_verified=rng.random() < 0.001,
+                    ))
+                backend.index_many(User.objects.bulk_create(users))
+            self.stdout.write(f'Seeded and indexed {options["users"]} users in {time.perf_counter() - start:.1f} s')
+
+            buckets = {
+                '1-2 characters': lambda: rng.choice(first_names)[:rng.randint(1, 2)],
+                '3-5 characters': lambda: rng.choice(first_names)[:rng.randint(3, 5)],
+                'full first name': lambda: rng.choice(first_names),
+                'first + last prefix': lambda: f'{rng.choice(first_names)} {rng.choice(last_names)[:2]}',
+            }
+            for label, make_query in buckets.items():
+                timings = []
+                for _ in range(options['queries']):
+                    query = make_query()
+                    started = time.perf_counter()
+                    search.search_users(query, viewer)
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                self.stdout.write(
+                    f'{label:<20} p50 {statistics.median(timings):6.2f} ms  '
+                    f'p99 {timings[max(int(len(timings) * 0.99) - 1, 0)]:6.2f} ms'
+                )
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark data rolled back'))
+
+    def make_name(self, rng, shortest, longest):
+        return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(shortest, longest)))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='cover_photo_renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='profile_picture_renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+SQLITE_FORWARDS = [
+    "CREATE VIRTUAL TABLE accounts_user_fts USING fts5("
+    "username, name, tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')",
+    "INSERT INTO accounts_user_fts (rowid, username, name) "
+    "SELECT id, username, first_name || ' ' || last_name FROM accounts_user",
+]
+SQLITE_BACKWARDS = [
+    "DROP TABLE IF EXISTS accounts_user_fts",
+]
+POSTGRES_FORWARDS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE accounts_user ADD COLUMN search_name text GENERATED ALWAYS AS ("
+    "lower(regexp_replace(username || ' ' || first_name || ' ' || last_name, '[^[:alnum:]]+', ' ', 'g'))"
+    ") STORED",
+    "CREATE INDEX accounts_user_search_name_trgm_idx ON accounts_user USING GIN (search_name gin_trgm_ops)",
+]
+POSTGRES_BACKWARDS = [
+    "DROP INDEX IF EXISTS accounts_user_search_name_trgm_idx",
+    "ALTER TABLE accounts_user DROP COLUMN IF EXISTS search_name",
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_image_renditions'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({'sqlite': SQLITE_FORWARDS, 'postgresql': POSTGRES_FORWARDS}),
+            run_statements({'sqlite': SQLITE_BACKWARDS, 'postgresql': POSTGRES_BACKWARDS}),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:03
+
+from django.db import migrations, models
+from accounts.contacts import hash_email, hash_phone
+
+BATCH_SIZE = 5000
+
+
+def backfill_hashes(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    last_id = 0
+    while True:
+        users = list(User.objects.filter(id__gt=last_id).order_by('id').only('id', 'email', 'phone_number')[:BATCH_SIZE])
+        if not users:
+            break
+        for user in users:
+            user.email_hash = hash_email(user.email)
+            user.phone_hash = hash_phone(user.phone_number)
+        User.objects.bulk_update(users, ['email_hash', 'phone_hash'])
+        last_id = users[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_user_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='email_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='phone_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(backfill_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_contact_hashes'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='is_online',
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='last_seen',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
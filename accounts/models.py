@@ -1,8 +1,10 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from counters.models import ShardedCountersMixin
+from .contacts import hash_email, hash_phone
 
 
-class User(AbstractUser):
+class User(ShardedCountersMixin, AbstractUser):
     """Custom User model with additional fields"""
     email = models.EmailField(unique=True)
     bio = models.TextField(max_length=500, blank=True)
@@ -16,11 +18,18 @@ class User(AbstractUser):
         null=True,
         blank=True
     )
+    # Downscaled copies, filled by social_backend.renditions
+    profile_picture_renditions = models.JSONField(default=dict, blank=True)
+    cover_photo_renditions = models.JSONField(default=dict, blank=True)
     date_of_birth = models.DateField(null=True, blank=True)
     location = models.CharField(max_length=100, blank=True)
     website = models.URLField(max_length=200, blank=True)
     phone_number = models.CharField(max_length=15, blank=True)
 
+    # SHA-256 of the normalized email and phone number, for contact import (see accounts.contacts)
+    email_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    phone_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+
     # Social stats
     followers_count = models.IntegerField(default=0)
     following_count = models.IntegerField(default=0)
@@ -29,12 +38,14 @@ class User(AbstractUser):
     # Account settings
     is_private = models.BooleanField(default=False)
     is_verified = models.BooleanField(default=False)
-    is_online = models.BooleanField(default=False)
-    last_seen = models.DateTimeField(auto_now=True)
+    # Online status lives in the cache (accounts.presence), which flushes last_seen here in batches
+    last_seen = models.DateTimeField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    counter_fields = ('followers_count', 'following_count', 'posts_count')
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
@@ -46,5 +57,18 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        self.email_hash = hash_email(self.email)
+        self.phone_hash = hash_phone(self.phone_number)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'email' in update_fields:
+                update_fields.add('email_hash')
+            if 'phone_number' in update_fields:
+                update_fields.add('phone_hash')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
     def get_full_name(self):
         return f"{self.first_name} {self.last_name}".strip() or self.username
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+User presence, kept in the cache instead of the users table.
+
+ChatConsumer reports socket connects, disconnects and heartbeats. A user is
+online while their presence:online key exists. It counts the user's open
+sockets, so closing one tab keeps them online while another is connected,
+and every heartbeat renews it for PRESENCE_TTL seconds: a client that
+vanishes without closing its socket drops offline on its own.
+
+last_seen lives in the cache too and reaches User.last_seen in coalesced
+batches. Touches collect in a per-process buffer that a background task
+flushes every PRESENCE_FLUSH_SECONDS with one bulk UPDATE, however many
+heartbeats arrived. A crash loses at most that window of last_seen updates,
+and the cached values still cover it until they expire.
+
+get_presence() answers for a batch of users with one cache round trip,
+plus one query for users whose cached last_seen has expired.
+
+Every process must see the same presence keys, so the default cache has to
+be shared (Redis via REDIS_URL). With DEBUG off, startup fails on a
+per-process cache instead of reporting different state from each worker.
+"""
+import asyncio
+import logging
+import threading
+import weakref
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MAX_IDS = 200
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+_pending = {}  # {user_id: last_seen} not yet written to the users table
+_pending_lock = threading.Lock()
+_flushers = weakref.WeakKeyDictionary()  # one flush task per event loop
+
+
+def check_shared_cache():
+    """Raise ImproperlyConfigured unless the default cache is shared between processes"""
+    backend = settings.CACHES[DEFAULT_CACHE_ALIAS]['BACKEND']
+    if backend in PROCESS_LOCAL_BACKENDS:
+        raise ImproperlyConfigured(
+            f'Presence needs a cache shared by all processes, but the default cache is {backend}; set REDIS_URL'
+        )
+
+
+def online_key(user_id):
+    return f'presence:online:{user_id}'
+
+
+def last_seen_key(user_id):
+    return f'presence:seen:{user_id}'
+
+
+def touch(user_id):
+    now = timezone.now()
+    cache.set(last_seen_key(user_id), now, settings.PRESENCE_LAST_SEEN_TIMEOUT)
+    with _pending_lock:
+        _pending[user_id] = now
+
+
+def connect(user_id):
+    key = online_key(user_id)
+    cache.add(key, 0, settings.PRESENCE_TTL)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.set(key, 1, settings.PRESENCE_TTL)
+    touch(user_id)
+
+
+def heartbeat(user_id):
+    if not cache.touch(online_key(user_id), settings.PRESENCE_TTL):
+        # The key expired (missed heartbeats) while the socket stayed open
+        cache.set(online_key(user_id), 1, settings.PRESENCE_TTL)
+    touch(user_id)
+
+
+def disconnect(user_id):
+    key = online_key(user_id)
+    try:
+        remaining = cache.decr(key)
+    except ValueError:
+        remaining = 0
+    if remaining <= 0:
+        cache.delete(key)
+    touch(user_id)
+
+
+def set_offline(user_id):
+    """Logout: offline on every socket, with last_seen written straight away"""
+    now = timezone.now()
+    cache.delete(online_key(user_id))
+    cache.set(last_seen_key(user_id), now, settings.PRESENCE_LAST_SEEN_TIMEOUT)
+    with _pending_lock:
+        _pending.pop(user_id, None)
+    get_user_model().objects.filter(id=user_id).update(last_seen=now)
+
+
+def get_presence(user_ids):
+    """{user_id: {'is_online': bool, 'last_seen': datetime or None}}"""
+    user_ids = list(dict.fromkeys(user_ids))
+    cached = cache.get_many(
+        [online_key(user_id) for user_id in user_ids] + [last_seen_key(user_id) for user_id in user_ids]
+    )
+    presence = {
+        user_id: {
+            'is_online': cached.get(online_key(user_id), 0) > 0,
+            'last_seen': cached.get(last_seen_key(user_id)),
+        }
+        for user_id in user_ids
+    }
+
+    missing = [user_id for user_id in user_ids if presence[user_id]['last_seen'] is None]
+    if missing:
+        for user_id, last_seen in get_user_model().objects.filter(
+            id__in=missing
+        ).values_list('id', 'last_seen'):
+            presence[user_id]['last_seen'] = last_seen
+    return presence
+
+
+def flush():
+    """Write buffered last_seen times with one bulk UPDATE; returns the number of users written"""
+    global _pending
+    with _pending_lock:
+        pending, _pending = _pending, {}
+    if not pending:
+        return 0
+
+    User = get_user_model()
+    try:
+        User.objects.bulk_update(
+            [User(id=user_id, last_seen=last_seen) for user_id, last_seen in pending.items()],
+            ['last_seen'],
+            batch_size=500
+        )
+    except Exception:
+        with _pending_lock:
+            # Keep them for the next flush; touches since then are newer
+            for user_id, last_seen in pending.items():
+                _pending.setdefault(user_id, last_seen)
+        raise
+    return len(pending)
+
+
+async def run_flusher():
+    while True:
+        await asyncio.sleep(settings.PRESENCE_FLUSH_SECONDS)
+        try:
+            await database_sync_to_async(flush)()
+        except Exception:
+            logger.exception('Flushing last_seen failed; will retry')
+
+
+def start_flusher():
+    """Start this event loop's flush task unless it is already running"""
+    loop = asyncio.get_running_loop()
+    task = _flushers.get(loop)
+    if task is None or task.done():
+        _flushers[loop] = loop.create_task(run_flusher())
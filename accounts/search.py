@@ -0,0 +1,178 @@
+"""
+Typeahead user search.
+
+Usernames and names are normalized into a per-database search index:
+
+- SQLite: an FTS5 table (accounts_user_fts) with prefix indexes, kept
+  current by the post_save/post_delete signals in accounts.signals.
+- PostgreSQL: a generated lowercase search_name column with a pg_trgm GIN
+  index, kept current by the database itself.
+
+Every query token must prefix-match a token of the username or name. The
+index returns at most USER_SEARCH_MAX_CANDIDATES matches (the newest ones
+for very broad prefixes), plus the user whose username is exactly the query,
+looked up through the unique username index when the candidates were cut
+off. They are ranked in Python by match quality, the viewer's friendships,
+is_verified and followers_count.
+"""
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Q
+from friends.models import FriendEdge
+
+TOKEN_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+# Match quality tiers
+EXACT_USERNAME = 4
+USERNAME_PREFIX = 3
+NAME_PREFIX = 2
+TOKEN_PREFIX = 1
+
+# Columns each backend returns per candidate, in this order
+CANDIDATE_FIELDS = ('id', 'username', 'first_name', 'last_name', 'is_verified', 'followers_count')
+RESULT_FIELDS = ('id', 'username', 'profile_picture', 'profile_picture_renditions', 'is_verified')
+
+
+def normalize(value):
+    return ' '.join(TOKEN_RE.findall(value.lower()))
+
+
+class UserSearchBackend:
+    """Finds candidate users whose username or name tokens start with every query token"""
+
+    def index(self, user):
+        self.index_many([user])
+
+    def index_many(self, users):
+        pass
+
+    def remove(self, user_id):
+        pass
+
+    def get_candidates(self, tokens, limit):
+        """Up to `limit` matching users as CANDIDATE_FIELDS tuples, newest first"""
+        raise NotImplementedError
+
+    def run(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class SQLiteFTSBackend(UserSearchBackend):
+
+    def index_many(self, users):
+        with connection.cursor() as cursor:
+            cursor.executemany('DELETE FROM accounts_user_fts WHERE rowid = %s', [[user.id] for user in users])
+            cursor.executemany(
+                'INSERT INTO accounts_user_fts (rowid, username, name) VALUES (%s, %s, %s)',
+                [[user.id, user.username, f'{user.first_name} {user.last_name}'] for user in users]
+            )
+
+    def remove(self, user_id):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM accounts_user_fts WHERE rowid = %s', [user_id])
+
+    def get_candidates(self, tokens, limit):
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        columns = ', '.join(f'u.{field}' for field in CANDIDATE_FIELDS)
+        return self.run(f'''
+            SELECT {columns} FROM accounts_user_fts
+            JOIN accounts_user u ON u.id = accounts_user_fts.rowid
+            WHERE accounts_user_fts MATCH %s
+            ORDER BY accounts_user_fts.rowid DESC LIMIT %s
+        ''', [match, limit])
+
+
+class PostgresTrigramBackend(UserSearchBackend):
+
+    def get_candidates(self, tokens, limit):
+        conditions, params = [], []
+        for token in tokens:
+            # Start of the column or of any word in it; both patterns use the trigram index
+            conditions.append("(search_name LIKE %s OR search_name LIKE %s)")
+            params += [f'{token}%', f'% {token}%']
+        return self.run(
+            f'SELECT {", ".join(CANDIDATE_FIELDS)} FROM accounts_user '
+            f'WHERE {" AND ".join(conditions)} ORDER BY id DESC LIMIT %s',
+            params + [limit]
+        )
+
+
+class FallbackBackend(UserSearchBackend):
+    """Unindexed icontains scan for databases without a search index"""
+
+    def get_candidates(self, tokens, limit):
+        condition = Q()
+        for token in tokens:
+            condition &= (
+                Q(username__icontains=token) | Q(first_name__icontains=token) | Q(last_name__icontains=token)
+            )
+        return list(
+            get_user_model().objects.filter(condition).order_by('-id').values_list(*CANDIDATE_FIELDS)[:limit]
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresTrigramBackend,
+}
+
+
+def get_backend():
+    return BACKENDS.get(connection.vendor, FallbackBackend)()
+
+
+def match_quality(query, username, first_name, last_name):
+    username = normalize(username)
+    if username == query:
+        return EXACT_USERNAME
+    if username.startswith(query):
+        return USERNAME_PREFIX
+    if normalize(f'{first_name} {last_name}').startswith(query):
+        return NAME_PREFIX
+    return TOKEN_PREFIX
+
+
+def get_exact_candidates(raw_query):
+    """CANDIDATE_FIELDS rows of users named exactly as typed (or lowercased), via the unique index"""
+    username = raw_query.strip()
+    return list(get_user_model().objects.filter(
+        username__in={username, username.lower()}
+    ).values_list(*CANDIDATE_FIELDS))
+
+
+def get_friend_ids(user):
+    return set(FriendEdge.objects.filter(user=user).values_list('friend_id', flat=True))
+
+
+def search_users(query, viewer, limit=10, boost_friends=True):
+    """Ranked users (loaded with RESULT_FIELDS only) matching a typeahead query"""
+    raw_query, query = query, normalize(query)
+    if not query:
+        return []
+
+    candidates = list(get_backend().get_candidates(query.split(), settings.USER_SEARCH_MAX_CANDIDATES))
+    if len(candidates) >= settings.USER_SEARCH_MAX_CANDIDATES and not any(
+        normalize(row[1]) == query for row in candidates
+    ):
+        # Broad prefixes keep only the newest matches; an older exact username must still win
+        candidates += get_exact_candidates(raw_query)
+    if not candidates:
+        return []
+
+    friend_ids = get_friend_ids(viewer) if boost_friends else set()
+    boost = settings.USER_SEARCH_FRIEND_BOOST
+    candidates.sort(key=lambda row: (
+        match_quality(query, *row[1:4]) + (boost if row[0] in friend_ids else 0),
+        row[4],
+        row[5],
+        -row[0],
+    ), reverse=True)
+
+    ranked_ids = [row[0] for row in candidates[:limit]]
+    users = get_user_model().objects.only(*RESULT_FIELDS).in_bulk(ranked_ids)
+    return [users[user_id] for user_id in ranked_ids if user_id in users]
@@ -1,18 +1,37 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import models
 from django.contrib.auth.password_validation import validate_password
+from counters.serializers import ShardedCountersSerializerMixin, ShardedCountersListSerializer
+from friends.relationships import RelationshipListSerializer, RelationshipSerializerMixin
+from social_backend.renditions import rendition_urls
+from . import presence
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserListSerializer(RelationshipListSerializer, ShardedCountersListSerializer):
+    """Batches pending counters, viewer relationships and presence for a list of users"""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.Manager) else data)
+        self.context['presence'] = presence.get_presence([item.id for item in items])
+        return super().to_representation(items)
+
+
+class UserSerializer(RelationshipSerializerMixin, ShardedCountersSerializerMixin, serializers.ModelSerializer):
     """Serializer for User model"""
+    profile_picture_renditions = serializers.SerializerMethodField()
+    cover_photo_renditions = serializers.SerializerMethodField()
+    is_online = serializers.SerializerMethodField()
+    last_seen = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = [
             'id', 'username', 'email', 'first_name', 'last_name',
-            'bio', 'profile_picture', 'cover_photo', 'date_of_birth',
+            'bio', 'profile_picture', 'profile_picture_renditions',
+            'cover_photo', 'cover_photo_renditions', 'date_of_birth',
             'location', 'website', 'phone_number', 'followers_count',
             'following_count', 'posts_count', 'is_private', 'is_verified',
             'is_online', 'last_seen', 'created_at'
@@ -21,6 +40,27 @@ class UserSerializer(serializers.ModelSerializer):
             'id', 'followers_count', 'following_count', 'posts_count',
             'is_verified', 'is_online', 'last_seen', 'created_at'
         ]
+        list_serializer_class = UserListSerializer
+
+    def get_profile_picture_renditions(self, obj):
+        return rendition_urls(User._meta.get_field('profile_picture'), obj.profile_picture_renditions, self.context.get('request'))
+
+    def get_cover_photo_renditions(self, obj):
+        return rendition_urls(User._meta.get_field('cover_photo'), obj.cover_photo_renditions, self.context.get('request'))
+
+    def get_presence(self, obj):
+        # List serializers look up the whole page at once
+        found = self.context.get('presence') or {}
+        if obj.id not in found:
+            found = presence.get_presence([obj.id])
+        return found[obj.id]
+
+    def get_is_online(self, obj):
+        return self.get_presence(obj)['is_online']
+
+    def get_last_seen(self, obj):
+        last_seen = self.get_presence(obj)['last_seen']
+        return serializers.DateTimeField().to_representation(last_seen) if last_seen else None
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -63,9 +103,14 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         ]
 
 
-class UserMinimalSerializer(serializers.ModelSerializer):
+class UserMinimalSerializer(RelationshipSerializerMixin, serializers.ModelSerializer):
     """Minimal user info for nested serializers"""
+    profile_picture_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ['id', 'username', 'profile_picture', 'is_verified']
\ No newline at end of file
+        fields = ['id', 'username', 'profile_picture', 'profile_picture_renditions', 'is_verified']
+        list_serializer_class = RelationshipListSerializer
+
+    def get_profile_picture_renditions(self, obj):
+        return rendition_urls(User._meta.get_field('profile_picture'), obj.profile_picture_renditions, self.context.get('request'))
\ No newline at end of file
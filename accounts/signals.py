@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import search
+from .models import User
+
+SEARCH_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, created, update_fields=None, **kwargs):
+    # Saves that only touch other columns (login timestamps, counters) leave the index alone
+    if created or update_fields is None or SEARCH_FIELDS & set(update_fields):
+        search.get_backend().index(instance)
+
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance, **kwargs):
+    search.get_backend().remove(instance.id)
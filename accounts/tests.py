@@ -1,3 +1,152 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from friends.models import Friendship
+from . import presence
+from .models import User
 
-# Create your tests here.
+
+class UserSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='pass1234')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def create(self, username, first_name='', last_name='', **extra):
+        return User.objects.create_user(
+            username=username, email=f'{username}@example.com', password='pass1234',
+            first_name=first_name, last_name=last_name, **extra
+        )
+
+    def search(self, query, **params):
+        response = self.client.get('/api/auth/users/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [user['username'] for user in response.data['results']]
+
+    def test_ranked_by_match_quality_then_popularity(self):
+        self.create('annie_k', 'Zoe', 'Annison')
+        self.create('zed', 'Ann', 'Lee')
+        self.create('ann_popular', followers_count=500)
+        self.create('ann_verified', is_verified=True)
+        self.create('ann')
+        self.assertEqual(self.search('ann'), ['ann', 'ann_verified', 'ann_popular', 'annie_k', 'zed'])
+
+    def test_all_tokens_must_prefix_match(self):
+        self.create('jdoe', 'John', 'Doe')
+        self.create('jsmith', 'John', 'Smith')
+        self.assertEqual(self.search('john d'), ['jdoe'])
+        self.assertEqual(self.search('DOE, Jo'), ['jdoe'])
+        self.assertEqual(self.search('ohn'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        user = self.create('renamer', 'Old', 'Name')
+        user.first_name = 'Fresh'
+        user.save()
+        self.assertEqual(self.search('fresh'), ['renamer'])
+        self.assertEqual(self.search('old'), [])
+
+        user.delete()
+        self.assertEqual(self.search('fresh'), [])
+
+    @override_settings(USER_SEARCH_MAX_CANDIDATES=3)
+    def test_exact_username_survives_the_candidate_limit(self):
+        self.create('max')
+        for i in range(5):
+            self.create(f'max{i}')
+        self.assertEqual(self.search('max')[0], 'max')
+        self.assertEqual(self.search('Max ')[0], 'max')
+
+    def test_friends_are_boosted(self):
+        self.create('sam_popular', followers_count=1000)
+        friend = self.create('sam_friend')
+        Friendship.objects.create(from_user=self.viewer, to_user=friend, status='accepted')
+        self.assertEqual(self.search('sam'), ['sam_friend', 'sam_popular'])
+        self.assertEqual(self.search('sam', boost_friends='false'), ['sam_popular', 'sam_friend'])
+
+    def test_minimal_payload_and_fixed_query_count(self):
+        for i in range(15):
+            self.create(f'kim{i}')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/auth/users/search/', {'q': 'kim', 'limit': 5})
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(
+            set(response.data['results'][0]),
+            {'id', 'username', 'profile_picture', 'profile_picture_renditions', 'is_verified'}
+        )
+        # Candidates from the index, the viewer's friends and the returned users
+        self.assertEqual(len(context.captured_queries), 3)
+
+
+class PresenceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob = [
+            User.objects.create_user(username=name, email=f'{name}@example.com', password='pass1234')
+            for name in ('alice', 'bob')
+        ]
+
+    def setUp(self):
+        cache.clear()
+        presence.flush()
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_online_while_any_socket_is_open(self):
+        presence.connect(self.alice.id)
+        presence.connect(self.alice.id)
+        presence.disconnect(self.alice.id)
+        found = presence.get_presence([self.alice.id, self.bob.id])
+        self.assertTrue(found[self.alice.id]['is_online'])
+        self.assertIsNotNone(found[self.alice.id]['last_seen'])
+        self.assertEqual(found[self.bob.id], {'is_online': False, 'last_seen': None})
+
+        presence.disconnect(self.alice.id)
+        self.assertFalse(presence.get_presence([self.alice.id])[self.alice.id]['is_online'])
+
+    def test_last_seen_is_flushed_in_one_batch(self):
+        for _ in range(3):
+            presence.heartbeat(self.alice.id)
+            presence.heartbeat(self.bob.id)
+        self.assertIsNone(User.objects.get(id=self.alice.id).last_seen)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(presence.flush(), 2)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual(
+            User.objects.get(id=self.alice.id).last_seen,
+            cache.get(presence.last_seen_key(self.alice.id))
+        )
+
+    def test_logout_only_writes_last_seen(self):
+        presence.connect(self.alice.id)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/auth/logout/')
+        self.assertEqual(response.status_code, 200)
+        updates = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('SET "last_seen"', updates[0])
+        self.assertNotIn('"username"', updates[0])
+
+        response = self.client.get(f'/api/auth/presence/?ids={self.alice.id},{self.bob.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(result['user_id'], result['is_online']) for result in response.data['results']],
+            [(self.alice.id, False), (self.bob.id, False)]
+        )
+        self.assertIsNotNone(response.data['results'][0]['last_seen'])
+        self.assertEqual(self.client.get('/api/auth/presence/?ids=x').status_code, 400)
+
+    def test_requires_a_shared_cache(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            with self.assertRaises(ImproperlyConfigured):
+                presence.check_shared_cache()
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}):
+            presence.check_shared_cache()
@@ -6,7 +6,8 @@ from .views import (
     LogoutView,
     UserProfileView,
     UserDetailView,
-    UserSearchView
+    UserSearchView,
+    PresenceView
 )
 
 urlpatterns = [
@@ -19,4 +20,5 @@ urlpatterns = [
     path('profile/', UserProfileView.as_view(), name='user-profile'),
     path('users/<int:pk>/', UserDetailView.as_view(), name='user-detail'),
     path('users/search/', UserSearchView.as_view(), name='user-search'),
+    path('presence/', PresenceView.as_view(), name='user-presence'),
 ]
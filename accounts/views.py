@@ -3,8 +3,13 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model, authenticate
+from friends.relationships import RelationshipResolver
+from posts import feed_cache
+from social_backend import renditions
+from . import presence, search
 from .serializers import (
     UserSerializer,
+    UserMinimalSerializer,
     UserRegistrationSerializer,
     UserUpdateSerializer
 )
@@ -65,10 +70,6 @@ class LoginView(APIView):
             # Generate JWT tokens
             refresh = RefreshToken.for_user(user)
 
-            # Update online status
-            user.is_online = True
-            user.save()
-
             return Response({
                 'user': UserSerializer(user).data,
                 'tokens': {
@@ -90,9 +91,8 @@ class LogoutView(APIView):
 
     def post(self, request):
         try:
-            # Update online status
-            request.user.is_online = False
-            request.user.save()
+            # Offline on every socket; only last_seen is written
+            presence.set_offline(request.user.id)
 
             # Blacklist the refresh token
             refresh_token = request.data.get("refresh")
@@ -124,6 +124,14 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
             return UserUpdateSerializer
         return UserSerializer
 
+    def perform_update(self, serializer):
+        user = serializer.save()
+        for field_name in ('profile_picture', 'cover_photo'):
+            if field_name in serializer.validated_data:
+                renditions.schedule(user, field_name)
+        # Cached feeds embed this user's profile picture
+        feed_cache.bump_author(user.id)
+
 
 class UserDetailView(generics.RetrieveAPIView):
     """Get any user's profile by ID"""
@@ -133,19 +141,45 @@ class UserDetailView(generics.RetrieveAPIView):
     lookup_field = 'pk'
 
 
-class UserSearchView(generics.ListAPIView):
-    """Search users by username or name"""
-    serializer_class = UserSerializer
+class UserSearchView(APIView):
+    """Typeahead search over usernames and names"""
     permission_classes = [permissions.IsAuthenticated]
+    default_limit = 10
+    max_limit = 50
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        boost_friends = request.query_params.get('boost_friends', 'true').lower() not in ('0', 'false')
+        context = {'request': request}
+        if request.query_params.get('relationships', 'false').lower() in ('1', 'true'):
+            context['relationships'] = RelationshipResolver(request.user)
+
+        users = search.search_users(request.query_params.get('q', ''), request.user, limit, boost_friends)
+        serializer = UserMinimalSerializer(users, many=True, context=context)
+        return Response({'results': serializer.data})
+
 
-    def get_queryset(self):
-        query = self.request.query_params.get('q', '')
-        if query:
-            return User.objects.filter(
-                username__icontains=query
-            ) | User.objects.filter(
-                first_name__icontains=query
-            ) | User.objects.filter(
-                last_name__icontains=query
+class PresenceView(APIView):
+    """Online status and last_seen for a batch of users, e.g. a room's participants or a friend list"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            user_ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()]
+        except ValueError:
+            return Response({'error': 'ids must be a comma-separated list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not user_ids:
+            return Response({'error': 'ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(user_ids) > presence.MAX_IDS:
+            return Response(
+                {'error': f'At most {presence.MAX_IDS} ids per request'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        return User.objects.none()
\ No newline at end of file
+
+        found = presence.get_presence(user_ids)
+        return Response({
+            'results': [{'user_id': user_id, **found[user_id]} for user_id in found]
+        })
@@ -1,10 +1,10 @@
 from django.contrib import admin
-from .models import ChatRoom, Message
+from .models import ChatRoom, Message, ReadState
 
 
 @admin.register(ChatRoom)
 class ChatRoomAdmin(admin.ModelAdmin):
-    list_display = ['id', 'room_type', 'name', 'get_participants', 'created_by', 'created_at']
+    list_display = ['id', 'room_type', 'name', 'get_participants', 'created_by', 'last_message_at', 'created_at']
     list_filter = ['room_type', 'created_at']
     search_fields = ['name', 'participants__username']
     ordering = ['-updated_at']
@@ -17,12 +17,18 @@ class ChatRoomAdmin(admin.ModelAdmin):
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ['id', 'sender', 'room', 'message_type', 'content_preview', 'is_read', 'created_at']
-    list_filter = ['message_type', 'is_read', 'created_at']
+    list_display = ['id', 'sender', 'room', 'message_type', 'content_preview', 'created_at']
+    list_filter = ['message_type', 'created_at']
     search_fields = ['sender__username', 'content', 'room__id']
     ordering = ['-created_at']
 
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
 
-    content_preview.short_description = 'Message'
\ No newline at end of file
+    content_preview.short_description = 'Message'
+
+
+@admin.register(ReadState)
+class ReadStateAdmin(admin.ModelAdmin):
+    list_display = ['id', 'room', 'user', 'last_read_message_id', 'unread_count', 'updated_at']
+    raw_id_fields = ['room', 'user']
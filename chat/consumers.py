@@ -1,16 +1,125 @@
+import asyncio
 import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth import get_user_model
-from .models import ChatRoom, Message
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from accounts import presence
+from . import inbox, snowflake, writer
+from .models import ChatRoom, Message, ReadState
+
+MESSAGE_TYPES = {choice for choice, _ in Message.MESSAGE_TYPE_CHOICES}
+
+
+def room_group_name(room_id):
+    return f'chat_{room_id}'
+
+
+def user_group_name(user_id):
+    return f'user_{user_id}'
+
+
+class RoomEventsMixin:
+    """Posting to room groups and the room group events both consumers receive"""
+
+    async def post_message(self, room_id, content, message_type):
+        if settings.CHAT_WRITE_BEHIND:
+            saved_message = Message(
+                sender=self.user,
+                room_id=room_id,
+                content=content,
+                message_type=message_type,
+                created_at=timezone.now()
+            )
+        else:
+            # Save message to database
+            saved_message = await self.save_message(room_id, content, message_type)
+
+        # Send message to room group
+        await self.channel_layer.group_send(
+            room_group_name(room_id),
+            {
+                'type': 'chat_message',
+                'room_id': room_id,
+                'message': content,
+                'user_id': self.user.id,
+                # A string, like MessageSerializer.id: snowflakes exceed JavaScript's exact integers
+                'message_id': str(saved_message.id),
+                'message_type': message_type,
+                'created_at': saved_message.created_at.isoformat(),
+            }
+        )
+        if settings.CHAT_WRITE_BEHIND:
+            await writer.get_writer().add(saved_message)
+
+    async def chat_typing(self, event):
+        if event['user_id'] != self.user.id:
+            await self.send(text_data=json.dumps({
+                'type': 'typing',
+                'room': event['room_id'],
+                'user_id': event['user_id'],
+                'is_typing': event['is_typing'],
+            }))
 
-User = get_user_model()
+    async def chat_read(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'read',
+            'room': event['room_id'],
+            'user_id': event['user_id'],
+            'last_read_message_id': event['last_read_message_id'],
+        }))
+
+    async def heartbeat(self):
+        await sync_to_async(presence.heartbeat)(self.user.id)
+
+    async def prepare_ids(self):
+        if settings.CHAT_WRITE_BEHIND:
+            # Write-behind builds Messages on the event loop; lease the worker ID off it first
+            await database_sync_to_async(snowflake.get_generator)()
+
+    @database_sync_to_async
+    def save_message(self, room_id, content, message_type):
+        """Save message to database"""
+        with transaction.atomic():
+            return Message.objects.create(
+                sender=self.user,
+                room_id=room_id,
+                content=content,
+                message_type=message_type
+            )
+
+
+class ChatConsumer(RoomEventsMixin, AsyncWebsocketConsumer):
+    """
+    One socket per user and room.
 
+    The user (scope['user'], set by the session or JWTAuthMiddleware) and
+    their room membership are checked once at connect and kept for the life
+    of the socket, so each incoming message costs an INSERT plus the two
+    inbox UPDATEs, or with CHAT_WRITE_BEHIND a share of a batch after the
+    broadcast.
+
+    Open sockets also drive the user's presence: connect and disconnect
+    count them, and clients send {"type": "heartbeat"} at least every
+    PRESENCE_TTL seconds to stay online.
+    """
 
-class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
-        self.room_group_name = f'chat_{self.room_id}'
+        self.room_group_name = room_group_name(self.room_id)
+
+        self.user = self.scope.get('user')
+        self.room = None
+        if self.user is not None and self.user.is_authenticated:
+            self.room = await self.get_room()
+        if self.room is None:
+            # Anonymous, or not a participant of this room
+            await self.close()
+            return
 
         # Join room group
         await self.channel_layer.group_add(
@@ -18,42 +127,43 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
+        await self.prepare_ids()
         await self.accept()
+        await sync_to_async(presence.connect)(self.user.id)
+        presence.start_flusher()
 
     async def disconnect(self, close_code):
+        if self.room is None:
+            return
+        await sync_to_async(presence.disconnect)(self.user.id)
+        if settings.CHAT_WRITE_BEHIND:
+            await writer.get_writer().flush()
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """Receive message from WebSocket"""
-        data = json.loads(text_data)
+        try:
+            data = json.loads(text_data or '')
+        except ValueError:
+            await self.send_error('Invalid JSON')
+            return
+        if not isinstance(data, dict):
+            await self.send_error('Invalid message')
+            return
+        if data.get('type') == 'heartbeat':
+            await self.heartbeat()
+            return
         message = data.get('message', '')
-        user_id = data.get('user_id')
         message_type = data.get('message_type', 'text')
+        if not isinstance(message, str) or message_type not in MESSAGE_TYPES:
+            await self.send_error('Invalid message')
+            return
 
-        # Save message to database
-        saved_message = await self.save_message(
-            user_id,
-            self.room_id,
-            message,
-            message_type
-        )
-
-        # Send message to room group
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'message': message,
-                'user_id': user_id,
-                'message_id': saved_message.id,
-                'message_type': message_type,
-                'created_at': saved_message.created_at.isoformat(),
-            }
-        )
+        await self.post_message(self.room.id, message, message_type)
 
     async def chat_message(self, event):
         """Receive message from room group"""
@@ -66,15 +176,203 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'created_at': event['created_at'],
         }))
 
+    async def send_error(self, error):
+        await self.send(text_data=json.dumps({'error': error}))
+
     @database_sync_to_async
-    def save_message(self, user_id, room_id, content, message_type):
-        """Save message to database"""
-        user = User.objects.get(id=user_id)
-        room = ChatRoom.objects.get(id=room_id)
-        message = Message.objects.create(
-            sender=user,
-            room=room,
-            content=content,
-            message_type=message_type
+    def get_room(self):
+        return ChatRoom.objects.filter(id=self.room_id, participants__id=self.user.id).first()
+
+
+class UserConsumer(RoomEventsMixin, AsyncWebsocketConsumer):
+    """
+    One socket per user for all of their rooms.
+
+    At connect the socket joins the user's personal group and the groups of
+    every room they belong to, or only of the rooms listed in ?rooms=1,2,3.
+    Room messages, typing events and read receipts are multiplexed over it,
+    each frame tagged with its `room`. Clients send JSON frames with a
+    `type`:
+
+        {"type": "message", "room": 1, "message": "hi", "message_type": "text"}
+        {"type": "typing", "room": 1, "is_typing": true}
+        {"type": "read", "room": 1, "message_id": "123"}  (message_id optional)
+        {"type": "subscribe" / "unsubscribe", "rooms": [1, 2]}
+        {"type": "heartbeat"}
+
+    Rooms the user joins or leaves while connected arrive on the personal
+    group (see chat.signals), so a subscribe-all socket follows them. One
+    consumer instance replaces a ChatConsumer per room, and it receives the
+    same room group events, so both kinds of socket can share a room.
+    """
+
+    async def connect(self):
+        self.user = self.scope.get('user')
+        self.member_rooms = None
+        if self.user is None or not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.member_rooms = await self.get_room_ids()
+        requested = parse_qs(self.scope.get('query_string', b'').decode()).get('rooms')
+        self.subscribe_all = requested is None
+        if self.subscribe_all:
+            self.subscribed = set(self.member_rooms)
+        else:
+            try:
+                room_ids = {int(value) for value in requested[0].split(',') if value.strip()}
+            except ValueError:
+                room_ids = set()
+            self.subscribed = room_ids & self.member_rooms
+
+        await self.channel_layer.group_add(user_group_name(self.user.id), self.channel_name)
+        await self.join_groups(self.subscribed)
+        await self.prepare_ids()
+        await self.accept()
+        await sync_to_async(presence.connect)(self.user.id)
+        presence.start_flusher()
+        await self.send_json('subscribed', rooms=sorted(self.subscribed))
+
+    async def disconnect(self, close_code):
+        if self.member_rooms is None:
+            return
+        await sync_to_async(presence.disconnect)(self.user.id)
+        if settings.CHAT_WRITE_BEHIND:
+            await writer.get_writer().flush()
+        await self.channel_layer.group_discard(user_group_name(self.user.id), self.channel_name)
+        await self.leave_groups(self.subscribed)
+
+    async def join_groups(self, room_ids):
+        await asyncio.gather(*[
+            self.channel_layer.group_add(room_group_name(room_id), self.channel_name) for room_id in room_ids
+        ])
+
+    async def leave_groups(self, room_ids):
+        await asyncio.gather(*[
+            self.channel_layer.group_discard(room_group_name(room_id), self.channel_name) for room_id in room_ids
+        ])
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = json.loads(text_data or '')
+        except ValueError:
+            await self.send_error('Invalid JSON')
+            return
+        if not isinstance(data, dict):
+            await self.send_error('Invalid message')
+            return
+
+        frame_type = data.get('type')
+        if frame_type == 'heartbeat':
+            await self.heartbeat()
+        elif frame_type in ('subscribe', 'unsubscribe'):
+            await self.update_subscriptions(frame_type, data.get('rooms'))
+        elif frame_type in ('message', 'typing', 'read'):
+            room_id = data.get('room')
+            if not isinstance(room_id, int) or room_id not in self.member_rooms:
+                await self.send_error('Not a participant of this room', room_id)
+            elif frame_type == 'message':
+                await self.receive_message(room_id, data)
+            elif frame_type == 'typing':
+                await self.channel_layer.group_send(room_group_name(room_id), {
+                    'type': 'chat_typing',
+                    'room_id': room_id,
+                    'user_id': self.user.id,
+                    'is_typing': bool(data.get('is_typing', True)),
+                })
+            else:
+                await self.receive_read(room_id, data.get('message_id'))
+        else:
+            await self.send_error('Unknown frame type')
+
+    async def receive_message(self, room_id, data):
+        message = data.get('message', '')
+        message_type = data.get('message_type', 'text')
+        if not isinstance(message, str) or message_type not in MESSAGE_TYPES:
+            await self.send_error('Invalid message', room_id)
+            return
+        await self.post_message(room_id, message, message_type)
+
+    async def receive_read(self, room_id, message_id):
+        if message_id is not None:
+            # Sent back as the string it was received as, though plain integers are accepted
+            try:
+                if isinstance(message_id, bool) or not isinstance(message_id, (int, str)):
+                    raise ValueError
+                message_id = int(message_id)
+            except ValueError:
+                await self.send_error('message_id must be an integer', room_id)
+                return
+        last_read = await self.mark_read(room_id, message_id)
+        await self.channel_layer.group_send(room_group_name(room_id), {
+            'type': 'chat_read',
+            'room_id': room_id,
+            'user_id': self.user.id,
+            'last_read_message_id': last_read,
+        })
+
+    async def update_subscriptions(self, frame_type, room_ids):
+        if not isinstance(room_ids, list):
+            await self.send_error('rooms must be a list of room IDs')
+            return
+        room_ids = {room_id for room_id in room_ids if isinstance(room_id, int) and room_id in self.member_rooms}
+        if frame_type == 'subscribe':
+            await self.join_groups(room_ids - self.subscribed)
+            self.subscribed |= room_ids
+        else:
+            await self.leave_groups(room_ids & self.subscribed)
+            self.subscribed -= room_ids
+        await self.send_json('subscribed', rooms=sorted(self.subscribed))
+
+    async def chat_message(self, event):
+        await self.send_json(
+            'message',
+            room=event['room_id'],
+            message=event['message'],
+            user_id=event['user_id'],
+            message_id=event['message_id'],
+            message_type=event['message_type'],
+            created_at=event['created_at'],
         )
-        return message
\ No newline at end of file
+
+    async def rooms_joined(self, event):
+        """Personal group: the user was added to rooms"""
+        room_ids = set(event['room_ids'])
+        self.member_rooms |= room_ids
+        if self.subscribe_all:
+            await self.join_groups(room_ids - self.subscribed)
+            self.subscribed |= room_ids
+            await self.send_json('subscribed', rooms=sorted(self.subscribed))
+
+    async def rooms_left(self, event):
+        """Personal group: the user was removed from rooms"""
+        room_ids = set(event['room_ids'])
+        self.member_rooms -= room_ids
+        if room_ids & self.subscribed:
+            await self.leave_groups(room_ids & self.subscribed)
+            self.subscribed -= room_ids
+            await self.send_json('subscribed', rooms=sorted(self.subscribed))
+
+    async def send_json(self, frame_type, **fields):
+        await self.send(text_data=json.dumps({'type': frame_type, **fields}))
+
+    async def send_error(self, error, room_id=None):
+        fields = {'error': error}
+        if room_id is not None:
+            fields['room'] = room_id
+        await self.send_json('error', **fields)
+
+    @database_sync_to_async
+    def get_room_ids(self):
+        return set(ChatRoom.participants.through.objects.filter(
+            user_id=self.user.id
+        ).values_list('chatroom_id', flat=True))
+
+    @database_sync_to_async
+    def mark_read(self, room_id, message_id):
+        """Move the read cursor and return its new position"""
+        inbox.mark_read(room_id, self.user, message_id)
+        last_read = ReadState.objects.filter(
+            room_id=room_id, user=self.user
+        ).values_list('last_read_message_id', flat=True).first()
+        return None if last_read is None else str(last_read)
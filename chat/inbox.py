@@ -0,0 +1,86 @@
+"""
+Denormalized inbox state.
+
+Each ChatRoom carries a preview of its newest message, and each
+participant's ReadState carries an unread_count. The room list therefore
+needs no per-room message queries.
+
+- record_messages() runs in the same transaction as every message insert:
+  from Message's post_save (chat.signals) for single rows, and from
+  chat.writer for write-behind batches. It costs two UPDATEs per room
+  whatever the batch size.
+- mark_read() moves a read cursor and recomputes that participant's count
+  in the same UPDATE, so increments that drifted (e.g. a write-behind row
+  flushed after the reader's cursor passed it) are corrected on the next
+  read.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+from .models import ChatRoom, Message, ReadState
+
+PREVIEW_LENGTH = 100
+
+
+def record_messages(messages):
+    """Update room previews and unread counters for newly inserted messages"""
+    by_room = defaultdict(list)
+    for message in messages:
+        by_room[message.room_id].append(message)
+
+    for room_id, room_messages in by_room.items():
+        newest = max(room_messages, key=lambda message: message.id)
+        ChatRoom.objects.filter(
+            Q(last_message_id__isnull=True) | Q(last_message_id__lt=newest.id),
+            id=room_id
+        ).update(
+            last_message_id=newest.id,
+            last_message_sender_id=newest.sender_id,
+            last_message_type=newest.message_type,
+            last_message_preview=newest.content[:PREVIEW_LENGTH],
+            last_message_at=newest.created_at,
+            updated_at=timezone.now()
+        )
+
+        # Every participant gains the batch, minus what they sent themselves
+        total = len(room_messages)
+        sent = Counter(message.sender_id for message in room_messages)
+        ReadState.objects.filter(
+            room_id=room_id,
+            last_read_message_id__lt=newest.id
+        ).update(unread_count=F('unread_count') + Case(
+            *[When(user_id=user_id, then=Value(total - count)) for user_id, count in sent.items()],
+            default=Value(total)
+        ))
+
+
+def unread_after(cursor):
+    """Count of messages past `cursor` not sent by the ReadState's user, for ReadState updates"""
+    return Coalesce(Subquery(
+        Message.objects.filter(
+            room=OuterRef('room'), id__gt=cursor
+        ).exclude(
+            sender=OuterRef('user')
+        ).order_by().values('room').annotate(total=Count('id')).values('total')
+    ), 0)
+
+
+def mark_read(room, user, message_id=None):
+    """Move the user's cursor to the newest message (or message_id), never backwards, in one UPDATE"""
+    read_up_to = Coalesce(Subquery(
+        Message.objects.filter(room=room).order_by('-id').values('id')[:1]
+    ), 0)
+    if message_id is not None:
+        read_up_to = Least(read_up_to, Value(message_id))
+    cursor = Greatest(F('last_read_message_id'), read_up_to)
+    return ReadState.objects.filter(room=room, user=user).update(
+        last_read_message_id=cursor,
+        unread_count=unread_after(Greatest(OuterRef('last_read_message_id'), read_up_to))
+    )
+
+
+def recount(read_states):
+    """Recompute unread_count for a ReadState queryset from the messages past each cursor"""
+    return read_states.update(unread_count=unread_after(OuterRef('last_read_message_id')))
@@ -0,0 +1,74 @@
+import json
+import time
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from chat.models import ChatRoom, Message
+from social_backend.routing import websocket_urlpatterns
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Streams messages through ChatConsumer over the in-memory channel layer and reports '
+        'messages/second and queries per message for one worker; seeded data is deleted afterwards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000)
+        parser.add_argument('--window', type=int, default=50, help='Messages in flight before waiting for echoes')
+        parser.add_argument('--write-behind', action='store_true', help='Persist with CHAT_WRITE_BEHIND batching')
+
+    def handle(self, *args, **options):
+        # Not wrapped in a transaction: channels closes the connection around every
+        # database_sync_to_async call, so the seeded rows are deleted at the end instead
+        user = User.objects.create_user(
+            username='benchmark_chatter',
+            email='benchmark_chatter@example.com',
+            password='benchmark'
+        )
+        room = ChatRoom.objects.create(room_type='group', name='Benchmark', created_by=user)
+        room.participants.add(user)
+        try:
+            with CaptureQueriesContext(connection) as context, \
+                    override_settings(CHAT_WRITE_BEHIND=options['write_behind']):
+                elapsed = async_to_sync(self.run)(user, room, options)
+            stored = Message.objects.filter(room=room).count()
+        finally:
+            room.delete()
+            user.delete()
+
+        messages = options['messages']
+        self.stdout.write(f'{messages} messages in {elapsed:.2f} s: {messages / elapsed:.0f} messages/s per worker')
+        self.stdout.write(f'Queries: {len(context.captured_queries) / messages:.2f} per message (including connect)')
+        if stored != messages:
+            self.stdout.write(self.style.ERROR(f'✗ {stored} of {messages} messages stored'))
+            return
+        self.stdout.write(self.style.SUCCESS('✓ Done'))
+
+    async def run(self, user, room, options):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{room.id}/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise RuntimeError('The consumer refused the connection')
+
+        payload = {'message': 'Benchmark message', 'user_id': user.id, 'message_type': 'text'}
+        start = time.perf_counter()
+        remaining = options['messages']
+        while remaining:
+            batch = min(options['window'], remaining)
+            for _ in range(batch):
+                await communicator.send_to(text_data=json.dumps(payload))
+            for _ in range(batch):
+                await communicator.receive_from(timeout=10)
+            remaining -= batch
+        elapsed = time.perf_counter() - start
+        await communicator.disconnect()
+        return elapsed
@@ -0,0 +1,41 @@
+"""
+WebSocket authentication for clients that cannot send session cookies.
+
+JWTAuthMiddleware runs inside channels' AuthMiddlewareStack. When the
+session did not authenticate the socket, it accepts a simplejwt access token
+in the `token` query parameter, e.g. ws/chat/1/?token=<access token>.
+"""
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+@database_sync_to_async
+def get_user_from_token(raw_token):
+    try:
+        token = AccessToken(raw_token)
+        user_id = token[api_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return AnonymousUser()
+    user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}, is_active=True).first()
+    return user or AnonymousUser()
+
+
+class JWTAuthMiddleware:
+    """Sets scope['user'] from a `token` query parameter when it is not already authenticated"""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def __call__(self, scope, receive, send):
+        user = scope.get('user')
+        if user is None or not user.is_authenticated:
+            tokens = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('token')
+            if tokens:
+                scope = dict(scope, user=await get_user_from_token(tokens[0]))
+        return await self.inner(scope, receive, send)
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:14
+
+import chat.snowflake
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+BATCH_SIZE = 5000
+
+
+def derive_cursors(apps, schema_editor):
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    Message = apps.get_model('chat', 'Message')
+    ReadState = apps.get_model('chat', 'ReadState')
+    Participant = ChatRoom._meta.get_field('participants').remote_field.through
+    ReadBy = Message._meta.get_field('read_by').remote_field.through
+
+    # A participant has read up to the newest message they were marked as reading or sent themselves
+    cursors = {}
+    for room_id, user_id, last_id in ReadBy.objects.values_list(
+        'message__room_id', 'user_id'
+    ).annotate(last_id=Max('message_id')).order_by():
+        cursors[room_id, user_id] = last_id
+    for room_id, user_id, last_id in Message.objects.values_list(
+        'room_id', 'sender_id'
+    ).annotate(last_id=Max('id')).order_by():
+        cursors[room_id, user_id] = max(last_id, cursors.get((room_id, user_id), 0))
+
+    last_pk = 0
+    while True:
+        batch = list(Participant.objects.filter(
+            pk__gt=last_pk
+        ).order_by('pk').values_list('pk', 'chatroom_id', 'user_id')[:BATCH_SIZE])
+        if not batch:
+            break
+        ReadState.objects.bulk_create([
+            ReadState(room_id=room_id, user_id=user_id, last_read_message_id=cursors.get((room_id, user_id), 0))
+            for _, room_id, user_id in batch
+        ], ignore_conflicts=True)
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_message_created_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='chat.chatroom')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_read_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('room', 'user')},
+            },
+        ),
+        migrations.RunPython(derive_cursors, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+        migrations.RemoveField(
+            model_name='message',
+            name='read_by',
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='id',
+            field=models.BigIntegerField(default=chat.snowflake.next_message_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['room', 'id'], name='message_room_id_idx'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 5000
+
+
+def backfill_inbox(apps, schema_editor):
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    Message = apps.get_model('chat', 'Message')
+    ReadState = apps.get_model('chat', 'ReadState')
+
+    last_pk = 0
+    while True:
+        room_ids = list(ChatRoom.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE])
+        if not room_ids:
+            break
+        last_ids = Message.objects.filter(room_id__in=room_ids).values('room_id').annotate(
+            last_id=models.Max('id')
+        ).order_by().values_list('last_id', flat=True)
+        rooms = []
+        for message in Message.objects.filter(id__in=list(last_ids)):
+            rooms.append(ChatRoom(
+                pk=message.room_id,
+                last_message_id=message.id,
+                last_message_sender_id=message.sender_id,
+                last_message_type=message.message_type,
+                last_message_preview=message.content[:100],
+                last_message_at=message.created_at,
+            ))
+        ChatRoom.objects.bulk_update(rooms, [
+            'last_message_id', 'last_message_sender', 'last_message_type',
+            'last_message_preview', 'last_message_at',
+        ], batch_size=1000)
+        last_pk = room_ids[-1]
+
+    # Messages from others past each cursor
+    unread = Message.objects.filter(
+        room=OuterRef('room'), id__gt=OuterRef('last_read_message_id')
+    ).exclude(
+        sender=OuterRef('user')
+    ).order_by().values('room').annotate(total=Count('id')).values('total')
+    last_pk = 0
+    while True:
+        batch = list(ReadState.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE])
+        if not batch:
+            break
+        ReadState.objects.filter(pk__in=batch).update(unread_count=Coalesce(Subquery(unread), 0))
+        last_pk = batch[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_read_states'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_preview',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_sender',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_type',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='readstate',
+            name='unread_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_inbox, migrations.RunPython.noop),
+    ]
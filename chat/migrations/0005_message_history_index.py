@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_inbox_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['room', 'created_at', 'id'], name='message_room_created_idx'),
+        ),
+    ]
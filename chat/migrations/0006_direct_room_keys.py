@@ -0,0 +1,83 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:26
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 5000
+
+
+def merge_rooms(apps, keep_id, duplicate_ids):
+    """Move the duplicates' messages and read cursors into keep_id, then delete them"""
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    Message = apps.get_model('chat', 'Message')
+    ReadState = apps.get_model('chat', 'ReadState')
+
+    cursors = dict(ReadState.objects.filter(
+        room_id__in=[keep_id, *duplicate_ids]
+    ).values_list('user_id').annotate(last_read=Max('last_read_message_id')).order_by())
+    Message.objects.filter(room_id__in=duplicate_ids).update(room_id=keep_id)
+    ChatRoom.objects.filter(id__in=duplicate_ids).delete()
+    for user_id, last_read in cursors.items():
+        ReadState.objects.filter(room_id=keep_id, user_id=user_id).update(last_read_message_id=last_read)
+
+    unread = Message.objects.filter(
+        room=OuterRef('room'), id__gt=OuterRef('last_read_message_id')
+    ).exclude(
+        sender=OuterRef('user')
+    ).order_by().values('room').annotate(total=Count('id')).values('total')
+    ReadState.objects.filter(room_id=keep_id).update(unread_count=Coalesce(Subquery(unread), 0))
+
+    newest = Message.objects.filter(room_id=keep_id).order_by('-id').first()
+    if newest is not None:
+        ChatRoom.objects.filter(id=keep_id).update(
+            last_message_id=newest.id,
+            last_message_sender_id=newest.sender_id,
+            last_message_type=newest.message_type,
+            last_message_preview=newest.content[:100],
+            last_message_at=newest.created_at,
+        )
+
+
+def assign_direct_keys(apps, schema_editor):
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    Participant = ChatRoom._meta.get_field('participants').remote_field.through
+
+    members = defaultdict(set)
+    for room_id, user_id in Participant.objects.filter(
+        chatroom__room_type='direct'
+    ).values_list('chatroom_id', 'user_id').iterator(chunk_size=BATCH_SIZE):
+        members[room_id].add(user_id)
+
+    rooms_by_key = defaultdict(list)
+    for room_id, user_ids in members.items():
+        if len(user_ids) == 2:
+            low, high = sorted(user_ids)
+            rooms_by_key[f'{low}:{high}'].append(room_id)
+
+    # The oldest room of a pair absorbs the others
+    keys = []
+    for key, room_ids in rooms_by_key.items():
+        keep_id, *duplicate_ids = sorted(room_ids)
+        if duplicate_ids:
+            merge_rooms(apps, keep_id, duplicate_ids)
+        keys.append(ChatRoom(id=keep_id, direct_key=key))
+    ChatRoom.objects.bulk_update(keys, ['direct_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_message_history_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='direct_key',
+            field=models.CharField(blank=True, editable=False, max_length=41, null=True, unique=True),
+        ),
+        migrations.RunPython(assign_direct_keys, migrations.RunPython.noop),
+    ]
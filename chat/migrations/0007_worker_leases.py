@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_direct_room_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkerLease',
+            fields=[
+                ('worker_id', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('owner', models.CharField(max_length=100)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+    ]
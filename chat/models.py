@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
+from django.utils import timezone
+from .snowflake import next_message_id
 
 
 class ChatRoom(models.Model):
@@ -26,12 +28,49 @@ class ChatRoom(models.Model):
         related_name='created_rooms'
     )
 
+    # Newest message, kept current by chat.inbox.record_messages (no FK: write-behind rows may not exist yet)
+    last_message_id = models.BigIntegerField(null=True, blank=True)
+    last_message_sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    last_message_type = models.CharField(max_length=10, blank=True)
+    last_message_preview = models.CharField(max_length=100, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+
+    # "<lower user id>:<higher user id>" for direct rooms, so each pair has at most one
+    direct_key = models.CharField(max_length=41, null=True, blank=True, unique=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-updated_at']
 
+    @staticmethod
+    def make_direct_key(user_id, other_id):
+        low, high = sorted((user_id, other_id))
+        return f'{low}:{high}'
+
+    @classmethod
+    def get_or_create_direct(cls, user, other_id):
+        """(room, created) for the direct room of two users; one unique-index probe, safe under races"""
+        key = cls.make_direct_key(user.id, other_id)
+        room = cls.objects.filter(direct_key=key).first()
+        if room is not None:
+            return room, False
+        try:
+            with transaction.atomic():
+                room = cls.objects.create(room_type='direct', direct_key=key, created_by=user)
+                room.participants.add(user.id, other_id)
+        except IntegrityError:
+            # A concurrent request created it first
+            return cls.objects.get(direct_key=key), False
+        return room, True
+
     def __str__(self):
         if self.room_type == 'direct':
             participants = list(self.participants.all()[:2])
@@ -49,6 +88,8 @@ class Message(models.Model):
         ('file', 'File'),
     )
 
+    # Time-ordered, so read cursors can compare IDs (see chat.snowflake)
+    id = models.BigIntegerField(primary_key=True, default=next_message_id, editable=False)
     room = models.ForeignKey(
         ChatRoom,
         on_delete=models.CASCADE,
@@ -67,18 +108,60 @@ class Message(models.Model):
     content = models.TextField(blank=True)
     file = models.FileField(upload_to='chat_files/', null=True, blank=True)
 
-    is_read = models.BooleanField(default=False)
-    read_by = models.ManyToManyField(
+    # Not auto_now_add: write-behind rows keep the time they were broadcast at
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['room', 'id'], name='message_room_id_idx'),
+            models.Index(fields=['room', 'created_at', 'id'], name='message_room_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.sender.username}: {self.content[:50]}"
+
+
+class ReadState(models.Model):
+    """How far a participant has read a room: messages with a higher ID are unread"""
+    room = models.ForeignKey(
+        ChatRoom,
+        on_delete=models.CASCADE,
+        related_name='read_states'
+    )
+    user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
-        related_name='read_messages',
-        blank=True
+        on_delete=models.CASCADE,
+        related_name='chat_read_states'
     )
-
-    created_at = models.DateTimeField(auto_now_add=True)
+    last_read_message_id = models.BigIntegerField(default=0)
+    # Messages from others past the cursor, kept by chat.inbox
+    unread_count = models.IntegerField(default=0)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ['created_at']
+        unique_together = ('room', 'user')
 
     def __str__(self):
-        return f"{self.sender.username}: {self.content[:50]}"
\ No newline at end of file
+        return f"{self.user_id} read room {self.room_id} up to {self.last_read_message_id}"
+
+    @classmethod
+    def get_cursors(cls, room_id):
+        """{user_id: last_read_message_id} for every participant of a room"""
+        return dict(cls.objects.filter(room_id=room_id).values_list('user_id', 'last_read_message_id'))
+
+
+class WorkerLease(models.Model):
+    """Snowflake worker ID held by one running process (see chat.snowflake)"""
+    worker_id = models.PositiveSmallIntegerField(primary_key=True)
+    owner = models.CharField(max_length=100)  # host:pid:random
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Worker {self.worker_id} leased by {self.owner} until {self.expires_at}"
+
+
+def is_read_by_others(message_id, sender_id, cursors):
+    """Whether a participant other than the sender has read past a message"""
+    return any(last_read >= message_id for user_id, last_read in cursors.items() if user_id != sender_id)
@@ -1,10 +1,14 @@
 from rest_framework import serializers
-from .models import ChatRoom, Message
+from .models import ChatRoom, Message, ReadState, is_read_by_others
 from accounts.serializers import UserMinimalSerializer  # Changed from relative import
+from social_backend.fastpath import file_url, format_datetime, user_minimal, user_minimal_columns
 
 class MessageSerializer(serializers.ModelSerializer):
     """Serializer for Message model"""
+    # Snowflakes exceed 2^53, past what JavaScript numbers hold exactly
+    id = serializers.CharField(read_only=True)
     sender = UserMinimalSerializer(read_only=True)
+    is_read = serializers.SerializerMethodField()
 
     class Meta:
         model = Message
@@ -14,6 +18,36 @@ class MessageSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'sender', 'is_read', 'created_at', 'updated_at']
 
+    def get_is_read(self, obj):
+        # List views pass the room's cursors in the context so a page costs one lookup
+        cursors = self.context.get('read_cursors')
+        if cursors is None:
+            cursors = ReadState.get_cursors(obj.room_id)
+        return is_read_by_others(obj.id, obj.sender_id, cursors)
+
+
+MESSAGE_FAST_COLUMNS = [
+    'id', 'room_id', *user_minimal_columns('sender'), 'message_type', 'content',
+    'file', 'created_at', 'updated_at'
+]
+
+
+def build_message_list(rows, request, read_cursors):
+    """Fast-path equivalent of MessageSerializer(many=True) for MESSAGE_FAST_COLUMNS rows"""
+    file_field = Message._meta.get_field('file')
+    profile_picture_field = Message._meta.get_field('sender').related_model._meta.get_field('profile_picture')
+    return [{
+        'id': str(row['id']),
+        'room': row['room_id'],
+        'sender': user_minimal(row, 'sender', request, profile_picture_field),
+        'message_type': row['message_type'],
+        'content': row['content'],
+        'file': file_url(file_field, row['file'], request),
+        'is_read': is_read_by_others(row['id'], row['sender__id'], read_cursors),
+        'created_at': format_datetime(row['created_at']),
+        'updated_at': format_datetime(row['updated_at']),
+    } for row in rows]
+
 
 class ChatRoomSerializer(serializers.ModelSerializer):
     """Serializer for ChatRoom model"""
@@ -32,13 +66,27 @@ class ChatRoomSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_by', 'created_at', 'updated_at']
 
     def get_last_message(self, obj):
-        last_msg = obj.messages.last()
-        if last_msg:
-            return MessageSerializer(last_msg).data
-        return None
+        # Denormalized on the room by chat.inbox, so no message query per room
+        if obj.last_message_id is None:
+            return None
+        sender = obj.last_message_sender
+        return {
+            'id': str(obj.last_message_id),
+            'room': obj.id,
+            'sender': UserMinimalSerializer(sender, context=self.context).data if sender else None,
+            'message_type': obj.last_message_type,
+            'content': obj.last_message_preview,
+            'created_at': format_datetime(obj.last_message_at),
+        }
 
     def get_unread_count(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.messages.exclude(read_by=request.user).count()
+            # Room querysets annotate the viewer's counter; otherwise look it up
+            unread_count = getattr(obj, 'unread_count', None)
+            if unread_count is None:
+                unread_count = ReadState.objects.filter(
+                    room=obj, user=request.user
+                ).values_list('unread_count', flat=True).first() or 0
+            return unread_count
         return 0
\ No newline at end of file
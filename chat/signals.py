@@ -0,0 +1,67 @@
+import logging
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+from . import inbox
+from .consumers import user_group_name
+from .models import ChatRoom, Message, ReadState
+
+logger = logging.getLogger(__name__)
+
+
+def notify_members(event_type, pairs):
+    """
+    Tell each user's UserConsumer sockets which rooms they joined or left.
+
+    Runs after commit, so a channel layer failure is logged rather than raised
+    into the request that already saved the change; the user's sockets pick
+    the rooms up when they reconnect.
+    """
+    room_ids = defaultdict(list)
+    for room_id, user_id in pairs:
+        room_ids[user_id].append(room_id)
+    try:
+        group_send = async_to_sync(get_channel_layer().group_send)
+    except Exception:
+        logger.exception('No channel layer for %s events', event_type)
+        return
+    for user_id, user_room_ids in room_ids.items():
+        try:
+            group_send(user_group_name(user_id), {'type': event_type, 'room_ids': user_room_ids})
+        except Exception:
+            logger.exception('Sending %s to user %s failed', event_type, user_id)
+
+
+@receiver(post_save, sender=Message)
+def message_saved(sender, instance, created, **kwargs):
+    # bulk_create skips this; chat.writer records its batches itself
+    if created:
+        inbox.record_messages([instance])
+
+
+@receiver(m2m_changed, sender=ChatRoom.participants.through)
+def participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    if reverse:
+        pairs = [(room_id, instance.pk) for room_id in pk_set]
+        read_states = ReadState.objects.filter(user_id=instance.pk, room_id__in=pk_set)
+    else:
+        pairs = [(instance.pk, user_id) for user_id in pk_set]
+        read_states = ReadState.objects.filter(room_id=instance.pk, user_id__in=pk_set)
+
+    if action == 'post_remove':
+        transaction.on_commit(lambda: notify_members('rooms.left', pairs))
+        return
+
+    # Every participant gets a read cursor; it starts at 0, so the whole history counts as unread
+    ReadState.objects.bulk_create(
+        [ReadState(room_id=room_id, user_id=user_id) for room_id, user_id in pairs],
+        ignore_conflicts=True
+    )
+    inbox.recount(read_states)
+    transaction.on_commit(lambda: notify_members('rooms.joined', pairs))
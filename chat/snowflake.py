@@ -0,0 +1,144 @@
+"""
+Snowflake message IDs.
+
+64-bit, time-ordered: 41 bits of milliseconds since SNOWFLAKE_EPOCH_MS, 10
+bits of worker ID and a 12-bit per-millisecond sequence. Every message gets
+one, including write-behind rows that are broadcast before they are stored,
+so "after message N" means "sent later" for read cursors. They are far above
+any ID the old auto-increment sequence handed out, and above 2^53, so the
+API sends them as strings.
+
+Worker IDs must differ between processes sharing a database. Each process
+leases a free one from the WorkerLease table on its first message and a
+background thread renews the lease every CHAT_WORKER_LEASE_SECONDS / 3
+seconds; a process that dies frees its ID once the lease expires. Setting
+CHAT_WORKER_ID pins the ID instead, e.g. for a single-process deployment.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SNOWFLAKE_EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+class SnowflakeGenerator:
+    """Thread-safe generator of unique, increasing IDs for one worker"""
+
+    def __init__(self, worker_id):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f'worker_id must be between 0 and {MAX_WORKER_ID}')
+        self.worker_id = worker_id
+        self.last_ms = -1
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def next_id(self):
+        with self.lock:
+            # Never go backwards, even if the wall clock does
+            now = max(int(time.time() * 1000) - SNOWFLAKE_EPOCH_MS, self.last_ms)
+            if now == self.last_ms:
+                self.sequence = (self.sequence + 1) & MAX_SEQUENCE
+                if self.sequence == 0:
+                    # 4096 IDs this millisecond: borrow the next one
+                    now += 1
+            else:
+                self.sequence = 0
+            self.last_ms = now
+            return (now << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self.sequence
+
+
+def timestamp_ms(snowflake_id):
+    """Unix time in milliseconds encoded in an ID"""
+    return (snowflake_id >> (WORKER_BITS + SEQUENCE_BITS)) + SNOWFLAKE_EPOCH_MS
+
+
+def lease_expiry():
+    return timezone.now() + timedelta(seconds=settings.CHAT_WORKER_LEASE_SECONDS)
+
+
+def acquire_worker_id(owner):
+    """Lease a worker ID no live process holds: a never-used one, else the longest-expired one"""
+    from .models import WorkerLease
+
+    taken = set(WorkerLease.objects.values_list('worker_id', flat=True))
+    for worker_id in range(MAX_WORKER_ID + 1):
+        if worker_id in taken:
+            continue
+        try:
+            with transaction.atomic():
+                WorkerLease.objects.create(worker_id=worker_id, owner=owner, expires_at=lease_expiry())
+            return worker_id
+        except IntegrityError:
+            # Another process claimed it first
+            continue
+
+    expired = WorkerLease.objects.filter(expires_at__lt=timezone.now()).order_by('expires_at')
+    for worker_id in expired.values_list('worker_id', flat=True)[:10]:
+        # Conditional, so two processes cannot take over the same expired lease
+        if expired.filter(worker_id=worker_id).update(owner=owner, expires_at=lease_expiry()):
+            return worker_id
+    raise ImproperlyConfigured(f'All {MAX_WORKER_ID + 1} snowflake worker IDs are leased by running processes')
+
+
+def renew_worker_id(worker_id, owner):
+    """Extend this process's lease; False if it expired and another process took the ID"""
+    from .models import WorkerLease
+
+    return bool(WorkerLease.objects.filter(worker_id=worker_id, owner=owner).update(expires_at=lease_expiry()))
+
+
+def keep_leased(generator, owner):
+    while True:
+        time.sleep(settings.CHAT_WORKER_LEASE_SECONDS / 3)
+        close_old_connections()
+        try:
+            if not renew_worker_id(generator.worker_id, owner):
+                worker_id = acquire_worker_id(owner)
+                logger.error('Snowflake worker ID %s was lost; switched to %s', generator.worker_id, worker_id)
+                with generator.lock:
+                    generator.worker_id = worker_id
+        except Exception:
+            logger.exception('Renewing the snowflake worker ID lease failed; will retry')
+        finally:
+            close_old_connections()
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_generator():
+    """This process's generator, leasing a worker ID on first use (database access, so not from async code)"""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                if settings.CHAT_WORKER_ID is not None:
+                    _generator = SnowflakeGenerator(settings.CHAT_WORKER_ID)
+                else:
+                    owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+                    generator = SnowflakeGenerator(acquire_worker_id(owner))
+                    threading.Thread(
+                        target=keep_leased, args=(generator, owner), name='snowflake-lease', daemon=True
+                    ).start()
+                    _generator = generator
+    return _generator
+
+
+def next_message_id():
+    return get_generator().next_id()
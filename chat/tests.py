@@ -1,3 +1,568 @@
+import json
+import time
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts import presence
+from accounts.models import User
+from social_backend.routing import websocket_urlpatterns
+from . import snowflake, writer
+from .consumers import user_group_name
+from .middleware import JWTAuthMiddleware
+from .models import ChatRoom, Message, ReadState, WorkerLease
+from .snowflake import SnowflakeGenerator, timestamp_ms
+
+
+class ChatConsumerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob, cls.eve = [
+            User.objects.create_user(username=name, email=f'{name}@example.com', password='pass1234')
+            for name in ('alice', 'bob', 'eve')
+        ]
+        cls.room = ChatRoom.objects.create(room_type='direct', created_by=cls.alice)
+        cls.room.participants.add(cls.alice, cls.bob)
+
+    def communicator(self, user=None, query=''):
+        application = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+        communicator = WebsocketCommunicator(application, f'/ws/chat/{self.room.id}/{query}')
+        communicator.scope['user'] = user or AnonymousUser()
+        return communicator
+
+    @async_to_sync
+    async def connects(self, user=None, query=''):
+        communicator = self.communicator(user, query)
+        connected, _ = await communicator.connect()
+        await communicator.disconnect()
+        return connected
+
+    def test_only_participants_connect(self):
+        self.assertFalse(self.connects())
+        self.assertFalse(self.connects(self.eve))
+        self.assertTrue(self.connects(self.alice))
+
+    def test_jwt_query_parameter(self):
+        token = str(AccessToken.for_user(self.bob))
+        self.assertTrue(self.connects(query=f'?token={token}'))
+        self.assertFalse(self.connects(query='?token=garbage'))
+
+    def test_each_message_is_one_insert_plus_inbox_updates(self):
+        @async_to_sync
+        async def chat():
+            communicator = self.communicator(self.alice)
+            await communicator.connect()
+            echoed = []
+            for text in ('one', 'two', 'three'):
+                # The sender's user_id is taken from the socket, never from the payload
+                await communicator.send_to(text_data=json.dumps({'message': text, 'user_id': self.eve.id}))
+                echoed.append(json.loads(await communicator.receive_from()))
+            await communicator.send_to(text_data=json.dumps({'message': 'x', 'message_type': 'bogus'}))
+            error = json.loads(await communicator.receive_from())
+            await communicator.disconnect()
+            return echoed, error
+
+        snowflake.get_generator()  # lease this process's worker ID outside the measured queries
+        with CaptureQueriesContext(connection) as context:
+            echoed, error = chat()
+        # The membership check at connect, then per message one INSERT and the room and ReadState UPDATEs
+        statements = [
+            query['sql'].split()[0] for query in context.captured_queries
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))
+        ]
+        self.assertEqual(statements, ['SELECT'] + ['INSERT', 'UPDATE', 'UPDATE'] * 3)
+        self.assertEqual({message['user_id'] for message in echoed}, {self.alice.id})
+        self.assertIn('error', error)
+        self.assertEqual(
+            list(Message.objects.values_list('sender', 'room', 'content')),
+            [(self.alice.id, self.room.id, text) for text in ('one', 'two', 'three')]
+        )
+
+    def test_socket_drives_presence(self):
+        @async_to_sync
+        async def chat():
+            communicator = self.communicator(self.bob)
+            await communicator.connect()
+            await communicator.send_to(text_data=json.dumps({'type': 'heartbeat'}))
+            await communicator.send_to(text_data=json.dumps(['not', 'an', 'object']))
+            error = json.loads(await communicator.receive_from())
+            online = await database_sync_to_async(presence.get_presence)([self.bob.id])
+            await communicator.disconnect()
+            return online[self.bob.id]['is_online'], error
+
+        cache.clear()
+        self.assertEqual(chat(), (True, {'error': 'Invalid message'}))
+        self.assertFalse(presence.get_presence([self.bob.id])[self.bob.id]['is_online'])
+
+    def test_write_behind_broadcasts_first_and_persists_in_batches(self):
+        @async_to_sync
+        async def chat():
+            communicator = self.communicator(self.alice)
+            await communicator.connect()
+            echoed = []
+            for text in ('one', 'two', 'three'):
+                await communicator.send_to(text_data=json.dumps({'message': text}))
+                echoed.append(json.loads(await communicator.receive_from()))
+            stored_before_close = await database_sync_to_async(Message.objects.count)()
+            # Closing the socket flushes what is still buffered
+            await communicator.disconnect()
+            return echoed, stored_before_close
+
+        with self.settings(CHAT_WRITE_BEHIND=True, CHAT_WRITE_BEHIND_FLUSH_MS=60000):
+            with CaptureQueriesContext(connection) as context:
+                echoed, stored_before_close = chat()
+        self.assertEqual(stored_before_close, 0)
+        inserts = [query for query in context.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            list(Message.objects.order_by('id').values_list('id', 'content')),
+            [(int(message['message_id']), message['message']) for message in echoed]
+        )
+        self.assertEqual(
+            Message.objects.get(id=echoed[0]['message_id']).created_at.isoformat(),
+            echoed[0]['created_at']
+        )
+
+
+class UserConsumerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob, cls.eve = [
+            User.objects.create_user(username=name, email=f'{name}@example.com', password='pass1234')
+            for name in ('alice', 'bob', 'eve')
+        ]
+        cls.rooms = [ChatRoom.objects.create(room_type='group', name=str(i), created_by=cls.alice) for i in range(3)]
+        for room in cls.rooms:
+            room.participants.add(cls.alice, cls.bob)
+        cls.eve_room = ChatRoom.objects.create(room_type='group', name='eve', created_by=cls.eve)
+        cls.eve_room.participants.add(cls.eve)
+
+    def communicator(self, user, query=''):
+        application = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+        communicator = WebsocketCommunicator(application, f'/ws/chat/{query}')
+        communicator.scope['user'] = user
+        return communicator
+
+    async def open(self, user, query=''):
+        communicator = self.communicator(user, query)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator, await communicator.receive_json_from()
+
+    def test_one_socket_multiplexes_every_room(self):
+        room_ids = [room.id for room in self.rooms]
+
+        @async_to_sync
+        async def chat():
+            alice, subscribed = await self.open(self.alice)
+            self.assertEqual(subscribed, {'type': 'subscribed', 'rooms': room_ids})
+            bob, _ = await self.open(self.bob, f'?rooms={room_ids[1]},{self.eve_room.id}')
+
+            frames = []
+            for room_id in room_ids:
+                await alice.send_json_to({'type': 'message', 'room': room_id, 'message': f'hi {room_id}'})
+                frames.append(await alice.receive_json_from())
+            # Bob only subscribed to the second room (and cannot subscribe to Eve's)
+            bob_frames = [await bob.receive_json_from()]
+            self.assertTrue(await bob.receive_nothing())
+
+            await alice.send_json_to({'type': 'typing', 'room': room_ids[1]})
+            bob_frames.append(await bob.receive_json_from())
+            await bob.send_json_to({'type': 'read', 'room': room_ids[1]})
+            bob_frames.append(await bob.receive_json_from())
+            frames.append(await alice.receive_json_from())
+            self.assertTrue(await alice.receive_nothing())
+
+            await alice.send_json_to({'type': 'message', 'room': self.eve_room.id, 'message': 'x'})
+            frames.append(await alice.receive_json_from())
+            await bob.send_json_to({'type': 'subscribe', 'rooms': [room_ids[0]]})
+            bob_frames.append(await bob.receive_json_from())
+            await alice.disconnect()
+            await bob.disconnect()
+            return frames, bob_frames
+
+        frames, bob_frames = chat()
+        self.assertEqual([(frame['type'], frame['room']) for frame in frames[:3]], [('message', room_id) for room_id in room_ids])
+        self.assertEqual(frames[1]['message'], f'hi {room_ids[1]}')
+        self.assertEqual(bob_frames[0]['message_id'], frames[1]['message_id'])
+        self.assertEqual(bob_frames[1], {'type': 'typing', 'room': room_ids[1], 'user_id': self.alice.id, 'is_typing': True})
+        read = {'type': 'read', 'room': room_ids[1], 'user_id': self.bob.id, 'last_read_message_id': frames[1]['message_id']}
+        self.assertEqual(bob_frames[2], read)
+        self.assertEqual(frames[3], read)
+        self.assertEqual(frames[4], {'type': 'error', 'error': 'Not a participant of this room', 'room': self.eve_room.id})
+        self.assertEqual(bob_frames[3], {'type': 'subscribed', 'rooms': room_ids[:2]})
+        self.assertEqual(
+            dict(ReadState.objects.filter(user=self.bob).values_list('room_id', 'unread_count')),
+            {room_ids[0]: 1, room_ids[1]: 0, room_ids[2]: 1}
+        )
+
+    def test_follows_rooms_joined_while_connected(self):
+        @async_to_sync
+        async def chat():
+            eve, subscribed = await self.open(self.eve)
+            await get_channel_layer().group_send(
+                user_group_name(self.eve.id), {'type': 'rooms.joined', 'room_ids': [self.rooms[0].id]}
+            )
+            joined = await eve.receive_json_from()
+            await eve.send_json_to({'type': 'message', 'room': self.rooms[0].id, 'message': 'hello'})
+            message = await eve.receive_json_from()
+            await eve.disconnect()
+            return subscribed, joined, message
+
+        subscribed, joined, message = chat()
+        self.assertEqual(subscribed['rooms'], [self.eve_room.id])
+        self.assertEqual(joined['rooms'], sorted([self.eve_room.id, self.rooms[0].id]))
+        self.assertEqual((message['type'], message['room']), ('message', self.rooms[0].id))
+
+    def test_channel_layer_failures_do_not_break_membership_changes(self):
+        layer = mock.Mock(group_send=mock.AsyncMock(side_effect=[ConnectionError('layer down'), None]))
+        with mock.patch('chat.signals.get_channel_layer', return_value=layer), \
+                self.assertLogs('chat.signals', 'ERROR') as logs, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.eve_room.participants.add(self.alice, self.bob)
+
+        self.assertEqual(layer.group_send.await_count, 2)
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(self.eve_room.participants.count(), 3)
+
+    def test_anonymous_is_rejected(self):
+        @async_to_sync
+        async def connect():
+            connected, _ = await self.communicator(AnonymousUser()).connect()
+            return connected
+
+        self.assertFalse(connect())
+
+class MessageWriterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice', email='alice@example.com', password='pass1234')
+        cls.room = ChatRoom.objects.create(room_type='group', created_by=cls.user)
+
+    def test_failed_flush_keeps_rows_for_retry(self):
+        failures = []
+
+        class FlakyWriter(writer.MessageWriter):
+            def write(self, batch):
+                if not failures:
+                    failures.append(len(batch))
+                    raise RuntimeError('database unavailable')
+                super().write(batch)
+
+        @async_to_sync
+        async def run():
+            message_writer = FlakyWriter(flush_interval=60, batch_size=10, max_pending=100)
+            for i in range(3):
+                await message_writer.add(Message(sender=self.user, room=self.room, content=str(i)))
+            with self.assertLogs('chat.writer', 'ERROR'):
+                first = await message_writer.flush()
+            second = await message_writer.flush()
+            message_writer.task.cancel()
+            return first, second, len(message_writer.pending)
+
+        self.assertEqual(run(), (False, True, 0))
+        self.assertEqual(failures, [3])
+        self.assertEqual(Message.objects.count(), 3)
+
+    def test_retry_after_lost_commit_skips_stored_rows(self):
+        bob = User.objects.create_user(username='bob', email='bob@example.com', password='pass1234')
+        self.room.participants.add(self.user, bob)
+        batch = [Message(room=self.room, sender=self.user, content=str(i)) for i in range(3)]
+        message_writer = writer.MessageWriter(flush_interval=60, batch_size=10, max_pending=100)
+        message_writer.write(batch[:2])
+        message_writer.write(batch)
+        self.assertEqual(list(Message.objects.order_by('id').values_list('content', flat=True)), ['0', '1', '2'])
+        self.assertEqual(ReadState.objects.get(room=self.room, user=bob).unread_count, 3)
+
+    def test_id_collision_is_logged_not_swallowed(self):
+        taken = Message.objects.create(room=self.room, sender=self.user, content='first')
+        batch = [
+            Message(id=taken.id, room=self.room, sender=self.user, content='second'),
+            Message(room=self.room, sender=self.user, content='third'),
+        ]
+        with self.assertLogs('chat.writer', 'ERROR') as logs:
+            writer.MessageWriter(flush_interval=60, batch_size=10, max_pending=100).write(batch)
+        self.assertIn(str(taken.id), logs.output[0])
+        self.assertEqual(list(Message.objects.order_by('id').values_list('content', flat=True)), ['first', 'third'])
+
+    def test_rows_that_cannot_be_stored_are_dropped_not_retried(self):
+        batch = [Message(room=self.room, sender=self.user, content=str(i)) for i in range(3)]
+        batch[1].content = None
+        with self.assertLogs('chat.writer', 'ERROR') as logs:
+            writer.MessageWriter(flush_interval=60, batch_size=10, max_pending=100).write(batch)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn(str(batch[1].id), logs.output[0])
+        self.assertEqual(list(Message.objects.order_by('id').values_list('content', flat=True)), ['0', '2'])
+
+    def test_snowflakes_increase_and_encode_time(self):
+        generator = SnowflakeGenerator(worker_id=7)
+        ids = [generator.next_id() for _ in range(10000)]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual((ids[0] >> 12) & 1023, 7)
+        self.assertLess(abs(timestamp_ms(ids[0]) - time.time() * 1000), 5000)
+
+    def test_processes_lease_distinct_worker_ids(self):
+        WorkerLease.objects.all().delete()
+        first = snowflake.acquire_worker_id('host:1')
+        second = snowflake.acquire_worker_id('host:2')
+        self.assertNotEqual(first, second)
+        self.assertTrue(snowflake.renew_worker_id(first, 'host:1'))
+        self.assertFalse(snowflake.renew_worker_id(first, 'host:2'))
+
+        # Once every ID is leased, only an expired lease can be taken over
+        WorkerLease.objects.filter(worker_id=first).update(expires_at=timezone.now() - timedelta(seconds=1))
+        with mock.patch.object(snowflake, 'MAX_WORKER_ID', 1):
+            self.assertEqual(snowflake.acquire_worker_id('host:3'), first)
+            with self.assertRaises(ImproperlyConfigured):
+                snowflake.acquire_worker_id('host:4')
+        self.assertFalse(snowflake.renew_worker_id(first, 'host:1'))
+
+    def test_pinned_worker_id(self):
+        with self.settings(CHAT_WORKER_ID=5), mock.patch.object(snowflake, '_generator', None):
+            self.assertEqual((snowflake.next_message_id() >> 12) & 1023, 5)
+
+
+class ReadStateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob = [
+            User.objects.create_user(username=name, email=f'{name}@example.com', password='pass1234')
+            for name in ('alice', 'bob')
+        ]
+        cls.room = ChatRoom.objects.create(room_type='direct', created_by=cls.alice)
+        cls.room.participants.add(cls.alice, cls.bob)
+        cls.messages = [Message.objects.create(room=cls.room, sender=cls.bob, content=str(i)) for i in range(4)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def unread_count(self):
+        response = self.client.get('/api/chat/rooms/')
+        return response.data['results'][0]['unread_count']
+
+    def test_participants_get_cursors(self):
+        self.assertEqual(ReadState.get_cursors(self.room.id), {self.alice.id: 0, self.bob.id: 0})
+
+    def test_mark_read_moves_cursor_with_one_update(self):
+        self.assertEqual(self.unread_count(), 4)
+
+        response = self.client.post(f'/api/chat/rooms/{self.room.id}/read/', {'message_id': self.messages[1].id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.unread_count(), 2)
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(f'/api/chat/rooms/{self.room.id}/read/')
+        # The membership check and the cursor UPDATE
+        self.assertEqual(len(context.captured_queries), 2)
+        self.assertEqual(self.unread_count(), 0)
+
+        # An older message_id never moves the cursor back
+        self.client.post(f'/api/chat/rooms/{self.room.id}/read/', {'message_id': self.messages[0].id})
+        self.assertEqual(self.unread_count(), 0)
+
+    def test_is_read_comes_from_other_participants_cursors(self):
+        self.client.post(f'/api/chat/rooms/{self.room.id}/read/', {'message_id': self.messages[2].id})
+        self.client.force_authenticate(self.bob)
+        for fast in (False, True):
+            with self.settings(FAST_LIST_RESPONSES=fast):
+                response = self.client.get(f'/api/chat/rooms/{self.room.id}/messages/')
+            self.assertEqual([message['is_read'] for message in response.data['results']], [True, True, True, False])
+
+
+class InboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob, cls.carol = [
+            User.objects.create_user(username=name, email=f'{name}@example.com', password='pass1234')
+            for name in ('alice', 'bob', 'carol')
+        ]
+        cls.room = ChatRoom.objects.create(room_type='group', name='trio', created_by=cls.alice)
+        cls.room.participants.add(cls.alice, cls.bob)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def send(self, user, content, room=None):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/chat/messages/send/', {'room': (room or self.room).id, 'content': content})
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def rooms(self, user):
+        self.client.force_authenticate(user)
+        return self.client.get('/api/chat/rooms/').data['results']
+
+    def test_messages_update_preview_and_unread_counts(self):
+        self.send(self.alice, 'hi')
+        last_id = self.send(self.bob, 'x' * 300)
+
+        room = self.rooms(self.alice)[0]
+        self.assertEqual(room['last_message']['id'], last_id)
+        self.assertEqual(room['last_message']['sender']['id'], self.bob.id)
+        self.assertEqual(room['last_message']['content'], 'x' * 100)
+        self.assertEqual(room['unread_count'], 1)
+        self.assertEqual(self.rooms(self.bob)[0]['unread_count'], 1)
+
+        # A late joiner starts with the whole history unread
+        self.room.participants.add(self.carol)
+        self.assertEqual(self.rooms(self.carol)[0]['unread_count'], 2)
+
+        self.client.force_authenticate(self.carol)
+        first_id = Message.objects.order_by('id').values_list('id', flat=True).first()
+        self.client.post(f'/api/chat/rooms/{self.room.id}/read/', {'message_id': first_id})
+        self.assertEqual(self.rooms(self.carol)[0]['unread_count'], 1)
+        self.client.post(f'/api/chat/rooms/{self.room.id}/read/')
+        self.assertEqual(self.rooms(self.carol)[0]['unread_count'], 0)
+
+    def test_write_behind_batch_counts_per_sender(self):
+        batch = [Message(room=self.room, sender=sender, content='m') for sender in (self.alice, self.alice, self.bob)]
+        writer.MessageWriter(flush_interval=60, batch_size=10, max_pending=100).write(batch)
+        self.assertEqual(ReadState.get_cursors(self.room.id), {self.alice.id: 0, self.bob.id: 0})
+        self.assertEqual(
+            dict(ReadState.objects.values_list('user_id', 'unread_count')),
+            {self.alice.id: 1, self.bob.id: 2}
+        )
+        self.assertEqual(ChatRoom.objects.get(id=self.room.id).last_message_id, batch[-1].id)
+
+    def test_room_list_queries_do_not_grow_with_rooms(self):
+        def query_count():
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(self.client.get('/api/chat/rooms/').status_code, 200)
+            return len(context.captured_queries)
+
+        self.send(self.bob, 'hello')
+        self.client.force_authenticate(self.alice)
+        baseline = query_count()
+        for i in range(5):
+            room = ChatRoom.objects.create(room_type='group', name=str(i), created_by=self.bob)
+            room.participants.add(self.alice, self.bob, self.carol)
+            self.send(self.carol, 'hello', room)
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(query_count(), baseline)
+        self.assertEqual(len(self.rooms(self.alice)), 6)
+
+
+class MessageHistoryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username='alice', email='alice@example.com', password='pass1234')
+        cls.room = ChatRoom.objects.create(room_type='group', created_by=cls.alice)
+        cls.room.participants.add(cls.alice)
+        cls.messages = Message.objects.bulk_create([
+            Message(room=cls.room, sender=cls.alice, content=str(i)) for i in range(12)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [message['content'] for message in response.data['results']], response.data
+
+    def test_latest_first_then_before_and_after(self):
+        for fast in (False, True):
+            with self.settings(FAST_LIST_RESPONSES=fast):
+                contents, data = self.page(f'/api/chat/rooms/{self.room.id}/messages/?page_size=5')
+                self.assertEqual(contents, ['7', '8', '9', '10', '11'])
+                self.assertIsNone(data['next'])
+
+                contents, data = self.page(data['previous'])
+                self.assertEqual(contents, ['2', '3', '4', '5', '6'])
+                contents, older = self.page(data['previous'])
+                self.assertEqual(contents, ['0', '1'])
+                self.assertIsNone(older['previous'])
+
+                contents, data = self.page(older['next'])
+                self.assertEqual(contents, ['2', '3', '4', '5', '6'])
+                contents, data = self.page(data['next'])
+                self.assertEqual(contents, ['7', '8', '9', '10', '11'])
+                self.assertIsNone(data['next'])
+
+    def test_queries_do_not_grow_with_history(self):
+        def query_count():
+            with CaptureQueriesContext(connection) as context:
+                self.client.get(f'/api/chat/rooms/{self.room.id}/messages/')
+            return len(context.captured_queries)
+
+        for fast in (False, True):
+            with self.settings(FAST_LIST_RESPONSES=fast):
+                baseline = query_count()
+                more = Message.objects.bulk_create([
+                    Message(room=self.room, sender=self.alice, content='x') for _ in range(300)
+                ])
+                # Membership check, the page with its senders joined, and the read cursors
+                self.assertEqual(query_count(), baseline)
+                self.assertEqual(baseline, 3)
+                Message.objects.filter(id__in=[message.id for message in more]).delete()
+
+
+class ChatRoomCreateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob, cls.carol = [
+            User.objects.create_user(username=name, email=f'{name}@example.com', password='pass1234')
+            for name in ('alice', 'bob', 'carol')
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def create(self, user, **data):
+        self.client.force_authenticate(user)
+        return self.client.post('/api/chat/rooms/create/', data, format='json')
+
+    def test_direct_room_is_shared_by_the_pair(self):
+        first = self.create(self.alice, participants=[self.bob.id])
+        self.assertEqual(first.status_code, 201)
+        # Either side finds the same room by its key
+        second = self.create(self.bob, participants=[self.alice.id])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(ChatRoom.objects.get(id=first.data['id']).direct_key, f'{self.alice.id}:{self.bob.id}')
+
+        self.assertEqual(self.create(self.alice, participants=[999999]).status_code, 404)
+        self.assertEqual(self.create(self.alice, participants='bob').status_code, 400)
+
+    def test_duplicate_direct_key_is_rejected(self):
+        room, created = ChatRoom.get_or_create_direct(self.alice, self.bob.id)
+        self.assertTrue(created)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ChatRoom.objects.create(room_type='direct', direct_key=room.direct_key, created_by=self.bob)
+        self.assertEqual(ChatRoom.get_or_create_direct(self.bob, self.alice.id), (room, False))
 
-# Create your tests here.
+    def test_group_participants_are_added_in_one_insert(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.create(self.alice, room_type='group', name='g', participants=[self.bob.id, self.carol.id, 999999])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            sorted(user['id'] for user in response.data['participants']),
+            [self.alice.id, self.bob.id, self.carol.id]
+        )
+        inserts = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('INSERT') and '"chat_chatroom_participants" (' in query['sql']
+        ]
+        self.assertEqual(len(inserts), 1)
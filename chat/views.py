@@ -1,23 +1,37 @@
 from rest_framework import generics, status, permissions
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from rest_framework.views import APIView
 from django.contrib.auth import get_user_model
-from django.db.models import Q
-from .models import ChatRoom, Message
-from .serializers import ChatRoomSerializer, MessageSerializer
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from . import inbox
+from .models import ChatRoom, Message, ReadState
+from friends.views import get_id_list
+from social_backend.fastpath import FastListMixin
+from social_backend.pagination import KeysetPagination
+from .serializers import ChatRoomSerializer, MessageSerializer, MESSAGE_FAST_COLUMNS, build_message_list
 
 User = get_user_model()
 
 
+def with_inbox_state(rooms, user):
+    """Everything ChatRoomSerializer reads, in one query plus one for participants"""
+    return rooms.annotate(unread_count=Subquery(
+        ReadState.objects.filter(room=OuterRef('pk'), user=user).values('unread_count')[:1]
+    )).select_related('created_by', 'last_message_sender').prefetch_related('participants')
+
+
 class ChatRoomListView(generics.ListAPIView):
     """List all chat rooms for the current user"""
     serializer_class = ChatRoomSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return ChatRoom.objects.filter(
+        return with_inbox_state(ChatRoom.objects.filter(
             participants=self.request.user
-        ).order_by('-updated_at')
+        ), self.request.user).order_by('-updated_at')
 
 
 class ChatRoomCreateView(APIView):
@@ -26,46 +40,44 @@ class ChatRoomCreateView(APIView):
 
     def post(self, request):
         room_type = request.data.get('room_type', 'direct')
-        participant_ids = request.data.get('participants', [])
+        participant_ids = get_id_list(request.data, 'participants')
         name = request.data.get('name', '')
 
+        if participant_ids is None:
+            return Response(
+                {'error': 'participants must be a list of user IDs'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         if not participant_ids:
             return Response(
                 {'error': 'At least one participant is required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # For direct messages, check if room already exists
+        # Unknown IDs are skipped
+        user_ids = set(User.objects.filter(id__in=participant_ids).values_list('id', flat=True))
+
+        # A direct message between two users always reuses their room
         if room_type == 'direct' and len(participant_ids) == 1:
-            other_user_id = participant_ids[0]
-            existing_room = ChatRoom.objects.filter(
-                room_type='direct',
-                participants=request.user
-            ).filter(
-                participants__id=other_user_id
-            ).first()
-
-            if existing_room:
+            if not user_ids:
                 return Response(
-                    ChatRoomSerializer(existing_room, context={'request': request}).data,
-                    status=status.HTTP_200_OK
+                    {'error': 'User not found'},
+                    status=status.HTTP_404_NOT_FOUND
                 )
+            chat_room, created = ChatRoom.get_or_create_direct(request.user, participant_ids[0])
+            return Response(
+                ChatRoomSerializer(chat_room, context={'request': request}).data,
+                status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+            )
 
-        # Create new room
-        chat_room = ChatRoom.objects.create(
-            room_type=room_type,
-            name=name,
-            created_by=request.user
-        )
-
-        # Add participants
-        chat_room.participants.add(request.user)
-        for user_id in participant_ids:
-            try:
-                user = User.objects.get(id=user_id)
-                chat_room.participants.add(user)
-            except User.DoesNotExist:
-                pass
+        with transaction.atomic():
+            chat_room = ChatRoom.objects.create(
+                room_type=room_type,
+                name=name,
+                created_by=request.user
+            )
+            # One bulk insert into the participants table
+            chat_room.participants.add(request.user.id, *user_ids)
 
         return Response(
             ChatRoomSerializer(chat_room, context={'request': request}).data,
@@ -79,13 +91,80 @@ class ChatRoomDetailView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return ChatRoom.objects.filter(participants=self.request.user)
-
-
-class MessageListView(generics.ListAPIView):
-    """List all messages in a chat room"""
+        return with_inbox_state(ChatRoom.objects.filter(participants=self.request.user), self.request.user)
+
+
+class MessageHistoryPagination(KeysetPagination):
+    """
+    Chat history keyed on (created_at, id), starting from the newest messages.
+
+    Without a cursor the page holds the latest messages; `before` pages back
+    into history and `after` forward from a message, e.g. to catch up after
+    a reconnect. Either way it is one range scan of message_room_created_idx,
+    so a room with a million messages opens as fast as one with ten. Results
+    are oldest-first within the page; `previous` links to older messages and
+    `next` to newer ones.
+    """
+    page_size = 50
+    max_page_size = 200
+    ordering = ('created_at', 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = remove_query_param(
+            remove_query_param(request.build_absolute_uri(), 'before'), 'after'
+        )
+        self.page_size = self.get_page_size(request)
+        self.fields = list(self.ordering)
+
+        before = self.decode_cursor(request, 'before')
+        after = self.decode_cursor(request, 'after')
+        if before and after:
+            raise NotFound('Use either before or after, not both')
+
+        scan_descending = after is None
+        queryset = queryset.order_by(*[f'-{field}' if scan_descending else field for field in self.fields])
+        cursor = before or after
+        if cursor:
+            queryset = queryset.filter(self.build_filter(cursor['k'], scan_descending))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if scan_descending:
+            rows.reverse()
+
+        self.page = rows
+        # The cursor message itself lies on the other side of the page
+        self.has_previous = has_more if scan_descending else bool(rows)
+        self.has_next = has_more if not scan_descending else (before is not None and bool(rows))
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.base_url, 'after', self.encode_key(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return replace_query_param(self.base_url, 'before', self.encode_key(self.page[0]))
+
+
+class MessageListView(FastListMixin, generics.ListAPIView):
+    """List messages in a chat room, newest page first (see MessageHistoryPagination)"""
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MessageHistoryPagination
+    fast_columns = MESSAGE_FAST_COLUMNS
+
+    def build_fast_data(self, rows):
+        return build_message_list(rows, self.request, ReadState.get_cursors(self.kwargs.get('room_id')))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['read_cursors'] = ReadState.get_cursors(self.kwargs.get('room_id'))
+        return context
 
     def get_queryset(self):
         room_id = self.kwargs.get('room_id')
@@ -96,7 +175,7 @@ class MessageListView(generics.ListAPIView):
         except ChatRoom.DoesNotExist:
             return Message.objects.none()
 
-        return Message.objects.filter(room_id=room_id).order_by('created_at')
+        return Message.objects.filter(room_id=room_id).select_related('sender')
 
 
 class MessageCreateView(generics.CreateAPIView):
@@ -116,10 +195,9 @@ class MessageCreateView(generics.CreateAPIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        serializer.save(sender=self.request.user)
-
-        # Update room's updated_at
-        room.save()
+        # The message and its inbox updates (chat.signals) commit together
+        with transaction.atomic():
+            serializer.save(sender=self.request.user)
 
 
 class MarkMessagesReadView(APIView):
@@ -135,17 +213,20 @@ class MarkMessagesReadView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Mark all unread messages as read
-        messages = Message.objects.filter(
-            room=room
-        ).exclude(sender=request.user).exclude(read_by=request.user)
+        message_id = request.data.get('message_id')
+        if message_id is not None:
+            try:
+                message_id = int(message_id)
+            except (TypeError, ValueError):
+                return Response(
+                    {'error': 'message_id must be an integer'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
-        for message in messages:
-            message.read_by.add(request.user)
-            message.is_read = True
-            message.save()
+        # Cursor and unread count move together in one UPDATE
+        inbox.mark_read(room, request.user, message_id)
 
         return Response(
-            {'message': f'{messages.count()} messages marked as read'},
+            {'message': 'Messages marked as read'},
             status=status.HTTP_200_OK
         )
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+Write-behind persistence for WebSocket chat messages (CHAT_WRITE_BEHIND).
+
+With it on, ChatConsumer builds each Message in memory (its snowflake ID
+comes from the field default), broadcasts it straight away and hands the
+row to the MessageWriter of its event loop. A background task bulk_creates
+the buffer every CHAT_WRITE_BEHIND_FLUSH_MS milliseconds, or as soon as
+CHAT_WRITE_BEHIND_BATCH_SIZE rows are waiting.
+
+Each batch is written together with its chat.inbox updates in one
+transaction. A failed flush keeps its rows and is retried with the same IDs,
+so every broadcast message is stored at least once. A retry whose earlier
+commit did succeed (only its acknowledgement was lost) skips the rows
+already stored as they are; a stored row that differs is a genuine ID
+collision, which is logged as an error rather than swallowed. Any other
+constraint failure (say, the room was deleted meanwhile) makes the batch go
+in row by row; rows that still fail are logged in full and dropped, so one
+bad row never blocks the buffer. Only a crash loses messages: at
+most the unflushed buffer. Once CHAT_WRITE_BEHIND_MAX_PENDING rows are
+waiting, for example while the database is down, senders wait for a flush,
+which bounds both memory and that loss window. Setting MAX_PENDING to 1
+gives synchronous durability with batching across concurrent senders.
+"""
+import asyncio
+import logging
+import weakref
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from . import inbox
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+_writers = weakref.WeakKeyDictionary()  # one writer per event loop
+
+
+class MessageWriter:
+    """Buffers Message rows and writes them in batches from a background task"""
+
+    def __init__(self, flush_interval, batch_size, max_pending):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.pending = []
+        self.lock = asyncio.Lock()
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    async def add(self, message):
+        self.pending.append(message)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        if len(self.pending) >= self.batch_size:
+            self.wakeup.set()
+        while len(self.pending) >= self.max_pending:
+            # Backpressure: wait for the database instead of buffering without bound
+            if not await self.flush():
+                await asyncio.sleep(self.flush_interval)
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            if not await self.flush():
+                await asyncio.sleep(self.flush_interval)
+
+    async def flush(self):
+        """Write everything buffered so far; False if the database refused a batch"""
+        async with self.lock:
+            while self.pending:
+                batch = self.pending[:self.batch_size]
+                try:
+                    await database_sync_to_async(self.write)(batch)
+                except Exception:
+                    logger.exception('Persisting %d chat messages failed; will retry', len(batch))
+                    return False
+                del self.pending[:len(batch)]
+        return True
+
+    def write(self, batch):
+        try:
+            self.insert(batch)
+            return
+        except IntegrityError:
+            pass
+
+        stored = Message.objects.in_bulk([message.id for message in batch])
+        collisions = [
+            message.id for message in batch
+            if message.id in stored and not is_same_message(stored[message.id], message)
+        ]
+        if collisions:
+            logger.error(
+                'Message ID collision: %d broadcast messages not stored (IDs %s); '
+                'check for duplicate pinned CHAT_WORKER_ID values',
+                len(collisions), collisions
+            )
+        remaining = [message for message in batch if message.id not in stored]
+        try:
+            self.insert(remaining)
+        except IntegrityError:
+            # Some row breaks a constraint: store the others one by one
+            for message in remaining:
+                try:
+                    self.insert([message])
+                except IntegrityError as error:
+                    logger.error(
+                        'Dropping chat message %s (room %s, sender %s, created %s, content %r): %s',
+                        message.id, message.room_id, message.sender_id, message.created_at, message.content, error
+                    )
+
+    def insert(self, batch):
+        if not batch:
+            return
+        with transaction.atomic():
+            Message.objects.bulk_create(batch)
+            inbox.record_messages(batch)
+
+
+def is_same_message(stored, message):
+    fields = ('room_id', 'sender_id', 'content', 'created_at')
+    return all(getattr(stored, field) == getattr(message, field) for field in fields)
+
+
+def get_writer():
+    loop = asyncio.get_running_loop()
+    writer = _writers.get(loop)
+    if writer is None:
+        writer = _writers[loop] = MessageWriter(
+            settings.CHAT_WRITE_BEHIND_FLUSH_MS / 1000,
+            settings.CHAT_WRITE_BEHIND_BATCH_SIZE,
+            settings.CHAT_WRITE_BEHIND_MAX_PENDING,
+        )
+    return writer
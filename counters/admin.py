@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import CounterShard
+
+
+@admin.register(CounterShard)
+class CounterShardAdmin(admin.ModelAdmin):
+    list_display = ['id', 'model_label', 'object_id', 'field', 'shard', 'delta']
+    list_filter = ['model_label', 'field']
+    search_fields = ['object_id']
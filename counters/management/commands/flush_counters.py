@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from counters import sharded
+
+
+class Command(BaseCommand):
+    help = 'Folds pending sharded counter deltas into their counter columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--interval', type=float, default=0, help='Keep running, flushing every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = 0
+            while True:
+                count = sharded.flush(options['batch_size'])
+                flushed += count
+                if count < options['batch_size']:
+                    break
+            self.stdout.write(self.style.SUCCESS(f'✓ Flushed {flushed} counters'))
+
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
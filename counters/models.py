@@ -0,0 +1,35 @@
+from django.db import models
+
+
+class CounterShard(models.Model):
+    """Pending delta for one shard of a denormalized counter column"""
+    model_label = models.CharField(max_length=100)  # e.g. 'posts.post'
+    object_id = models.BigIntegerField()
+    field = models.CharField(max_length=50)
+    shard = models.PositiveSmallIntegerField()
+    delta = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('model_label', 'object_id', 'field', 'shard')
+
+    def __str__(self):
+        return f"{self.model_label}:{self.object_id}.{self.field}[{self.shard}] {self.delta:+d}"
+
+
+class ShardedCountersMixin:
+    """
+    Model mixin for denormalized counters maintained through CounterShard.
+
+    Counter columns are only ever changed by flush() with F() updates, so a
+    plain save() of an existing row leaves them out instead of writing back a
+    stale copy and losing concurrent updates.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
@@ -0,0 +1,26 @@
+from django.db import models
+from rest_framework import serializers
+from . import sharded
+
+
+class ShardedCountersSerializerMixin:
+    """Serializes counter fields with their unflushed shard deltas included"""
+
+    def to_representation(self, instance):
+        if not getattr(self, 'counters_applied', False):
+            sharded.apply_pending([instance])
+        return super().to_representation(instance)
+
+
+class ShardedCountersListSerializer(serializers.ListSerializer):
+    """Applies pending counter deltas for a whole list in one query"""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.Manager) else data)
+        if not getattr(self.child, 'counters_applied', False):
+            sharded.apply_pending(self.get_counted_objects(items))
+            self.child.counters_applied = True
+        return super().to_representation(items)
+
+    def get_counted_objects(self, items):
+        return items
@@ -0,0 +1,132 @@
+"""
+Write-buffered sharded counters.
+
+increment() records a delta against one of COUNTER_SHARDS rows picked at
+random, so concurrent likes on one hot post spread over several rows instead
+of all contending for the post row. Reads add the pending deltas to the
+denormalized column (apply_pending), and the flush_counters command folds
+them back into that column with F() updates. Code that makes decisions on a
+counter reads its total (get_total, annotate_total) rather than the column,
+which lags by up to one flush interval.
+"""
+import random
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import BigIntegerField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from .models import CounterShard
+
+
+def increment(model, object_id, field, amount=1):
+    """Atomically add `amount` to a counter without touching the counted row"""
+    key = {
+        'model_label': model._meta.label_lower,
+        'object_id': object_id,
+        'field': field,
+        'shard': random.randrange(settings.COUNTER_SHARDS),
+    }
+    while True:
+        if CounterShard.objects.filter(**key).update(delta=F('delta') + amount):
+            return
+        try:
+            with transaction.atomic():
+                CounterShard.objects.create(delta=amount, **key)
+            return
+        except IntegrityError:
+            # Another request created the shard first; retry the update
+            continue
+
+
+def decrement(model, object_id, field, amount=1):
+    increment(model, object_id, field, -amount)
+
+
+def increment_many(model, deltas):
+    """
+    Apply {(object_id, field): amount} in one upsert, e.g. the counters touched
+    by a bulk follow, instead of an UPDATE (or INSERT) per counter.
+    """
+    rows = [
+        (model._meta.label_lower, object_id, field, random.randrange(settings.COUNTER_SHARDS), amount)
+        for (object_id, field), amount in deltas.items() if amount
+    ]
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        for _, object_id, field, _, amount in rows:
+            increment(model, object_id, field, amount)
+        return
+
+    table = connection.ops.quote_name(CounterShard._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} (model_label, object_id, field, shard, delta) VALUES (%s, %s, %s, %s, %s) '
+            f'ON CONFLICT (model_label, object_id, field, shard) DO UPDATE SET delta = {table}.delta + excluded.delta',
+            rows
+        )
+
+
+def get_pending(model, object_ids, fields):
+    """Unflushed deltas as {(object_id, field): total}, in one aggregate query"""
+    if not object_ids or not fields:
+        return {}
+    totals = CounterShard.objects.filter(
+        model_label=model._meta.label_lower,
+        object_id__in=object_ids,
+        field__in=fields
+    ).values('object_id', 'field').annotate(total=Sum('delta')).order_by()
+    return {(row['object_id'], row['field']): row['total'] for row in totals}
+
+
+def get_total(obj, field):
+    """A counter of a loaded object, including its unflushed deltas"""
+    pending = get_pending(type(obj), [obj.pk], [field])
+    return getattr(obj, field) + pending.get((obj.pk, field), 0)
+
+
+def annotate_total(queryset, field):
+    """Annotate `<field>_total`, the counter column plus its unflushed deltas, to filter on in SQL"""
+    pending = CounterShard.objects.filter(
+        model_label=queryset.model._meta.label_lower,
+        object_id=OuterRef('pk'),
+        field=field
+    ).values('object_id').annotate(total=Sum('delta')).values('total')
+    return queryset.annotate(**{
+        f'{field}_total': F(field) + Coalesce(Subquery(pending, output_field=BigIntegerField()), Value(0))
+    })
+
+
+def apply_pending(objects):
+    """Add unflushed deltas to the counter attributes of already-loaded objects"""
+    objects = [obj for obj in objects if obj is not None]
+    if not objects:
+        return objects
+
+    model = type(objects[0])
+    fields = model.counter_fields
+    pending = get_pending(model, {obj.pk for obj in objects}, fields)
+    if pending:
+        for obj in objects:
+            for field in fields:
+                setattr(obj, field, getattr(obj, field) + pending.get((obj.pk, field), 0))
+    return objects
+
+
+def flush(batch_size=1000):
+    """Fold pending deltas into their counter columns; returns the number of counters flushed"""
+    keys = list(CounterShard.objects.values_list(
+        'model_label', 'object_id', 'field'
+    ).distinct().order_by()[:batch_size])
+
+    for model_label, object_id, field in keys:
+        with transaction.atomic():
+            shards = list(CounterShard.objects.select_for_update().filter(
+                model_label=model_label,
+                object_id=object_id,
+                field=field
+            ).values_list('id', 'delta'))
+            total = sum(delta for _, delta in shards)
+            if total:
+                apps.get_model(model_label).objects.filter(pk=object_id).update(**{field: F(field) + total})
+            CounterShard.objects.filter(id__in=[shard_id for shard_id, _ in shards]).delete()
+    return len(keys)
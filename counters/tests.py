@@ -0,0 +1,47 @@
+from django.test import TestCase
+from accounts.models import User
+from posts.models import Post
+from . import sharded
+from .models import CounterShard
+
+
+class ShardedCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author', email='author@example.com', password='pass1234')
+        cls.post = Post.objects.create(user=cls.user, caption='Hot post')
+
+    def test_pending_deltas_are_applied_on_read_and_flushed(self):
+        for _ in range(50):
+            sharded.increment(Post, self.post.id, 'likes_count')
+        sharded.decrement(Post, self.post.id, 'likes_count')
+
+        post = Post.objects.get(id=self.post.id)
+        self.assertEqual(post.likes_count, 0)
+        self.assertEqual(sharded.apply_pending([post])[0].likes_count, 49)
+
+        sharded.flush()
+        self.assertFalse(CounterShard.objects.exists())
+        self.assertEqual(Post.objects.get(id=self.post.id).likes_count, 49)
+
+    def test_totals_include_pending_deltas(self):
+        User.objects.filter(id=self.user.id).update(followers_count=10)
+        sharded.increment(User, self.user.id, 'followers_count', 5)
+        user = User.objects.get(id=self.user.id)
+
+        self.assertEqual(sharded.get_total(user, 'followers_count'), 15)
+        totals = sharded.annotate_total(User.objects.all(), 'followers_count')
+        self.assertEqual(totals.get(id=self.user.id).followers_count_total, 15)
+        self.assertTrue(totals.filter(followers_count_total__gt=12).exists())
+
+    def test_stale_save_does_not_overwrite_counters(self):
+        stale = User.objects.get(id=self.user.id)
+        sharded.increment(User, self.user.id, 'followers_count', 3)
+        sharded.flush()
+
+        stale.bio = 'Updated bio'
+        stale.save()
+        user = User.objects.get(id=self.user.id)
+        self.assertEqual(user.followers_count, 3)
+        self.assertEqual(user.bio, 'Updated bio')
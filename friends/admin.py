@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Friendship, Follow
+from .models import Friendship, FriendEdge, Follow, FriendSuggestion
 
 
 @admin.register(Friendship)
@@ -28,3 +28,15 @@ class FriendshipAdmin(admin.ModelAdmin):
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):    list_filter = ['created_at']
+
+
+@admin.register(FriendSuggestion)
+class FriendSuggestionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'suggested_user', 'mutual_count', 'created_at']
+    raw_id_fields = ['user', 'suggested_user']
+
+
+@admin.register(FriendEdge)
+class FriendEdgeAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'friend', 'since']
+    raw_id_fields = ['user', 'friend']
@@ -0,0 +1,69 @@
+"""
+Bulk follow and unfollow.
+
+Onboarding follows dozens of accounts at once. These helpers do it in one
+transaction with a fixed number of statements whatever the number of users:
+the Follow rows in one bulk_create or DELETE, every counter in one
+sharded.increment_many upsert, the suggestion queue in one INSERT and the
+follower's timeline in one rebuild.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from counters import sharded
+from posts import timeline
+from . import signals
+from .models import Follow
+
+User = get_user_model()
+
+
+def lock_follower(user):
+    # Serializes bulk changes by the same user, so counters match the rows actually written
+    list(User.objects.select_for_update().filter(id=user.id).values_list('id', flat=True))
+
+
+def update_counts(user, user_ids, amount):
+    deltas = {(user_id, 'followers_count'): amount for user_id in user_ids}
+    deltas[(user.id, 'following_count')] = amount * len(user_ids)
+    sharded.increment_many(User, deltas)
+
+
+def follow_many(user, user_ids):
+    """Follow every existing user in user_ids; returns the IDs newly followed"""
+    with transaction.atomic():
+        lock_follower(user)
+        already = set(Follow.objects.filter(
+            follower=user,
+            following_id__in=user_ids
+        ).values_list('following_id', flat=True))
+        new_ids = sorted(
+            set(User.objects.filter(id__in=user_ids).exclude(id=user.id).values_list('id', flat=True)) - already
+        )
+        if not new_ids:
+            return []
+
+        follows = [Follow(follower=user, following_id=user_id) for user_id in new_ids]
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        # bulk_create sends no post_save; run the receiver for each row with the refreshes batched
+        with signals.batched():
+            for follow in follows:
+                signals.follow_saved(Follow, follow, created=True)
+        update_counts(user, new_ids, 1)
+        timeline.rebuild_timeline(user)
+    return new_ids
+
+
+def unfollow_many(user, user_ids):
+    """Unfollow every followed user in user_ids; returns the IDs unfollowed"""
+    with transaction.atomic():
+        lock_follower(user)
+        follows = Follow.objects.filter(follower=user, following_id__in=user_ids)
+        removed_ids = sorted(follows.values_list('following_id', flat=True))
+        if not removed_ids:
+            return []
+
+        with signals.batched():
+            follows.delete()
+        update_counts(user, removed_ids, -1)
+        timeline.rebuild_timeline(user)
+    return removed_ids
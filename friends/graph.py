@@ -0,0 +1,301 @@
+"""
+In-memory friend/follow graph.
+
+Accepted friendships and follows are held per process as CSR adjacency
+lists: for each edge kind an offsets array indexed by user ID and one packed
+array of sorted neighbour IDs (uint32). That costs 4 bytes per directed
+edge, so 8 bytes per friendship (stored in both directions) and 8 bytes per
+follow (in the following and followers lists), plus 8 bytes per user ID per
+kind for the offsets. 10M friendships take about 80 MB.
+
+The packed arrays are immutable. Changes arrive through the model signals in
+friends.signals (after commit) and go into a small per-user overlay of added
+and removed neighbours. The graph is rebuilt from the database in a
+background thread once the overlay holds FRIEND_GRAPH_MAX_PENDING changes,
+and every FRIEND_GRAPH_MAX_AGE seconds to pick up changes made by other
+processes; requests keep reading the previous snapshot until it is swapped.
+
+Server processes call warm() from the ASGI/WSGI entry points, so the first
+load also happens in the background rather than inside a request. Requests
+arriving before it finishes wait for that load instead of starting another.
+"""
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+from django.db.models import Max
+from .models import Follow, FriendEdge
+
+logger = logging.getLogger(__name__)
+
+class CSR:
+    """Sorted adjacency lists packed into an offsets and a targets array"""
+
+    def __init__(self, offsets, targets):
+        self.offsets = offsets
+        self.targets = targets
+
+    @classmethod
+    def from_sorted_pairs(cls, pairs, size):
+        """Build from (source, target) pairs sorted by source then target; size is max ID + 1"""
+        counts = array('Q', bytes(8 * (size + 1)))
+        targets = array('I')
+        for source, target in pairs:
+            if source >= len(counts) - 1:
+                # A user created after `size` was read
+                counts.extend(array('Q', bytes(8 * (source + 2 - len(counts)))))
+            targets.append(target)
+            counts[source + 1] += 1
+        return cls(array('Q', accumulate(counts)), targets)
+
+    @property
+    def size(self):
+        return len(self.offsets) - 1
+
+    def neighbors(self, node):
+        if node >= self.size:
+            return array('I')
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def degree(self, node):
+        if node >= self.size:
+            return 0
+        return self.offsets[node + 1] - self.offsets[node]
+
+    def contains(self, node, other):
+        if node >= self.size:
+            return False
+        start, end = self.offsets[node], self.offsets[node + 1]
+        index = bisect_left(self.targets, other, start, end)
+        return index < end and self.targets[index] == other
+
+    def memory_usage(self):
+        return self.offsets.itemsize * len(self.offsets) + self.targets.itemsize * len(self.targets)
+
+
+class Adjacency:
+    """A CSR plus an overlay of changes made since it was built"""
+
+    def __init__(self, csr):
+        self.csr = csr
+        # Invariants: added is disjoint from the CSR, removed is a subset of it
+        self.added = {}
+        self.removed = {}
+        self.pending = 0
+
+    def add(self, node, other):
+        if other in self.removed.get(node, ()):
+            self.removed[node].discard(other)
+        elif not self.csr.contains(node, other):
+            self.added.setdefault(node, set()).add(other)
+        else:
+            return
+        self.pending += 1
+
+    def remove(self, node, other):
+        if other in self.added.get(node, ()):
+            self.added[node].discard(other)
+        elif self.csr.contains(node, other) and other not in self.removed.get(node, ()):
+            self.removed.setdefault(node, set()).add(other)
+        else:
+            return
+        self.pending += 1
+
+    def neighbors(self, node):
+        base = self.csr.neighbors(node)
+        added, removed = self.added.get(node), self.removed.get(node)
+        if not added and not removed:
+            return base
+        return array('I', sorted(set(base).difference(removed or ()).union(added or ())))
+
+    def degree(self, node):
+        return self.csr.degree(node) + len(self.added.get(node, ())) - len(self.removed.get(node, ()))
+
+    def contains(self, node, other):
+        if other in self.added.get(node, ()):
+            return True
+        if other in self.removed.get(node, ()):
+            return False
+        return self.csr.contains(node, other)
+
+
+def intersect(first, second):
+    """Sorted intersection of two sorted ID arrays"""
+    if len(first) > len(second):
+        first, second = second, first
+    if not first:
+        return []
+    # Probe the longer list when it is much longer than the shorter one
+    if len(first) * 16 < len(second):
+        result = []
+        start = 0
+        for value in first:
+            start = bisect_left(second, value, start)
+            if start == len(second):
+                break
+            if second[start] == value:
+                result.append(value)
+        return result
+    return sorted(set(first).intersection(second))
+
+
+class FriendGraph:
+    """Friends, following and followers adjacency for every user"""
+
+    def __init__(self, adjacency):
+        self.adjacency = adjacency
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def load(cls):
+        """Stream every accepted friendship and follow from the database, in ID order"""
+        size = (get_user_model().objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        friend_pairs = FriendEdge.objects.values_list('user_id', 'friend_id').order_by('user_id', 'friend_id')
+        following = Follow.objects.values_list('follower_id', 'following_id').order_by('follower_id', 'following_id')
+        followers = Follow.objects.values_list('following_id', 'follower_id').order_by('following_id', 'follower_id')
+        return cls({
+            'friends': Adjacency(CSR.from_sorted_pairs(friend_pairs.iterator(chunk_size=10000), size)),
+            'following': Adjacency(CSR.from_sorted_pairs(following.iterator(chunk_size=10000), size)),
+            'followers': Adjacency(CSR.from_sorted_pairs(followers.iterator(chunk_size=10000), size)),
+        })
+
+    def apply(self, change):
+        """Apply one ('friend' | 'follow', added, user_id, other_id) change"""
+        edge, added, user_id, other_id = change
+        if edge == 'friend':
+            updates = [('friends', user_id, other_id), ('friends', other_id, user_id)]
+        else:
+            updates = [('following', user_id, other_id), ('followers', other_id, user_id)]
+        for kind, node, other in updates:
+            adjacency = self.adjacency[kind]
+            if added:
+                adjacency.add(node, other)
+            else:
+                adjacency.remove(node, other)
+
+    @property
+    def pending(self):
+        return sum(adjacency.pending for adjacency in self.adjacency.values())
+
+    def neighbors(self, kind, user_id):
+        return self.adjacency[kind].neighbors(user_id)
+
+    def degree(self, kind, user_id):
+        return self.adjacency[kind].degree(user_id)
+
+    def are_friends(self, user_id, other_id):
+        return self.adjacency['friends'].contains(user_id, other_id)
+
+    def is_following(self, user_id, other_id):
+        return self.adjacency['following'].contains(user_id, other_id)
+
+    def mutual_friends(self, user_id, other_id):
+        return intersect(self.neighbors('friends', user_id), self.neighbors('friends', other_id))
+
+    def mutual_friends_count(self, user_id, other_id):
+        return len(self.mutual_friends(user_id, other_id))
+
+    def mutual_friends_counts(self, user_id, other_ids):
+        """{other_id: mutual friend count} for a whole list, e.g. a page of search results"""
+        friends = set(self.neighbors('friends', user_id))
+        return {other_id: len(friends.intersection(self.neighbors('friends', other_id))) for other_id in other_ids}
+
+    def memory_usage(self):
+        return sum(adjacency.csr.memory_usage() for adjacency in self.adjacency.values())
+
+
+_graph = None
+_lock = threading.Lock()
+_reloading = None  # changes seen while a background reload runs
+_reloaded = threading.Condition(_lock)
+_refresher = None
+
+
+def get_graph():
+    """The process-wide graph, reloaded in the background when older than FRIEND_GRAPH_MAX_AGE"""
+    global _graph
+    if _graph is None:
+        with _lock:
+            while _graph is None and _reloading is not None:
+                # warm() is loading it; don't build a second copy in this thread
+                _reloaded.wait()
+            if _graph is None:
+                # Not warmed (management commands, tests) or the background load failed
+                _graph = FriendGraph.load()
+    elif time.monotonic() - _graph.loaded_at > settings.FRIEND_GRAPH_MAX_AGE:
+        start_reload()
+    return _graph
+
+
+def warm():
+    """Load the graph in the background and keep refreshing it; called once per server process"""
+    global _refresher
+    start_reload()
+    with _lock:
+        if _refresher is not None:
+            return
+        _refresher = threading.Thread(target=refresh, name='friend-graph-refresh', daemon=True)
+    _refresher.start()
+
+
+def refresh():
+    while True:
+        time.sleep(settings.FRIEND_GRAPH_MAX_AGE)
+        start_reload()
+
+
+def start_reload():
+    global _reloading
+    with _lock:
+        if _reloading is not None:
+            return
+        _reloading = []
+    threading.Thread(target=reload, name='friend-graph-reload', daemon=True).start()
+
+
+def reload():
+    global _graph, _reloading
+    close_old_connections()
+    try:
+        graph = FriendGraph.load()
+    except Exception:
+        logger.exception('Reloading the friend graph failed')
+        graph = None
+    finally:
+        close_old_connections()
+
+    with _lock:
+        if graph is not None:
+            # Replay changes committed while loading; applying a change twice is harmless
+            for change in _reloading:
+                graph.apply(change)
+            _graph = graph
+        elif _graph is not None:
+            _graph.loaded_at = time.monotonic()
+        _reloading = None
+        _reloaded.notify_all()
+
+
+def record(change):
+    """Apply a committed change to the loaded graph, if any"""
+    with _lock:
+        if _graph is not None:
+            _graph.apply(change)
+        if _reloading is not None:
+            _reloading.append(change)
+        overflowing = _graph is not None and _graph.pending >= settings.FRIEND_GRAPH_MAX_PENDING
+    if overflowing:
+        start_reload()
+
+
+def reset():
+    """Drop the loaded graph; the next get_graph() loads it again"""
+    global _graph
+    with _lock:
+        _graph = None
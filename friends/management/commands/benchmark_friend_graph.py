@@ -0,0 +1,66 @@
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from friends.graph import CSR, Adjacency, FriendGraph
+
+
+class Command(BaseCommand):
+    help = 'Builds a synthetic friend graph in memory and measures its size and query latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000)
+        parser.add_argument('--edges', type=int, default=10000000, help='Friendships (stored in both directions)')
+        parser.add_argument('--queries', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        users, edges = options['users'], options['edges']
+        average_degree = 2 * edges // users
+
+        def pairs():
+            for user_id in range(1, users + 1):
+                degree = min(int(rng.expovariate(1 / average_degree)), users - 1)
+                for friend_id in sorted(rng.sample(range(1, users + 1), degree)):
+                    yield user_id, friend_id
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        csr = CSR.from_sorted_pairs(pairs(), users + 1)
+        build_time = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        friend_graph = FriendGraph({
+            'friends': Adjacency(csr),
+            'following': Adjacency(CSR.from_sorted_pairs([], users + 1)),
+            'followers': Adjacency(CSR.from_sorted_pairs([], users + 1)),
+        })
+        stored = len(csr.targets)
+        memory = csr.memory_usage()
+        self.stdout.write(f'Generated and packed {stored} adjacency entries for {users} users in {build_time:.1f} s')
+        self.stdout.write(
+            f'Memory: {memory / 2 ** 20:.1f} MB ({memory / stored:.2f} bytes per entry, '
+            f'{csr.targets.itemsize} for the neighbour ID); build peak {peak / 2 ** 20:.1f} MB'
+        )
+
+        pairs_to_query = [
+            (rng.randint(1, users), rng.randint(1, users)) for _ in range(options['queries'])
+        ]
+        for label, query in (
+            ('are_friends', friend_graph.are_friends),
+            ('mutual_friends_count', friend_graph.mutual_friends_count),
+            ('degree', lambda user_id, _: friend_graph.degree('friends', user_id)),
+        ):
+            timings = []
+            for user_id, other_id in pairs_to_query:
+                started = time.perf_counter()
+                query(user_id, other_id)
+                timings.append((time.perf_counter() - started) * 1e6)
+            timings.sort()
+            self.stdout.write(
+                f'{label:<22} p50 {statistics.median(timings):7.1f} µs  '
+                f'p99 {timings[int(len(timings) * 0.99) - 1]:7.1f} µs'
+            )
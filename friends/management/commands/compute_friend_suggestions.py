@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from friends import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Computes "people you may know" suggestions for users whose neighbourhood changed (or everyone)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every user instead of only queued ones')
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Only process these user IDs')
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (0 runs in-process)')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--top-k', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options['user_ids']:
+            user_ids = options['user_ids']
+        elif options['all']:
+            user_ids = None
+        else:
+            user_ids = 'queued'
+
+        start = time.perf_counter()
+        processed = suggestions.compute(
+            user_ids,
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            top_k=options['top_k']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Computed suggestions for {processed} users in {time.perf_counter() - start:.1f} s'
+        ))
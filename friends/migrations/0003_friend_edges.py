@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+
+def backfill_edges(apps, schema_editor):
+    Friendship = apps.get_model('friends', 'Friendship')
+    FriendEdge = apps.get_model('friends', 'FriendEdge')
+
+    # Walk accepted friendships in primary key batches; each becomes two edges
+    last_id = 0
+    while True:
+        batch = list(Friendship.objects.filter(
+            status='accepted', id__gt=last_id
+        ).order_by('id').values_list('id', 'from_user_id', 'to_user_id', 'updated_at')[:BATCH_SIZE])
+        if not batch:
+            break
+        FriendEdge.objects.bulk_create([
+            FriendEdge(user_id=user_id, friend_id=friend_id, since=since)
+            for _, from_id, to_id, since in batch
+            for user_id, friend_id in ((from_id, to_id), (to_id, from_id))
+        ], ignore_conflicts=True)
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0002_friend_suggestions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FriendEdge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('since', models.DateTimeField(default=django.utils.timezone.now)),
+                ('friend', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friend_edges', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-since', '-id'],
+                'indexes': [models.Index(fields=['user', 'since', 'id'], name='friendedge_user_since_idx')],
+                'unique_together': {('user', 'friend')},
+            },
+        ),
+        migrations.RunPython(backfill_edges, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friends', '0003_friend_edges'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['follower', 'created_at', 'id'], name='follow_follower_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['following', 'created_at', 'id'], name='follow_following_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['to_user', 'status', 'created_at', 'id'], name='friendship_to_status_idx'),
+        ),
+    ]
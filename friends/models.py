@@ -1,5 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from counters import sharded
 
 
 class Friendship(models.Model):
@@ -33,6 +36,9 @@ class Friendship(models.Model):
     class Meta:
         unique_together = ('from_user', 'to_user')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['to_user', 'status', 'created_at', 'id'], name='friendship_to_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.from_user.username} -> {self.to_user.username} ({self.status})"
@@ -43,16 +49,76 @@ class Friendship(models.Model):
         self.save()
 
         # Update followers/following count
-        self.from_user.following_count += 1
-        self.to_user.followers_count += 1
-        self.from_user.save()
-        self.to_user.save()
+        sharded.increment(get_user_model(), self.from_user_id, 'following_count')
+        sharded.increment(get_user_model(), self.to_user_id, 'followers_count')
 
     def reject(self):
         """Reject friend request"""
         self.status = 'rejected'
         self.save()
 
+    def unfriend(self):
+        """Delete the friendship (or request), undoing accept()"""
+        with transaction.atomic():
+            was_accepted = self.status == 'accepted'
+            self.delete()
+            if was_accepted:
+                sharded.decrement(get_user_model(), self.from_user_id, 'following_count')
+                sharded.decrement(get_user_model(), self.to_user_id, 'followers_count')
+
+    def block(self):
+        """Block to_user on behalf of from_user"""
+        with transaction.atomic():
+            was_accepted = self.status == 'accepted'
+            self.status = 'blocked'
+            self.save()
+            if was_accepted:
+                sharded.decrement(get_user_model(), self.from_user_id, 'following_count')
+                sharded.decrement(get_user_model(), self.to_user_id, 'followers_count')
+
+
+class FriendEdge(models.Model):
+    """
+    One direction of an accepted friendship, stored for both users, so a
+    user's friends are a single range scan over (user, since).
+    Kept in sync with Friendship by the signals in friends.signals.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='friend_edges'
+    )
+    friend = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    since = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('user', 'friend')
+        ordering = ['-since', '-id']
+        indexes = [
+            models.Index(fields=['user', 'since', 'id'], name='friendedge_user_since_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} <-> {self.friend_id}"
+
+    @classmethod
+    def link(cls, user_id, friend_id, since=None):
+        since = since or timezone.now()
+        cls.objects.bulk_create([
+            cls(user_id=user_id, friend_id=friend_id, since=since),
+            cls(user_id=friend_id, friend_id=user_id, since=since),
+        ], ignore_conflicts=True)
+
+    @classmethod
+    def unlink(cls, user_id, friend_id):
+        cls.objects.filter(
+            models.Q(user_id=user_id, friend_id=friend_id) | models.Q(user_id=friend_id, friend_id=user_id)
+        ).delete()
+
 
 class Follow(models.Model):
     """Model for following users (one-way relationship)"""
@@ -71,6 +137,46 @@ class Follow(models.Model):
     class Meta:
         unique_together = ('follower', 'following')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['follower', 'created_at', 'id'], name='follow_follower_created_idx'),
+            models.Index(fields=['following', 'created_at', 'id'], name='follow_following_created_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.follower.username} follows {self.following.username}"
\ No newline at end of file
+        return f"{self.follower.username} follows {self.following.username}"
+
+class FriendSuggestion(models.Model):
+    """Precomputed "people you may know" entry, written by compute_friend_suggestions"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='friend_suggestions'
+    )
+    suggested_user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    mutual_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'suggested_user')
+        ordering = ['-mutual_count', 'suggested_user_id']
+        indexes = [
+            models.Index(fields=['user', '-mutual_count'], name='suggestion_user_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.suggested_user_id} for {self.user_id} ({self.mutual_count} mutual)"
+
+
+class SuggestionRefresh(models.Model):
+    """User whose friend/follow neighbourhood changed since suggestions were last computed"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+'
+    )
+    requested_at = models.DateTimeField(auto_now_add=True)
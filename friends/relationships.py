@@ -0,0 +1,106 @@
+"""
+Relationship status between a viewer and other users.
+
+get_relationships() answers for a batch of users with two queries, one over
+Follow and one over Friendship, however many IDs are passed. Serializers
+read the same answers from a RelationshipResolver in their context.
+List serializers prime it with every user on the page, so the per-object
+serializers only read from its cache.
+"""
+from django.db import models
+from django.db.models import Q
+from rest_framework import serializers
+from .models import Follow, Friendship
+
+MAX_IDS = 200
+
+# Values of the `friendship` entry
+FRIENDS = 'friends'
+REQUEST_SENT = 'request_sent'
+REQUEST_RECEIVED = 'request_received'
+
+
+def empty_relationship():
+    return {
+        'following': False,
+        'followed_by': False,
+        'friendship': None,
+        'blocked': False,
+        'blocked_by': False,
+    }
+
+
+def get_relationships(viewer_id, user_ids):
+    """{user_id: relationship dict} from the viewer's point of view"""
+    relationships = {user_id: empty_relationship() for user_id in user_ids}
+    if not relationships:
+        return relationships
+    user_ids = list(relationships)
+
+    follows = Follow.objects.filter(
+        Q(follower_id=viewer_id, following_id__in=user_ids) | Q(following_id=viewer_id, follower_id__in=user_ids)
+    ).values_list('follower_id', 'following_id')
+    for follower_id, following_id in follows:
+        if follower_id == viewer_id and following_id in relationships:
+            relationships[following_id]['following'] = True
+        if following_id == viewer_id and follower_id in relationships:
+            relationships[follower_id]['followed_by'] = True
+
+    friendships = Friendship.objects.filter(
+        Q(from_user_id=viewer_id, to_user_id__in=user_ids) | Q(to_user_id=viewer_id, from_user_id__in=user_ids)
+    ).values_list('from_user_id', 'to_user_id', 'status')
+    for from_id, to_id, status in friendships:
+        outgoing = from_id == viewer_id
+        relationship = relationships.get(to_id if outgoing else from_id)
+        if relationship is None:
+            continue
+        if status == 'accepted':
+            relationship['friendship'] = FRIENDS
+        elif status == 'pending' and relationship['friendship'] is None:
+            relationship['friendship'] = REQUEST_SENT if outgoing else REQUEST_RECEIVED
+        elif status == 'blocked':
+            relationship['blocked' if outgoing else 'blocked_by'] = True
+        # Rejected requests are not shown to either side
+    return relationships
+
+
+class RelationshipResolver:
+    """Per-request cache of the viewer's relationships, filled in batches"""
+
+    def __init__(self, viewer):
+        self.viewer_id = viewer.id
+        self.cache = {}
+
+    def prime(self, user_ids):
+        missing = {user_id for user_id in user_ids if user_id not in self.cache}
+        if missing:
+            self.cache.update(get_relationships(self.viewer_id, missing))
+
+    def get(self, user_id):
+        self.prime([user_id])
+        return self.cache[user_id]
+
+
+class RelationshipSerializerMixin:
+    """Adds a `relationship` entry for user serializers whose context holds a RelationshipResolver"""
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        resolver = self.context.get('relationships')
+        if resolver is not None:
+            data['relationship'] = resolver.get(instance.id)
+        return data
+
+
+class RelationshipListSerializer(serializers.ListSerializer):
+    """Resolves the relationships of every user in the list in one batch"""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.Manager) else data)
+        resolver = self.context.get('relationships')
+        if resolver is not None:
+            resolver.prime(self.get_related_user_ids(items))
+        return super().to_representation(items)
+
+    def get_related_user_ids(self, items):
+        return [item.id for item in items]
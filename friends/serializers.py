@@ -1,6 +1,8 @@
 from rest_framework import serializers
-from .models import Friendship, Follow
+from .models import Friendship, FriendEdge, Follow, FriendSuggestion
 from accounts.serializers import UserMinimalSerializer  # Changed from relative import
+from .relationships import RelationshipListSerializer
+from social_backend.fastpath import format_datetime, user_minimal, user_minimal_columns
 
 class FriendshipSerializer(serializers.ModelSerializer):
     """Serializer for Friendship model"""
@@ -13,6 +15,15 @@ class FriendshipSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'from_user', 'created_at', 'updated_at']
 
 
+class FriendSerializer(serializers.ModelSerializer):
+    """Serializer for one entry of a friends list"""
+    friend = UserMinimalSerializer(read_only=True)
+
+    class Meta:
+        model = FriendEdge
+        fields = ['friend', 'since']
+
+
 class FriendRequestSerializer(serializers.ModelSerializer):
     """Serializer for sending friend requests"""
 
@@ -21,6 +32,13 @@ class FriendRequestSerializer(serializers.ModelSerializer):
         fields = ['to_user']
 
 
+class FollowListSerializer(RelationshipListSerializer):
+    """Resolves viewer relationships for both users of every follow"""
+
+    def get_related_user_ids(self, items):
+        return [user_id for follow in items for user_id in (follow.follower_id, follow.following_id)]
+
+
 class FollowSerializer(serializers.ModelSerializer):
     """Serializer for Follow model"""
     follower = UserMinimalSerializer(read_only=True)
@@ -29,4 +47,58 @@ class FollowSerializer(serializers.ModelSerializer):
     class Meta:
         model = Follow
         fields = ['id', 'follower', 'following', 'created_at']
-        read_only_fields = ['id', 'follower', 'created_at']
\ No newline at end of file
+        read_only_fields = ['id', 'follower', 'created_at']
+        list_serializer_class = FollowListSerializer
+
+class FriendSuggestionSerializer(serializers.ModelSerializer):
+    """Serializer for FriendSuggestion model"""
+    suggested_user = UserMinimalSerializer(read_only=True)
+
+    class Meta:
+        model = FriendSuggestion
+        fields = ['suggested_user', 'mutual_count']
+
+FOLLOW_FAST_COLUMNS = [
+    'id', *user_minimal_columns('follower'), *user_minimal_columns('following'), 'created_at'
+]
+
+
+def build_follow_list(rows, request):
+    """Fast-path equivalent of FollowSerializer(many=True) for FOLLOW_FAST_COLUMNS rows"""
+    profile_picture_field = Follow._meta.get_field('follower').related_model._meta.get_field('profile_picture')
+    return [{
+        'id': row['id'],
+        'follower': user_minimal(row, 'follower', request, profile_picture_field),
+        'following': user_minimal(row, 'following', request, profile_picture_field),
+        'created_at': format_datetime(row['created_at']),
+    } for row in rows]
+
+
+FRIENDSHIP_FAST_COLUMNS = [
+    'id', *user_minimal_columns('from_user'), *user_minimal_columns('to_user'), 'status', 'created_at', 'updated_at'
+]
+
+
+def build_friendship_list(rows, request):
+    """Fast-path equivalent of FriendshipSerializer(many=True) for FRIENDSHIP_FAST_COLUMNS rows"""
+    profile_picture_field = Friendship._meta.get_field('from_user').related_model._meta.get_field('profile_picture')
+    return [{
+        'id': row['id'],
+        'from_user': user_minimal(row, 'from_user', request, profile_picture_field),
+        'to_user': user_minimal(row, 'to_user', request, profile_picture_field),
+        'status': row['status'],
+        'created_at': format_datetime(row['created_at']),
+        'updated_at': format_datetime(row['updated_at']),
+    } for row in rows]
+
+
+FRIEND_FAST_COLUMNS = ['id', *user_minimal_columns('friend'), 'since']
+
+
+def build_friend_list(rows, request):
+    """Fast-path equivalent of FriendSerializer(many=True) for FRIEND_FAST_COLUMNS rows"""
+    profile_picture_field = FriendEdge._meta.get_field('friend').related_model._meta.get_field('profile_picture')
+    return [{
+        'friend': user_minimal(row, 'friend', request, profile_picture_field),
+        'since': format_datetime(row['since']),
+    } for row in rows]
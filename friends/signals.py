@@ -0,0 +1,75 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import graph, suggestions
+from .models import Follow, FriendEdge, Friendship
+
+
+_refresh_batch = ContextVar('friend_refresh_batch', default=None)
+
+
+def record_on_commit(change):
+    transaction.on_commit(lambda: graph.record(change))
+
+
+def enqueue(*user_ids):
+    batch = _refresh_batch.get()
+    if batch is None:
+        suggestions.enqueue(*user_ids)
+    else:
+        batch.update(user_ids)
+
+
+@contextmanager
+def batched():
+    """Queue the suggestion refreshes of many Friendship/Follow writes with one INSERT at the end"""
+    batch = set()
+    token = _refresh_batch.set(batch)
+    try:
+        yield
+    finally:
+        _refresh_batch.reset(token)
+    suggestions.enqueue(*batch)
+
+
+def sync_friend_edges(friendship, accepted):
+    """Mirror a friendship into FriendEdge, in the same transaction as the Friendship write"""
+    if accepted:
+        FriendEdge.link(friendship.from_user_id, friendship.to_user_id, friendship.updated_at)
+    elif not Friendship.objects.filter(
+        from_user_id=friendship.to_user_id, to_user_id=friendship.from_user_id, status='accepted'
+    ).exists():
+        # Requests sent both ways can both end up accepted; keep the edges while either is
+        FriendEdge.unlink(friendship.from_user_id, friendship.to_user_id)
+
+
+@receiver(post_save, sender=Friendship)
+def friendship_saved(sender, instance, created, **kwargs):
+    if instance.status == 'accepted' or not created:
+        sync_friend_edges(instance, instance.status == 'accepted')
+    # Pending, rejected and blocked rows are not edges; removing a missing edge is a no-op
+    record_on_commit(('friend', instance.status == 'accepted', instance.from_user_id, instance.to_user_id))
+    enqueue(instance.from_user_id, instance.to_user_id)
+
+
+@receiver(post_delete, sender=Friendship)
+def friendship_deleted(sender, instance, **kwargs):
+    sync_friend_edges(instance, False)
+    record_on_commit(('friend', False, instance.from_user_id, instance.to_user_id))
+    enqueue(instance.from_user_id, instance.to_user_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        record_on_commit(('follow', True, instance.follower_id, instance.following_id))
+        enqueue(instance.follower_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    record_on_commit(('follow', False, instance.follower_id, instance.following_id))
+    enqueue(instance.follower_id, instance.following_id)
@@ -0,0 +1,148 @@
+"""
+"People you may know" suggestions.
+
+A candidate is anyone reached in two hops over friendships and follows. Its
+score is the number of the user's friends and followees connected to it.
+Users already befriended or followed, and anyone with a pending, rejected or
+blocked request either way, are left out.
+
+compute() runs as a batch job (compute_friend_suggestions). It loads the
+CSR graph once and forks a process pool, so workers share the packed arrays
+and never touch the database. The parent loads each chunk's exclusions and
+writes its top FRIEND_SUGGESTIONS_TOP_K results.
+
+Friendship and Follow changes queue both endpoints in SuggestionRefresh.
+An incremental run recomputes those users plus their friends and followers,
+whose two-hop neighbourhood went through them.
+"""
+import heapq
+import multiprocessing
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from .graph import FriendGraph
+from .models import FriendSuggestion, Friendship, SuggestionRefresh
+
+_graph = None  # inherited by forked workers
+
+
+def enqueue(*user_ids):
+    SuggestionRefresh.objects.bulk_create(
+        [SuggestionRefresh(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True
+    )
+
+
+def get_affected_users(graph, user_ids):
+    """The given users plus everyone whose two-hop paths go through them"""
+    affected = set(user_ids)
+    for user_id in user_ids:
+        affected.update(graph.neighbors('friends', user_id))
+        affected.update(graph.neighbors('followers', user_id))
+    return affected
+
+
+def get_excluded(user_ids):
+    """{user_id: IDs with a non-accepted Friendship row either way}; accepted ones are in the graph"""
+    excluded = {user_id: set() for user_id in user_ids}
+    rows = Friendship.objects.exclude(status='accepted').filter(
+        Q(from_user_id__in=user_ids) | Q(to_user_id__in=user_ids)
+    ).values_list('from_user_id', 'to_user_id')
+    for from_id, to_id in rows:
+        if from_id in excluded:
+            excluded[from_id].add(to_id)
+        if to_id in excluded:
+            excluded[to_id].add(from_id)
+    return excluded
+
+
+def suggest(graph, user_id, excluded, top_k):
+    """[(suggested_id, mutual_count), ...] best first"""
+    neighbours = set(graph.neighbors('friends', user_id)).union(graph.neighbors('following', user_id))
+    counts = Counter()
+    for other_id in neighbours:
+        counts.update(set(graph.neighbors('friends', other_id)).union(graph.neighbors('following', other_id)))
+
+    for skipped in (user_id, *neighbours, *excluded):
+        counts.pop(skipped, None)
+    return heapq.nlargest(top_k, counts.items(), key=lambda item: (item[1], -item[0]))
+
+
+def suggest_chunk(chunk, top_k):
+    """Worker entry point: suggestions for a chunk of (user_id, excluded) pairs from the inherited graph"""
+    return [(user_id, suggest(_graph, user_id, excluded, top_k)) for user_id, excluded in chunk]
+
+
+def save(results):
+    user_ids = [user_id for user_id, _ in results]
+    with transaction.atomic():
+        FriendSuggestion.objects.filter(user_id__in=user_ids).delete()
+        FriendSuggestion.objects.bulk_create([
+            FriendSuggestion(user_id=user_id, suggested_user_id=suggested_id, mutual_count=count)
+            for user_id, suggestions in results
+            for suggested_id, count in suggestions
+        ], batch_size=1000)
+
+
+def compute(user_ids=None, workers=None, chunk_size=1000, top_k=None):
+    """
+    Recompute suggestions for the given users, for every user in the graph
+    (user_ids=None), or incrementally for the users queued in
+    SuggestionRefresh (user_ids='queued'). Returns the number of users processed.
+    """
+    top_k = top_k or settings.FRIEND_SUGGESTIONS_TOP_K
+    workers = settings.FRIEND_SUGGESTIONS_WORKERS if workers is None else workers
+
+    if user_ids != 'queued':
+        return run(user_ids, workers, chunk_size, top_k)
+
+    # Take the queue before loading the graph: anything queued later is covered by the next run
+    with transaction.atomic():
+        queued = list(SuggestionRefresh.objects.select_for_update().values_list('user_id', flat=True))
+        SuggestionRefresh.objects.filter(user_id__in=queued).delete()
+    if not queued:
+        return 0
+    try:
+        return run(queued, workers, chunk_size, top_k, expand=True)
+    except Exception:
+        enqueue(*queued)
+        raise
+
+
+def run(user_ids, workers, chunk_size, top_k, expand=False):
+    global _graph
+    graph = _graph = FriendGraph.load()
+    if expand:
+        user_ids = get_affected_users(graph, user_ids)
+    elif user_ids is None:
+        user_ids = [
+            user_id for user_id in range(graph.adjacency['friends'].csr.size)
+            if graph.degree('friends', user_id) or graph.degree('following', user_id)
+        ]
+    user_ids = sorted(user_ids)
+    chunks = [user_ids[start:start + chunk_size] for start in range(0, len(user_ids), chunk_size)]
+
+    pool = None
+    if workers:
+        # Fork every worker now, before the parent reopens a database connection they could inherit
+        connections.close_all()
+        pool = multiprocessing.get_context('fork').Pool(workers)
+    try:
+        pending = []
+        for chunk in chunks:
+            excluded = get_excluded(chunk)
+            work = [(user_id, excluded[user_id]) for user_id in chunk]
+            if pool is not None:
+                pending.append(pool.apply_async(suggest_chunk, (work, top_k)))
+            else:
+                save(suggest_chunk(work, top_k))
+        for result in pending:
+            save(result.get())
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        _graph = None
+    return len(user_ids)
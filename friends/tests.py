@@ -1,3 +1,372 @@
+import threading
+from unittest import mock
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from accounts.contacts import hash_email, hash_phone
+from accounts.models import User
+from counters import sharded
+from . import graph, suggestions
+from .graph import CSR, intersect
+from .models import Follow, FriendEdge, Friendship, FriendSuggestion, SuggestionRefresh
+from .relationships import RelationshipResolver
+from .serializers import FollowSerializer
+
+
+class FriendEdgeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob, cls.carol = [
+            User.objects.create_user(username=name, email=f'{name}@example.com', password='pass1234')
+            for name in ('alice', 'bob', 'carol')
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def edges(self):
+        return set(FriendEdge.objects.values_list('user__username', 'friend__username'))
+
+    def test_edges_follow_accept_unfriend_and_block(self):
+        request = Friendship.objects.create(from_user=self.alice, to_user=self.bob)
+        self.assertEqual(self.edges(), set())
+        request.accept()
+        self.assertEqual(self.edges(), {('alice', 'bob'), ('bob', 'alice')})
+
+        response = self.client.post(f'/api/friends/unfriend/{self.bob.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.edges(), set())
+        self.assertFalse(Friendship.objects.exists())
+
+        Friendship.objects.create(from_user=self.carol, to_user=self.alice).accept()
+        response = self.client.post(f'/api/friends/block/{self.carol.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.edges(), set())
+        self.assertEqual(
+            list(Friendship.objects.values_list('from_user', 'to_user', 'status')),
+            [(self.alice.id, self.carol.id, 'blocked')]
+        )
+
+        self.client.force_authenticate(self.carol)
+        response = self.client.post('/api/friends/request/', {'to_user': self.alice.id})
+        self.assertEqual(response.status_code, 400)
+
+    def test_friends_list_is_one_range_scan(self):
+        Friendship.objects.create(from_user=self.alice, to_user=self.bob).accept()
+        Friendship.objects.create(from_user=self.carol, to_user=self.alice).accept()
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/friends/list/', {'page_size': 1})
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual([row['friend']['username'] for row in response.data['results']], ['carol'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['friend']['username'] for row in response.data['results']], ['bob'])
+        self.assertIsNone(response.data['next'])
+
+
+class RelationshipStatusTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {
+            name: User.objects.create_user(username=name, email=f'{name}@example.com', password='pass1234')
+            for name in ('viewer', 'friend', 'fan', 'idol', 'asker', 'pest', 'stranger')
+        }
+        viewer = cls.users['viewer']
+        Friendship.objects.create(from_user=cls.users['friend'], to_user=viewer, status='accepted')
+        Follow.objects.create(follower=cls.users['fan'], following=viewer)
+        Follow.objects.create(follower=viewer, following=cls.users['idol'])
+        Friendship.objects.create(from_user=cls.users['asker'], to_user=viewer)
+        Friendship.objects.create(from_user=viewer, to_user=cls.users['pest'], status='blocked')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.users['viewer'])
+
+    def test_batch_status_in_fixed_queries(self):
+        names = ['friend', 'fan', 'idol', 'asker', 'pest', 'stranger']
+        ids = ','.join(str(self.users[name].id) for name in names)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/friends/status/', {'ids': ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(context.captured_queries), 2)
+
+        by_name = dict(zip(names, response.data['results']))
+        self.assertEqual(by_name['friend']['friendship'], 'friends')
+        self.assertTrue(by_name['fan']['followed_by'])
+        self.assertTrue(by_name['idol']['following'])
+        self.assertEqual(by_name['asker']['friendship'], 'request_received')
+        self.assertTrue(by_name['pest']['blocked'])
+        self.assertEqual(
+            by_name['stranger'],
+            {'user_id': self.users['stranger'].id, 'following': False, 'followed_by': False,
+             'friendship': None, 'blocked': False, 'blocked_by': False}
+        )
+
+    def test_rejects_bad_or_too_many_ids(self):
+        self.assertEqual(self.client.get('/api/friends/status/').status_code, 400)
+        self.assertEqual(self.client.get('/api/friends/status/', {'ids': '1,x'}).status_code, 400)
+        ids = ','.join(str(i) for i in range(1, 202))
+        self.assertEqual(self.client.get('/api/friends/status/', {'ids': ids}).status_code, 400)
+
+    def test_serializers_share_one_batch(self):
+        follows = list(Follow.objects.select_related('follower', 'following'))
+        context = {'relationships': RelationshipResolver(self.users['viewer'])}
+        with CaptureQueriesContext(connection) as queries:
+            data = FollowSerializer(follows, many=True, context=context).data
+        self.assertEqual(len(queries.captured_queries), 2)
+        fan_follow = next(row for row in data if row['follower']['username'] == 'fan')
+        self.assertTrue(fan_follow['follower']['relationship']['followed_by'])
+
+
+class ListQueryCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='hub', email='hub@example.com', password='pass1234')
+        for i in range(6):
+            other = User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='pass1234')
+            Follow.objects.create(follower=other, following=cls.user)
+            Follow.objects.create(follower=cls.user, following=other)
+            Friendship.objects.create(from_user=other, to_user=cls.user, status='accepted' if i % 2 else 'pending')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_lists_run_one_query_per_page(self):
+        for url in (f'/api/friends/followers/{self.user.id}/', f'/api/friends/following/{self.user.id}/',
+                    '/api/friends/requests/', '/api/friends/list/'):
+            responses = []
+            for fast in (False, True):
+                with self.subTest(url=url, fast=fast), self.settings(FAST_LIST_RESPONSES=fast):
+                    with CaptureQueriesContext(connection) as context:
+                        response = self.client.get(url, {'page_size': 2})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(context.captured_queries), 1)
+
+                    # Later pages are a range scan from the cursor as well
+                    with CaptureQueriesContext(connection) as context:
+                        self.client.get(response.data['next'])
+                    self.assertEqual(len(context.captured_queries), 1)
+                    responses.append(response.content)
+            self.assertEqual(responses[0], responses[1])
+
+
+class BulkFollowTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='newbie', email='newbie@example.com', password='pass1234')
+        cls.others = [
+            User.objects.create_user(username=f'star{i}', email=f'star{i}@example.com', password='pass1234')
+            for i in range(40)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def bulk(self, **body):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/friends/follow/bulk/', body, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(context.captured_queries)
+
+    def test_query_count_does_not_grow_with_ids(self):
+        ids = [other.id for other in self.others]
+        data, few_queries = self.bulk(follow=ids[:5])
+        self.assertEqual(data['followed'], ids[:5])
+        data, many_queries = self.bulk(follow=ids + [self.user.id, 999999])
+        self.assertEqual(data['followed'], ids[5:])
+        self.assertEqual(few_queries, many_queries)
+
+        data, _ = self.bulk(unfollow=ids[:10])
+        self.assertEqual(data['unfollowed'], ids[:10])
+        self.assertEqual(Follow.objects.filter(follower=self.user).count(), 30)
+
+        sharded.flush()
+        self.assertEqual(User.objects.get(id=self.user.id).following_count, 30)
+        self.assertEqual(User.objects.get(id=ids[0]).followers_count, 0)
+        self.assertEqual(User.objects.get(id=ids[-1]).followers_count, 1)
+        self.assertTrue(SuggestionRefresh.objects.filter(user=self.user).exists())
+
+    def test_rejects_too_many_ids(self):
+        with self.settings(BULK_FOLLOW_MAX_IDS=3):
+            response = self.client.post('/api/friends/follow/bulk/', {'follow': [1, 2, 3, 4]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_contact_import(self):
+        self.others[1].phone_number = '555-010-2030'
+        self.others[1].save(update_fields=['phone_number'])
+        response = self.client.post('/api/friends/contacts/', {
+            'emails': [hash_email(' Star0@Example.com'), hash_email('nobody@example.com')],
+            'phones': [hash_phone('(555) 010 2030')],
+            'follow': True,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user['username'] for user in response.data['results']], ['star0', 'star1'])
+        self.assertTrue(all(user['relationship']['following'] for user in response.data['results']))
+        self.assertEqual(response.data['followed'], [self.others[0].id, self.others[1].id])
+
+        response = self.client.post('/api/friends/contacts/', {'emails': ['star0@example.com']}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CSRTests(TestCase):
+
+    def test_sorted_pairs(self):
+        csr = CSR.from_sorted_pairs([(1, 2), (1, 5), (3, 1), (7, 4)], 4)
+        self.assertEqual(list(csr.neighbors(1)), [2, 5])
+        self.assertEqual(list(csr.neighbors(2)), [])
+        self.assertEqual(list(csr.neighbors(7)), [4])
+        self.assertEqual(csr.degree(1), 2)
+        self.assertEqual(csr.degree(99), 0)
+        self.assertTrue(csr.contains(3, 1))
+        self.assertFalse(csr.contains(1, 3))
+
+    def test_intersect(self):
+        self.assertEqual(intersect([1, 3, 5, 7], [3, 4, 5]), [3, 5])
+        self.assertEqual(intersect([500], list(range(0, 1000, 2))), [500])
+        self.assertEqual(intersect([], [1, 2]), [])
+
+
+class FriendGraphTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob, cls.carol, cls.dave = [
+            User.objects.create_user(username=name, email=f'{name}@example.com', password='pass1234')
+            for name in ('alice', 'bob', 'carol', 'dave')
+        ]
+        for user in (cls.bob, cls.carol):
+            Friendship.objects.create(from_user=cls.alice, to_user=user, status='accepted')
+        Friendship.objects.create(from_user=cls.dave, to_user=cls.bob, status='accepted')
+        Friendship.objects.create(from_user=cls.carol, to_user=cls.dave, status='accepted')
+        Friendship.objects.create(from_user=cls.bob, to_user=cls.carol, status='pending')
+        Follow.objects.create(follower=cls.alice, following=cls.dave)
+
+    def setUp(self):
+        graph.reset()
+        self.addCleanup(graph.reset)
+
+    def test_load(self):
+        friend_graph = graph.get_graph()
+        self.assertEqual(list(friend_graph.neighbors('friends', self.alice.id)), sorted([self.bob.id, self.carol.id]))
+        self.assertTrue(friend_graph.are_friends(self.bob.id, self.alice.id))
+        self.assertFalse(friend_graph.are_friends(self.bob.id, self.carol.id))
+        self.assertTrue(friend_graph.is_following(self.alice.id, self.dave.id))
+        self.assertEqual(friend_graph.degree('followers', self.dave.id), 1)
+        self.assertEqual(friend_graph.mutual_friends(self.alice.id, self.dave.id), sorted([self.bob.id, self.carol.id]))
+        self.assertEqual(
+            friend_graph.mutual_friends_counts(self.alice.id, [self.dave.id, self.bob.id]),
+            {self.dave.id: 2, self.bob.id: 0}
+        )
+
+    def test_signals_update_loaded_graph_after_commit(self):
+        friend_graph = graph.get_graph()
+        with self.captureOnCommitCallbacks(execute=True):
+            Friendship.objects.get(from_user=self.bob, to_user=self.carol).accept()
+            Friendship.objects.get(from_user=self.alice, to_user=self.bob).delete()
+            Follow.objects.create(follower=self.bob, following=self.dave)
+            Follow.objects.filter(follower=self.alice).delete()
+
+        self.assertTrue(friend_graph.are_friends(self.carol.id, self.bob.id))
+        self.assertFalse(friend_graph.are_friends(self.alice.id, self.bob.id))
+        self.assertEqual(friend_graph.degree('friends', self.bob.id), 2)
+        self.assertEqual(list(friend_graph.neighbors('followers', self.dave.id)), [self.bob.id])
+
+        # The overlay answers exactly like a freshly loaded graph
+        graph.reset()
+        fresh = graph.get_graph()
+        for user in (self.alice, self.bob, self.carol, self.dave):
+            for kind in ('friends', 'following', 'followers'):
+                self.assertEqual(list(friend_graph.neighbors(kind, user.id)), list(fresh.neighbors(kind, user.id)))
+
+    def test_requests_wait_for_the_background_load(self):
+        loaded = graph.FriendGraph.load()
+        release = threading.Event()
+
+        def load():
+            release.wait(5)
+            return loaded
+
+        with mock.patch.object(graph.FriendGraph, 'load', side_effect=load) as load_mock:
+            graph.start_reload()
+            threading.Timer(0.1, release.set).start()
+            self.assertIs(graph.get_graph(), loaded)
+        self.assertEqual(load_mock.call_count, 1)
+
+    def test_mutual_friends_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        response = client.get(f'/api/friends/mutual/{self.dave.id}/', {'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['friends_count'], 2)
+        self.assertEqual(len(response.data['results']), 1)
+
+
+class FriendSuggestionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {
+            name: User.objects.create_user(username=name, email=f'{name}@example.com', password='pass1234')
+            for name in ('alice', 'bob', 'carol', 'dave', 'erin', 'frank', 'gina')
+        }
+        for from_name, to_name in (('alice', 'bob'), ('alice', 'carol'), ('bob', 'dave'), ('bob', 'erin'),
+                                   ('carol', 'dave')):
+            Friendship.objects.create(from_user=cls.users[from_name], to_user=cls.users[to_name], status='accepted')
+        Friendship.objects.create(from_user=cls.users['alice'], to_user=cls.users['erin'], status='pending')
+        Follow.objects.create(follower=cls.users['alice'], following=cls.users['frank'])
+        Follow.objects.create(follower=cls.users['frank'], following=cls.users['gina'])
+
+    def suggested(self, name):
+        return [
+            (self.user_names[suggestion.suggested_user_id], suggestion.mutual_count)
+            for suggestion in FriendSuggestion.objects.filter(user=self.users[name])
+        ]
+
+    def setUp(self):
+        self.user_names = {user.id: name for name, user in self.users.items()}
+        suggestions.compute(workers=0)
+        SuggestionRefresh.objects.all().delete()
+
+    def test_two_hop_scoring_and_exclusions(self):
+        # erin is only reachable through bob, and alice already sent her a request
+        self.assertEqual(self.suggested('alice'), [('dave', 2), ('gina', 1)])
+        self.assertEqual(self.suggested('dave'), [('alice', 2), ('erin', 1)])
+
+    def test_incremental_recompute_only_touches_changed_neighbourhood(self):
+        Friendship.objects.create(from_user=self.users['carol'], to_user=self.users['gina'], status='accepted')
+        self.assertCountEqual(
+            SuggestionRefresh.objects.values_list('user_id', flat=True),
+            [self.users['carol'].id, self.users['gina'].id]
+        )
+
+        bob_suggestions = list(FriendSuggestion.objects.filter(user=self.users['bob']).values_list('id', flat=True))
+        # carol and gina, their friends (alice, dave) and gina's follower frank
+        self.assertEqual(suggestions.compute('queued', workers=0), 5)
+        self.assertEqual(self.suggested('alice'), [('dave', 2), ('gina', 2)])
+        self.assertEqual(
+            list(FriendSuggestion.objects.filter(user=self.users['bob']).values_list('id', flat=True)),
+            bob_suggestions
+        )
+        self.assertFalse(SuggestionRefresh.objects.exists())
 
-# Create your tests here.
+    def test_endpoint_hides_suggestions_acted_on(self):
+        client = APIClient()
+        client.force_authenticate(self.users['alice'])
+        Follow.objects.create(follower=self.users['alice'], following=self.users['dave'])
+        response = client.get('/api/friends/suggestions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['suggested_user']['username'], row['mutual_count']) for row in response.data['results']],
+            [('gina', 1)]
+        )
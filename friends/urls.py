@@ -5,7 +5,14 @@ from .views import (
     AcceptFriendRequestView,
     RejectFriendRequestView,
     FriendsListView,
+    UnfriendView,
+    BlockUserView,
+    MutualFriendsView,
+    RelationshipStatusView,
+    FriendSuggestionListView,
     FollowUserView,
+    BulkFollowView,
+    ContactImportView,
     FollowersListView,
     FollowingListView
 )
@@ -17,9 +24,16 @@ urlpatterns = [
     path('requests/<int:friendship_id>/accept/', AcceptFriendRequestView.as_view(), name='accept-friend-request'),
     path('requests/<int:friendship_id>/reject/', RejectFriendRequestView.as_view(), name='reject-friend-request'),
     path('list/', FriendsListView.as_view(), name='friends-list'),
+    path('unfriend/<int:user_id>/', UnfriendView.as_view(), name='unfriend'),
+    path('block/<int:user_id>/', BlockUserView.as_view(), name='block-user'),
+    path('mutual/<int:user_id>/', MutualFriendsView.as_view(), name='mutual-friends'),
+    path('status/', RelationshipStatusView.as_view(), name='relationship-status'),
+    path('suggestions/', FriendSuggestionListView.as_view(), name='friend-suggestions'),
 
     # Follow System
     path('follow/<int:user_id>/', FollowUserView.as_view(), name='follow-user'),
+    path('follow/bulk/', BulkFollowView.as_view(), name='bulk-follow'),
+    path('contacts/', ContactImportView.as_view(), name='contact-import'),
     path('followers/<int:user_id>/', FollowersListView.as_view(), name='followers-list'),
     path('following/<int:user_id>/', FollowingListView.as_view(), name='following-list'),
 ]
\ No newline at end of file
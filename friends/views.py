@@ -1,11 +1,31 @@
 from rest_framework import generics, status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import transaction
 from django.db.models import Q
-from .models import Friendship, Follow
-from .serializers import FriendshipSerializer, FollowSerializer, FriendRequestSerializer
+from counters import sharded
+from posts import timeline
+from accounts import contacts
+from accounts.serializers import UserMinimalSerializer
+from . import follows, graph, relationships
+from .models import Friendship, FriendEdge, Follow, FriendSuggestion
+from social_backend.fastpath import FastListMixin
+from social_backend.pagination import KeysetPagination
+from .serializers import (
+    FriendshipSerializer,
+    FriendSerializer,
+    FollowSerializer,
+    FriendRequestSerializer,
+    FriendSuggestionSerializer,
+    FOLLOW_FAST_COLUMNS,
+    FRIEND_FAST_COLUMNS,
+    FRIENDSHIP_FAST_COLUMNS,
+    build_follow_list,
+    build_friend_list,
+    build_friendship_list
+)
 
 User = get_user_model()
 
@@ -49,6 +69,12 @@ class SendFriendRequestView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        if Friendship.objects.filter(from_user=to_user, to_user=request.user, status='blocked').exists():
+            return Response(
+                {'error': 'Cannot send friend request to this user'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         friendship = Friendship.objects.create(
             from_user=request.user,
             to_user=to_user,
@@ -61,16 +87,21 @@ class SendFriendRequestView(APIView):
         )
 
 
-class FriendRequestListView(generics.ListAPIView):
+class FriendRequestListView(FastListMixin, generics.ListAPIView):
     """List all pending friend requests received"""
     serializer_class = FriendshipSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    fast_columns = FRIENDSHIP_FAST_COLUMNS
+
+    def build_fast_data(self, rows):
+        return build_friendship_list(rows, self.request)
 
     def get_queryset(self):
         return Friendship.objects.filter(
             to_user=self.request.user,
             status='pending'
-        )
+        ).select_related('from_user', 'to_user')
 
 
 class AcceptFriendRequestView(APIView):
@@ -91,6 +122,8 @@ class AcceptFriendRequestView(APIView):
             )
 
         friendship.accept()
+        timeline.add_source(friendship.to_user_id, friendship.from_user)
+        timeline.add_source(friendship.from_user_id, friendship.to_user)
 
         return Response(
             {'message': 'Friend request accepted'},
@@ -123,20 +156,156 @@ class RejectFriendRequestView(APIView):
         )
 
 
-class FriendsListView(generics.ListAPIView):
-    """List all friends"""
-    serializer_class = FriendshipSerializer
+class FriendPagination(KeysetPagination):
+    ordering = ('-since', '-id')
+
+
+class FriendsListView(FastListMixin, generics.ListAPIView):
+    """List all friends, most recent first"""
+    serializer_class = FriendSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FriendPagination
+    fast_columns = FRIEND_FAST_COLUMNS
+
+    def build_fast_data(self, rows):
+        return build_friend_list(rows, self.request)
 
     def get_queryset(self):
-        user = self.request.user
-        return Friendship.objects.filter(
+        return FriendEdge.objects.filter(user=self.request.user).select_related('friend')
+
+
+class UnfriendView(APIView):
+    """Remove a friend"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, user_id):
+        friendships = list(Friendship.objects.filter(
+            Q(from_user=request.user, to_user_id=user_id) | Q(from_user_id=user_id, to_user=request.user),
             status='accepted'
-        ).filter(
-            Q(from_user=user) | Q(to_user=user)
+        ))
+        if not friendships:
+            return Response(
+                {'error': 'Friendship not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        for friendship in friendships:
+            friendship.unfriend()
+        timeline.remove_source(request.user.id, user_id)
+        timeline.remove_source(user_id, request.user.id)
+
+        return Response(
+            {'message': 'Unfriended'},
+            status=status.HTTP_200_OK
+        )
+
+
+class BlockUserView(APIView):
+    """Block a user, ending any friendship or pending request with them"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, user_id):
+        try:
+            user_to_block = User.objects.get(id=user_id)
+        except User.DoesNotExist:
+            return Response(
+                {'error': 'User not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        if user_to_block == request.user:
+            return Response(
+                {'error': 'Cannot block yourself'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            outgoing, _ = Friendship.objects.select_for_update().get_or_create(
+                from_user=request.user,
+                to_user=user_to_block,
+                defaults={'status': 'blocked'}
+            )
+            if outgoing.status != 'blocked':
+                outgoing.block()
+            # A request or friendship the blocked user started goes away
+            for incoming in Friendship.objects.filter(from_user=user_to_block, to_user=request.user):
+                incoming.unfriend()
+
+        timeline.remove_source(request.user.id, user_to_block.id)
+        timeline.remove_source(user_to_block.id, request.user.id)
+
+        return Response(
+            {'message': 'User blocked'},
+            status=status.HTTP_200_OK
         )
 
 
+class MutualFriendsView(APIView):
+    """Friends the current user shares with another user"""
+    permission_classes = [permissions.IsAuthenticated]
+    default_limit = 20
+    max_limit = 100
+
+    def get(self, request, user_id):
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        friend_graph = graph.get_graph()
+        mutual_ids = friend_graph.mutual_friends(request.user.id, user_id)
+        users = User.objects.in_bulk(mutual_ids[:limit])
+        return Response({
+            'count': len(mutual_ids),
+            'friends_count': friend_graph.degree('friends', user_id),
+            'results': UserMinimalSerializer(
+                [users[friend_id] for friend_id in mutual_ids[:limit] if friend_id in users],
+                many=True,
+                context={'request': request}
+            ).data,
+        })
+
+
+class RelationshipStatusView(APIView):
+    """Follow, friendship and block status between the current user and a batch of users"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            user_ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value.strip()]
+        except ValueError:
+            return Response({'error': 'ids must be a comma-separated list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not user_ids:
+            return Response({'error': 'ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(user_ids) > relationships.MAX_IDS:
+            return Response(
+                {'error': f'At most {relationships.MAX_IDS} ids per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        found = relationships.get_relationships(request.user.id, user_ids)
+        return Response({
+            'results': [{'user_id': user_id, **found[user_id]} for user_id in dict.fromkeys(user_ids)]
+        })
+
+
+class FriendSuggestionListView(generics.ListAPIView):
+    """People you may know, as computed by compute_friend_suggestions"""
+    serializer_class = FriendSuggestionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        # Drop suggestions acted on since the last run
+        return FriendSuggestion.objects.filter(user=user).exclude(
+            suggested_user__in=Follow.objects.filter(follower=user).values('following')
+        ).exclude(
+            suggested_user__in=Friendship.objects.filter(from_user=user).values('to_user')
+        ).exclude(
+            suggested_user__in=Friendship.objects.filter(to_user=user).values('from_user')
+        ).select_related('suggested_user')
+
+
 class FollowUserView(APIView):
     """Follow or unfollow a user"""
     permission_classes = [permissions.IsAuthenticated]
@@ -165,37 +334,128 @@ class FollowUserView(APIView):
             # Unfollow
             follow.delete()
             # Update counts
-            User.objects.filter(id=request.user.id).update(following_count=models.F('following_count') - 1)
-            User.objects.filter(id=user_to_follow.id).update(followers_count=models.F('followers_count') - 1)
+            sharded.decrement(User, request.user.id, 'following_count')
+            sharded.decrement(User, user_to_follow.id, 'followers_count')
+            timeline.remove_source(request.user.id, user_to_follow.id)
             return Response(
                 {'message': 'Unfollowed', 'following': False},
                 status=status.HTTP_200_OK
             )
         else:
             # Follow - update counts
-            User.objects.filter(id=request.user.id).update(following_count=models.F('following_count') + 1)
-            User.objects.filter(id=user_to_follow.id).update(followers_count=models.F('followers_count') + 1)
+            sharded.increment(User, request.user.id, 'following_count')
+            sharded.increment(User, user_to_follow.id, 'followers_count')
+            timeline.add_source(request.user.id, user_to_follow)
             return Response(
                 {'message': 'Following', 'following': True},
                 status=status.HTTP_201_CREATED
             )
 
 
-class FollowersListView(generics.ListAPIView):
+def get_id_list(data, key):
+    """A list of integer IDs from a request body, or None if malformed"""
+    values = data.get(key, [])
+    if not isinstance(values, list):
+        return None
+    try:
+        return [int(value) for value in values]
+    except (TypeError, ValueError):
+        return None
+
+
+class BulkFollowView(APIView):
+    """Follow and unfollow many users in one request"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        to_follow = get_id_list(request.data, 'follow')
+        to_unfollow = get_id_list(request.data, 'unfollow')
+        if to_follow is None or to_unfollow is None:
+            return Response(
+                {'error': 'follow and unfollow must be lists of user IDs'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not to_follow and not to_unfollow:
+            return Response(
+                {'error': 'follow or unfollow is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(to_follow) + len(to_unfollow) > settings.BULK_FOLLOW_MAX_IDS:
+            return Response(
+                {'error': f'At most {settings.BULK_FOLLOW_MAX_IDS} users per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            followed = follows.follow_many(request.user, to_follow) if to_follow else []
+            unfollowed = follows.unfollow_many(request.user, to_unfollow) if to_unfollow else []
+
+        return Response(
+            {'followed': followed, 'unfollowed': unfollowed},
+            status=status.HTTP_200_OK
+        )
+
+
+class ContactImportView(APIView):
+    """Find users from hashed address-book emails and phone numbers, optionally following them"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        emails = request.data.get('emails', [])
+        phones = request.data.get('phones', [])
+        if not isinstance(emails, list) or not isinstance(phones, list):
+            return Response(
+                {'error': 'emails and phones must be lists of SHA-256 hex digests'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(emails) + len(phones) > settings.BULK_FOLLOW_MAX_IDS:
+            return Response(
+                {'error': f'At most {settings.BULK_FOLLOW_MAX_IDS} contacts per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not all(isinstance(value, str) and contacts.HASH_RE.match(value) for value in emails + phones):
+            return Response(
+                {'error': 'Contacts must be lowercase SHA-256 hex digests'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        users = list(contacts.find_users(emails, phones, exclude=request.user).order_by('id'))
+        followed = []
+        if request.data.get('follow') and users:
+            followed = follows.follow_many(request.user, [user.id for user in users])
+
+        serializer = UserMinimalSerializer(users, many=True, context={
+            'request': request,
+            'relationships': relationships.RelationshipResolver(request.user),
+        })
+        return Response({'results': serializer.data, 'followed': followed})
+
+
+class FollowersListView(FastListMixin, generics.ListAPIView):
     """List user's followers"""
     serializer_class = FollowSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    fast_columns = FOLLOW_FAST_COLUMNS
+
+    def build_fast_data(self, rows):
+        return build_follow_list(rows, self.request)
 
     def get_queryset(self):
         user_id = self.kwargs.get('user_id', self.request.user.id)
-        return Follow.objects.filter(following_id=user_id)
+        return Follow.objects.filter(following_id=user_id).select_related('follower', 'following')
 
 
-class FollowingListView(generics.ListAPIView):
+class FollowingListView(FastListMixin, generics.ListAPIView):
     """List users that user is following"""
     serializer_class = FollowSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    fast_columns = FOLLOW_FAST_COLUMNS
+
+    def build_fast_data(self, rows):
+        return build_follow_list(rows, self.request)
 
     def get_queryset(self):
         user_id = self.kwargs.get('user_id', self.request.user.id)
-        return Follow.objects.filter(follower_id=user_id)
\ No newline at end of file
+        return Follow.objects.filter(follower_id=user_id).select_related('follower', 'following')
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""
+Per-user feed response cache with versioned invalidation.
+
+The first FEED_CACHE_PAGES pages of a user's feed are cached under a key that
+embeds the user's feed version. Each cached page also records the versions of
+the posts and authors it shows. Any change bumps one version key (O(1), no key
+scanning), and stale pages are simply never read again and expire.
+
+A version is the time (in ns) of the last bump, so an evicted version can
+never line up with an old cached page again. It also tells set_page whether
+a dependency changed after the page's query started (snapshot_time): such a
+page may hold old data under the new version, so it is not cached at all.
+Versions are compared with CLOCK_SKEW_NS of slack, because other servers
+stamp them with their own clocks.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+HITS_KEY = 'feed:stats:hits'
+MISSES_KEY = 'feed:stats:misses'
+CLOCK_SKEW_NS = 1_000_000_000
+
+
+def feed_version_key(user_id):
+    return f'feed:v:user:{user_id}'
+
+
+def post_version_key(post_id):
+    return f'feed:v:post:{post_id}'
+
+
+def author_version_key(user_id):
+    return f'feed:v:author:{user_id}'
+
+
+def author_posts_version_key(user_id):
+    return f'feed:v:author-posts:{user_id}'
+
+
+def bump(*keys):
+    # Called after the change is committed, so it is stamped later than any query that missed it
+    now = time.time_ns()
+    cache.set_many({key: now for key in keys}, None)
+
+
+def bump_feeds(user_ids):
+    bump(*[feed_version_key(user_id) for user_id in user_ids])
+
+
+def bump_post(post_id):
+    bump(post_version_key(post_id))
+
+
+def bump_author(user_id):
+    bump(author_version_key(user_id))
+
+
+def bump_author_posts(user_id):
+    bump(author_posts_version_key(user_id))
+
+
+def get_versions(keys, initial=None):
+    """Current versions; keys never bumped (or evicted) start at `initial`, by default now"""
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        initial = time.time_ns() if initial is None else initial
+        for key in missing:
+            # add(), not set(): never overwrite a bump that landed meanwhile
+            cache.add(key, initial, None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def snapshot_time():
+    """Taken before a page's query; dependencies bumped later keep the page out of the cache"""
+    return time.time_ns() - CLOCK_SKEW_NS
+
+
+def get_page_key(request, page_number):
+    if page_number >= settings.FEED_CACHE_PAGES:
+        return None
+    version = get_versions([feed_version_key(request.user.id)])[feed_version_key(request.user.id)]
+    return ':'.join([
+        'feed:page',
+        str(request.user.id),
+        str(version),
+        request.query_params.get('page_size', ''),
+        request.query_params.get('cursor', ''),
+    ])
+
+
+def get_page(page_key):
+    """Cached response data, or None if missing or any dependency changed"""
+    if page_key is None:
+        return None
+
+    entry = cache.get(page_key)
+    if entry is not None and cache.get_many(list(entry['deps'])) == entry['deps']:
+        record(HITS_KEY)
+        return entry['data']
+
+    record(MISSES_KEY)
+    return None
+
+
+def set_page(page_key, data, snapshot, high_fanout_ids=()):
+    if page_key is None:
+        return
+
+    keys = [author_posts_version_key(user_id) for user_id in high_fanout_ids]
+    for post in data['results']:
+        keys.append(post_version_key(post['id']))
+        keys.append(author_version_key(post['user']['id']))
+    deps = get_versions(keys, initial=snapshot)
+    if any(version > snapshot for version in deps.values()):
+        # Changed while (or just before) the page was loaded: it may not show the change
+        return
+    cache.set(page_key, {'deps': deps, 'data': data}, settings.FEED_CACHE_TIMEOUT)
+
+
+def record(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def get_stats():
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = stats.get(HITS_KEY, 0)
+    misses = stats.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+    }
@@ -0,0 +1,63 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+from posts.models import Post
+from posts.views import UserPostsView
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compares the serializer and fast (.values()) list paths on seeded posts; all data is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=500)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            author = User.objects.create_user(
+                username='benchmark_author',
+                email='benchmark_author@example.com',
+                password='benchmark'
+            )
+            Post.objects.bulk_create([
+                Post(user=author, caption=f'Benchmark caption {i}', image='posts/benchmark.jpg')
+                for i in range(options['posts'])
+            ])
+
+            results = {}
+            for fast in (False, True):
+                with override_settings(FAST_LIST_RESPONSES=fast):
+                    results[fast] = self.run_view(author, options)
+
+            transaction.set_rollback(True)
+
+        (slow_time, slow_body), (fast_time, fast_body) = results[False], results[True]
+        self.stdout.write(f'Serializers: {slow_time * 1000:.2f} ms/request')
+        self.stdout.write(f'Fast path:   {fast_time * 1000:.2f} ms/request ({slow_time / fast_time:.1f}x)')
+        if slow_body == fast_body:
+            self.stdout.write(self.style.SUCCESS('✓ Responses are byte-for-byte identical'))
+        else:
+            self.stdout.write(self.style.ERROR('✗ Responses differ'))
+
+    def run_view(self, author, options):
+        factory = APIRequestFactory()
+        view = UserPostsView.as_view()
+        body = None
+        start = time.perf_counter()
+        for _ in range(options['iterations']):
+            request = factory.get(
+                f'/api/posts/user/{author.id}/',
+                {'page_size': options['page_size']},
+                HTTP_HOST='localhost'
+            )
+            force_authenticate(request, user=author)
+            response = view(request, user_id=author.id)
+            body = response.render().content
+        return (time.perf_counter() - start) / options['iterations'], body
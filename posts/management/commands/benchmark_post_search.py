@@ -0,0 +1,86 @@
+import itertools
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measures caption search latency over a seeded corpus; all data is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--vocabulary', type=int, default=20000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        vocabulary = [f'word{i}' for i in range(options['vocabulary'])]
+        # Zipf-like term frequencies, like real captions
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+        backend = search.get_backend()
+
+        with transaction.atomic():
+            author = User.objects.create_user(
+                username='benchmark_author',
+                email='benchmark_author@example.com',
+                password='benchmark'
+            )
+
+            start = time.perf_counter()
+            remaining = options['posts']
+            while remaining > 0:
+                size = min(remaining, options['batch_size'])
+                posts = Post.objects.bulk_create([
+                    Post(user=author, caption=' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(5, 20))))
+                    for _ in range(size)
+                ])
+                backend.index_many(posts)
+                remaining -= size
+            self.stdout.write(f'Seeded and indexed {options["posts"]} posts in {time.perf_counter() - start:.1f} s')
+
+            buckets = {
+                'common term': vocabulary[:20],
+                'mid-frequency term': vocabulary[200:1000],
+                'rare term': vocabulary[-5000:],
+                'two terms': [f'{a} {b}' for a, b in zip(vocabulary[50:500], vocabulary[500:950])],
+            }
+            for label, queries in buckets.items():
+                first, deep = self.run_queries(backend, author, rng, queries, options['queries'])
+                self.stdout.write(
+                    f'{label:<20} first page p50 {statistics.median(first):7.2f} ms  '
+                    f'p95 {self.p95(first):7.2f} ms  |  page 5 p50 {statistics.median(deep):7.2f} ms'
+                )
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark data rolled back'))
+
+    def run_queries(self, backend, user, rng, queries, count):
+        first, deep = [], []
+        for _ in range(count):
+            query = rng.choice(queries)
+            after = None
+            for page in range(5):
+                start = time.perf_counter()
+                hits, floor = backend.search(query, user, after, 20)
+                elapsed = (time.perf_counter() - start) * 1000
+                if page == 0:
+                    first.append(elapsed)
+                if not hits:
+                    break
+                after = (hits[-1][1], hits[-1][0], floor)
+            else:
+                deep.append(elapsed)
+        return first, deep or [0.0]
+
+    def p95(self, timings):
+        return sorted(timings)[max(int(len(timings) * 0.95) - 1, 0)]
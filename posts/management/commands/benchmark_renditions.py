@@ -0,0 +1,43 @@
+import os
+import tempfile
+import time
+
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand, CommandError
+from social_backend import renditions
+
+
+class Command(BaseCommand):
+    help = 'Reports rendition processing time and bytes saved per image'
+
+    def add_arguments(self, parser):
+        parser.add_argument('images', nargs='+', help='Paths of source images')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            storage = FileSystemStorage(location=directory)
+            total_time = 0
+            for path in options['images']:
+                if not os.path.isfile(path):
+                    raise CommandError(f'No such image: {path}')
+                with open(path, 'rb') as source:
+                    name = storage.save(os.path.basename(path), source)
+
+                start = time.perf_counter()
+                result = renditions.generate(storage, name)
+                elapsed = time.perf_counter() - start
+                total_time += elapsed
+
+                original = storage.size(name)
+                self.stdout.write(f'{path}: {elapsed * 1000:.1f} ms, original {original:,} bytes')
+                for rendition, names in result.items():
+                    sizes = ', '.join(
+                        f'{extension} {storage.size(rendition_name):,} bytes '
+                        f'({100 - storage.size(rendition_name) * 100 / original:.0f}% saved)'
+                        for extension, rendition_name in names.items()
+                    )
+                    self.stdout.write(f'  {rendition}: {sizes}')
+
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {len(options["images"])} images, {total_time * 1000 / len(options["images"]):.1f} ms/image'
+            ))
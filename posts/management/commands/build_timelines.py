@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from posts import timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Backfills materialized home timelines, or trims them to TIMELINE_MAX_LENGTH'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='Only process these user IDs')
+        parser.add_argument('--trim', action='store_true', help='Trim existing timelines instead of rebuilding them')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+
+        processed = 0
+        removed = 0
+        last_id = 0
+        while True:
+            # Walk users by primary key so huge tables are never loaded at once
+            chunk = list(users.filter(id__gt=last_id)[:options['chunk_size']])
+            if not chunk:
+                break
+
+            for user in chunk:
+                if options['trim']:
+                    removed += timeline.trim_timeline(user.id)
+                else:
+                    timeline.rebuild_timeline(user)
+            processed += len(chunk)
+            last_id = chunk[-1].id
+
+        if options['trim']:
+            self.stdout.write(self.style.SUCCESS(f'✓ Trimmed {processed} timelines ({removed} entries removed)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✓ Rebuilt {processed} timelines'))
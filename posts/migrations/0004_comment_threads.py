@@ -0,0 +1,73 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_threads(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+
+    # Walk the tree one level at a time so every UPDATE is set-based
+    Comment.objects.filter(
+        parent__isnull=False,
+        parent__parent__isnull=True
+    ).update(depth=1, root_id=F('parent_id'))
+
+    depth = 2
+    while True:
+        updated = Comment.objects.filter(
+            root__isnull=True,
+            parent__depth=depth - 1,
+            parent__root__isnull=False
+        ).update(
+            depth=depth,
+            root_id=Subquery(Comment.objects.filter(pk=OuterRef('parent_id')).values('root_id')[:1])
+        )
+        if not updated:
+            break
+        depth += 1
+
+    replies = Comment.objects.filter(
+        parent=OuterRef('pk')
+    ).order_by().values('parent').annotate(total=Count('pk')).values('total')
+    Comment.objects.filter(
+        pk__in=Comment.objects.filter(parent__isnull=False).values('parent_id')
+    ).update(replies_count=Coalesce(Subquery(replies), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_timelineentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='replies_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='root',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_comments', to='posts.comment'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['parent', 'created_at', 'id'], name='comment_parent_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['root', 'depth'], name='comment_root_depth_idx'),
+        ),
+        migrations.RunPython(backfill_threads, migrations.RunPython.noop),
+    ]
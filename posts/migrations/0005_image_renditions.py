@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+SQLITE_FORWARDS = [
+    "CREATE VIRTUAL TABLE posts_post_fts USING fts5(caption, tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO posts_post_fts (rowid, caption) SELECT id, caption FROM posts_post",
+]
+SQLITE_BACKWARDS = [
+    "DROP TABLE IF EXISTS posts_post_fts",
+]
+POSTGRES_FORWARDS = [
+    "ALTER TABLE posts_post ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(caption, ''))) STORED",
+    "CREATE INDEX posts_post_search_vector_idx ON posts_post USING GIN (search_vector)",
+]
+POSTGRES_BACKWARDS = [
+    "DROP INDEX IF EXISTS posts_post_search_vector_idx",
+    "ALTER TABLE posts_post DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_image_renditions'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({'sqlite': SQLITE_FORWARDS, 'postgresql': POSTGRES_FORWARDS}),
+            run_statements({'sqlite': SQLITE_BACKWARDS, 'postgresql': POSTGRES_BACKWARDS}),
+        ),
+    ]
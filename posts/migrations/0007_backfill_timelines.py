@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Q
+
+BATCH_SIZE = 1000
+
+
+def backfill_timelines(apps, schema_editor):
+    """Materialize the timeline of every user who has none yet, like posts.timeline.rebuild_timeline"""
+    User = apps.get_model('accounts', 'User')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    Follow = apps.get_model('friends', 'Follow')
+    FriendEdge = apps.get_model('friends', 'FriendEdge')
+
+    last_id = 0
+    while True:
+        user_ids = list(User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+        if not user_ids:
+            break
+        built = set(TimelineEntry.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True).distinct())
+        for user_id in user_ids:
+            if user_id in built:
+                continue
+            source_ids = set(Follow.objects.filter(follower_id=user_id).values_list('following_id', flat=True))
+            source_ids |= set(FriendEdge.objects.filter(user_id=user_id).values_list('friend_id', flat=True))
+            # High-fanout authors are merged in at read time instead
+            source_ids = list(User.objects.filter(
+                id__in=source_ids,
+                followers_count__lte=settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+            ).values_list('id', flat=True))
+            posts = Post.objects.filter(
+                Q(user_id=user_id) | Q(user_id__in=source_ids, is_public=True)
+            ).order_by('-created_at').values_list('id', 'created_at')[:settings.TIMELINE_MAX_LENGTH]
+            TimelineEntry.objects.bulk_create(
+                [TimelineEntry(user_id=user_id, post_id=post_id, created_at=created_at) for post_id, created_at in posts],
+                ignore_conflicts=True
+            )
+        last_id = user_ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_search'),
+        ('friends', '0003_friend_edges'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
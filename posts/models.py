@@ -1,8 +1,9 @@
 from django.db import models
 from django.conf import settings
+from counters.models import ShardedCountersMixin
 
 
-class Post(models.Model):
+class Post(ShardedCountersMixin, models.Model):
     """Post model for user posts"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -11,6 +12,7 @@ class Post(models.Model):
     )
     caption = models.TextField(max_length=2200, blank=True)
     image = models.ImageField(upload_to='posts/', null=True, blank=True)
+    image_renditions = models.JSONField(default=dict, blank=True)  # Filled by social_backend.renditions
     video = models.FileField(upload_to='videos/', null=True, blank=True)
 
     # Engagement metrics
@@ -18,6 +20,8 @@ class Post(models.Model):
     comments_count = models.IntegerField(default=0)
     shares_count = models.IntegerField(default=0)
 
+    counter_fields = ('likes_count', 'comments_count', 'shares_count')
+
     # Privacy
     is_public = models.BooleanField(default=True)
 
@@ -28,6 +32,11 @@ class Post(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Post'
         verbose_name_plural = 'Posts'
+        indexes = [
+            # Keyset pagination over the feed and a user's profile posts
+            models.Index(fields=['created_at', 'id'], name='post_created_id_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='post_user_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"Post by {self.user.username} - {self.created_at.strftime('%Y-%m-%d')}"
@@ -55,7 +64,7 @@ class Like(models.Model):
         return f"{self.user.username} likes {self.post.id}"
 
 
-class Comment(models.Model):
+class Comment(ShardedCountersMixin, models.Model):
     """Comment model for posts"""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -75,18 +84,40 @@ class Comment(models.Model):
         blank=True,
         related_name='replies'
     )  # For nested comments/replies
+    root = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='thread_comments'
+    )  # Top-level comment of the thread, so a whole thread loads in one query
+    depth = models.PositiveIntegerField(default=0)
 
     likes_count = models.IntegerField(default=0)
+    replies_count = models.IntegerField(default=0)  # Direct replies only
+
+    counter_fields = ('likes_count', 'replies_count')
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_id_idx'),
+            models.Index(fields=['parent', 'created_at', 'id'], name='comment_parent_created_id_idx'),
+            models.Index(fields=['root', 'depth'], name='comment_root_depth_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.user.username} on post {self.post.id}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.parent_id:
+            self.root_id = self.parent.root_id or self.parent_id
+            self.depth = self.parent.depth + 1
+        super().save(*args, **kwargs)
+
 
 class CommentLike(models.Model):
     """Like model for comments"""
@@ -105,4 +136,27 @@ class CommentLike(models.Model):
         unique_together = ('user', 'comment')
 
     def __str__(self):
-        return f"{self.user.username} likes comment {self.comment.id}"
\ No newline at end of file
+        return f"{self.user.username} likes comment {self.comment.id}"
+
+class TimelineEntry(models.Model):
+    """Materialized home timeline row: post delivered to a user's feed on write"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    created_at = models.DateTimeField()  # Copied from the post, used for trimming
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='timeline_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in {self.user_id}'s timeline"
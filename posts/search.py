@@ -0,0 +1,178 @@
+"""
+Full-text search over post captions.
+
+One interface, one backend per database:
+
+- SQLite: an FTS5 table (posts_post_fts) keyed by post ID, updated by
+  Post's post_save/post_delete signals (posts.signals), so admin edits and
+  cascade deletes are covered too.
+- PostgreSQL: a generated tsvector column on posts_post with a GIN index,
+  kept current by the database itself.
+
+Ranking a term means scoring every post that contains it, which is fine for
+selective terms but not for one found in a large share of all captions. When
+a query matches more than POST_SEARCH_MAX_CANDIDATES posts, only the newest
+that many are ranked: the ID of the oldest candidate (the floor) is found
+with a cheap index walk in ID order and bounds the ranked query.
+
+Results are ranked (higher score is better) and paged with a keyset cursor
+over (score, id, floor), so every page is one bounded query with no OFFSET.
+"""
+import base64
+import json
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from .models import Post
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchBackend:
+    """Indexes captions and returns ranked post IDs"""
+
+    def index(self, post):
+        self.index_many([post])
+
+    def index_many(self, posts):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def build_query(self, query):
+        """Backend query for the user's input, or None if there is nothing to search for"""
+        return query if TOKEN_RE.search(query) else None
+
+    def search(self, query, user, after=None, limit=20):
+        """
+        Posts matching `query` that `user` may see, best first, as
+        ([(post_id, score), ...], floor). `after` is the (score, id, floor)
+        of the last row of the previous page.
+        """
+        match = self.build_query(query)
+        if match is None:
+            return [], None
+
+        if after is not None:
+            floor = after[2]
+        else:
+            floor = self.get_floor(match, settings.POST_SEARCH_MAX_CANDIDATES)
+        return self.rank(match, user, floor, after, limit), floor
+
+    def get_floor(self, match, candidates):
+        raise NotImplementedError
+
+    def rank(self, match, user, floor, after, limit):
+        raise NotImplementedError
+
+    def run(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def run_ranked(self, sql, params, after, limit):
+        """Order an `id, score` subquery and bound it by the cursor"""
+        sql = f'SELECT id, score FROM ({sql}) ranked'
+        if after is not None:
+            sql += ' WHERE score < %s OR (score = %s AND id < %s)'
+            params = params + [after[0], after[0], after[1]]
+        sql += ' ORDER BY score DESC, id DESC LIMIT %s'
+        return [(post_id, score) for post_id, score in self.run(sql, params + [limit])]
+
+
+class SQLiteFTSBackend(SearchBackend):
+
+    def index_many(self, posts):
+        with connection.cursor() as cursor:
+            cursor.executemany('DELETE FROM posts_post_fts WHERE rowid = %s', [[post.id] for post in posts])
+            cursor.executemany(
+                'INSERT INTO posts_post_fts (rowid, caption) VALUES (%s, %s)',
+                [[post.id, post.caption] for post in posts]
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_post_fts WHERE rowid = %s', [post_id])
+
+    def build_query(self, query):
+        # Quote every token so user input can't inject FTS5 syntax (operators, prefixes, columns)
+        tokens = TOKEN_RE.findall(query)
+        if not tokens:
+            return None
+        return ' '.join(f'"{token}"' for token in tokens)
+
+    def get_floor(self, match, candidates):
+        rows = self.run(
+            'SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s ORDER BY rowid DESC LIMIT 1 OFFSET %s',
+            [match, candidates - 1]
+        )
+        return rows[0][0] if rows else None
+
+    def rank(self, match, user, floor, after, limit):
+        return self.run_ranked('''
+            SELECT p.id AS id, -bm25(posts_post_fts) AS score
+            FROM posts_post_fts
+            JOIN posts_post p ON p.id = posts_post_fts.rowid
+            WHERE posts_post_fts MATCH %s AND posts_post_fts.rowid >= %s AND (p.is_public OR p.user_id = %s)
+        ''', [match, floor or 0, user.id], after, limit)
+
+
+class PostgresBackend(SearchBackend):
+
+    def get_floor(self, match, candidates):
+        rows = self.run('''
+            SELECT id FROM posts_post
+            WHERE search_vector @@ websearch_to_tsquery('simple', %s)
+            ORDER BY id DESC LIMIT 1 OFFSET %s
+        ''', [match, candidates - 1])
+        return rows[0][0] if rows else None
+
+    def rank(self, match, user, floor, after, limit):
+        return self.run_ranked('''
+            SELECT p.id AS id, ts_rank(p.search_vector, q) AS score
+            FROM posts_post p, websearch_to_tsquery('simple', %s) q
+            WHERE p.search_vector @@ q AND p.id >= %s AND (p.is_public OR p.user_id = %s)
+        ''', [match, floor or 0, user.id], after, limit)
+
+
+class FallbackBackend(SearchBackend):
+    """Unindexed icontains scan, newest first, for databases without a full-text backend"""
+
+    def get_floor(self, match, candidates):
+        return None
+
+    def rank(self, match, user, floor, after, limit):
+        posts = Post.objects.filter(Q(is_public=True) | Q(user=user), caption__icontains=match)
+        if after is not None:
+            posts = posts.filter(id__lt=after[1])
+        return [(post_id, 0.0) for post_id in posts.order_by('-id').values_list('id', flat=True)[:limit]]
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresBackend,
+}
+
+
+def get_backend():
+    return BACKENDS.get(connection.vendor, FallbackBackend)()
+
+
+def encode_cursor(score, post_id, floor):
+    return base64.urlsafe_b64encode(json.dumps([score, post_id, floor]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(encoded):
+    """(score, id, floor) from a cursor token; raises ValueError if it is malformed"""
+    try:
+        score, post_id, floor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+    except (TypeError, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError(str(e))
+    if not isinstance(score, (int, float)) or not isinstance(post_id, int):
+        raise ValueError('Invalid cursor')
+    if floor is not None and not isinstance(floor, int):
+        raise ValueError('Invalid cursor')
+    return float(score), post_id, floor
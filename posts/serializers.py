@@ -1,29 +1,121 @@
+from django.db import models
 from rest_framework import serializers
 from .models import Post, Like, Comment, CommentLike
+from .threads import attach_replies, iter_thread
 from accounts.serializers import UserMinimalSerializer
+from counters import sharded
+from counters.serializers import ShardedCountersSerializerMixin, ShardedCountersListSerializer
+from social_backend.fastpath import file_url, format_datetime, user_minimal, user_minimal_columns
+from social_backend.renditions import rendition_urls
 
 
-class PostSerializer(serializers.ModelSerializer):
+def get_liked_ids(like_model, like_field, request, ids):
+    """IDs among `ids` the requesting user has liked, in one IN query"""
+    if not ids or not (request and request.user.is_authenticated):
+        return set()
+    return set(like_model.objects.filter(
+        user=request.user,
+        **{f'{like_field}__in': ids}
+    ).values_list(f'{like_field}_id', flat=True))
+
+
+class LikedListSerializer(ShardedCountersListSerializer):
+    """
+    Resolves is_liked for a whole page with one IN query.
+
+    The viewer's likes for every object in the list are loaded up front and
+    handed to the child serializer, which then answers is_liked from the set
+    instead of querying once per object.
+    """
+    like_model = None
+    like_field = None
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.Manager) else data)
+        if getattr(self.child, 'liked_ids', None) is None:
+            self.child.liked_ids = self.get_liked_ids([item.id for item in self.get_counted_objects(items)])
+        return super().to_representation(items)
+
+    def get_liked_ids(self, ids):
+        return get_liked_ids(self.like_model, self.like_field, self.context.get('request'), ids)
+
+
+class PostListSerializer(LikedListSerializer):
+    like_model = Like
+    like_field = 'post'
+
+
+class CommentListSerializer(LikedListSerializer):
+    like_model = CommentLike
+    like_field = 'comment'
+
+    def get_counted_objects(self, items):
+        # Replies loaded with the page are resolved in the same queries
+        return list(iter_thread(items))
+
+
+class PostSerializer(ShardedCountersSerializerMixin, serializers.ModelSerializer):
     """Serializer for Post model"""
     user = UserMinimalSerializer(read_only=True)
+    image_renditions = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
         fields = [
-            'id', 'user', 'caption', 'image', 'video',
+            'id', 'user', 'caption', 'image', 'image_renditions', 'video',
             'likes_count', 'comments_count', 'shares_count',
             'is_public', 'is_liked', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'user', 'likes_count', 'comments_count', 'shares_count', 'created_at', 'updated_at']
+        list_serializer_class = PostListSerializer
+
+    def get_image_renditions(self, obj):
+        return rendition_urls(Post._meta.get_field('image'), obj.image_renditions, self.context.get('request'))
 
     def get_is_liked(self, obj):
+        liked_ids = getattr(self, 'liked_ids', None)
+        if liked_ids is not None:
+            return obj.id in liked_ids
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return Like.objects.filter(user=request.user, post=obj).exists()
         return False
 
 
+POST_FAST_COLUMNS = [
+    'id', *user_minimal_columns('user'), 'caption', 'image', 'image_renditions', 'video',
+    'likes_count', 'comments_count', 'shares_count',
+    'is_public', 'created_at', 'updated_at'
+]
+
+
+def build_post_list(rows, request):
+    """Fast-path equivalent of PostSerializer(many=True) for POST_FAST_COLUMNS rows"""
+    ids = [row['id'] for row in rows]
+    pending = sharded.get_pending(Post, ids, Post.counter_fields)
+    liked_ids = get_liked_ids(Like, 'post', request, ids)
+    image_field = Post._meta.get_field('image')
+    video_field = Post._meta.get_field('video')
+    profile_picture_field = Post._meta.get_field('user').related_model._meta.get_field('profile_picture')
+
+    return [{
+        'id': row['id'],
+        'user': user_minimal(row, 'user', request, profile_picture_field),
+        'caption': row['caption'],
+        'image': file_url(image_field, row['image'], request),
+        'image_renditions': rendition_urls(image_field, row['image_renditions'], request),
+        'video': file_url(video_field, row['video'], request),
+        'likes_count': row['likes_count'] + pending.get((row['id'], 'likes_count'), 0),
+        'comments_count': row['comments_count'] + pending.get((row['id'], 'comments_count'), 0),
+        'shares_count': row['shares_count'] + pending.get((row['id'], 'shares_count'), 0),
+        'is_public': row['is_public'],
+        'is_liked': row['id'] in liked_ids,
+        'created_at': format_datetime(row['created_at']),
+        'updated_at': format_datetime(row['updated_at']),
+    } for row in rows]
+
+
 class PostCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating posts"""
 
@@ -52,7 +144,7 @@ class CommentCreateSerializer(serializers.ModelSerializer):
         }
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(ShardedCountersSerializerMixin, serializers.ModelSerializer):
     """Serializer for Comment model"""
     user = UserMinimalSerializer(read_only=True)
     replies = serializers.SerializerMethodField()
@@ -61,18 +153,27 @@ class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = [
-            'id', 'user', 'post', 'text', 'parent',
-            'likes_count', 'is_liked', 'replies',
+            'id', 'user', 'post', 'text', 'parent', 'depth',
+            'likes_count', 'is_liked', 'replies_count', 'replies',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'user', 'likes_count', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'user', 'depth', 'likes_count', 'replies_count', 'created_at', 'updated_at']
+        list_serializer_class = CommentListSerializer
 
     def get_replies(self, obj):
-        if obj.replies.exists():
-            return CommentSerializer(obj.replies.all(), many=True, context=self.context).data
-        return []
+        if not hasattr(obj, 'loaded_replies'):
+            attach_replies([obj])
+        if not obj.loaded_replies:
+            return []
+        serializer = CommentSerializer(obj.loaded_replies, many=True, context=self.context)
+        serializer.child.liked_ids = getattr(self, 'liked_ids', None)
+        serializer.child.counters_applied = getattr(self, 'counters_applied', False)
+        return serializer.data
 
     def get_is_liked(self, obj):
+        liked_ids = getattr(self, 'liked_ids', None)
+        if liked_ids is not None:
+            return obj.id in liked_ids
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return CommentLike.objects.filter(user=request.user, comment=obj).exists()
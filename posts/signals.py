@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import search
+from .models import Post
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, created, update_fields=None, **kwargs):
+    # Saves that only touch other columns (image renditions, counters) leave the index alone
+    if created or update_fields is None or 'caption' in update_fields:
+        search.get_backend().index(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    # Also runs for cascades, e.g. when the author's account is deleted
+    search.get_backend().remove(instance.id)
@@ -1,3 +1,533 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from PIL import Image
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from accounts.models import User
+from counters import sharded
+from social_backend.pagination import KeysetPagination
+from friends.models import Follow
+from . import feed_cache, timeline
+from .models import Post, Like
+from .views import PostListCreateView
+
+
+class FeedQueryCountTests(TestCase):
+    """The feed must cost a fixed number of queries whatever the page size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='pass1234')
+        author = User.objects.create_user(username='author', email='author@example.com', password='pass1234')
+        Follow.objects.create(follower=cls.user, following=author)
+        posts = [Post.objects.create(user=author, caption=f'Post {i}') for i in range(30)]
+        for post in posts[::2]:
+            Like.objects.create(user=cls.user, post=post)
+        timeline.rebuild_timeline(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_feed_queries(self, page_size):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/posts/', {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(context.captured_queries)
+
+    def test_query_count_is_flat(self):
+        self.assertEqual(self.count_feed_queries(5), self.count_feed_queries(25))
+
+    def test_next_and_previous_links(self):
+        def get(url, **params):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            return response.data, [post['caption'] for post in response.data['results']]
+
+        first, captions = get('/api/posts/', page_size=12)
+        self.assertEqual(captions, [f'Post {i}' for i in range(29, 17, -1)])
+        self.assertIsNone(first['previous'])
+        second, captions = get(first['next'])
+        self.assertEqual(captions, [f'Post {i}' for i in range(17, 5, -1)])
+        third, captions = get(second['next'])
+        self.assertEqual(captions, [f'Post {i}' for i in range(5, -1, -1)])
+        self.assertIsNone(third['next'])
+
+        back, captions = get(third['previous'])
+        self.assertEqual(captions, [f'Post {i}' for i in range(17, 5, -1)])
+        back, captions = get(back['previous'])
+        self.assertEqual(captions, [f'Post {i}' for i in range(29, 17, -1)])
+        self.assertIsNone(back['previous'])
+
+    def test_is_liked_resolved_from_page(self):
+        response = self.client.get('/api/posts/', {'page_size': 30})
+        liked = set(Like.objects.filter(user=self.user).values_list('post_id', flat=True))
+        for post in response.data['results']:
+            self.assertEqual(post['is_liked'], post['id'] in liked)
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor paging over (created_at, id) must never repeat or skip a row"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author', email='author@example.com', password='pass1234')
+        cls.posts = [Post.objects.create(user=cls.user, caption=f'Post {i}') for i in range(12)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/posts/user/{self.user.id}/'
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data, [post['id'] for post in response.data['results']]
+
+    def walk(self, between_pages=None):
+        ids = []
+        data, page = self.get(self.url, page_size=5)
+        ids += page
+        while data['next']:
+            if between_pages:
+                between_pages()
+            data, page = self.get(data['next'])
+            ids += page
+        return ids
+
+    def test_inserts_while_scrolling_do_not_shift_pages(self):
+        expected = [post.id for post in reversed(self.posts)]
+        created = []
+        ids = self.walk(lambda: created.append(Post.objects.create(user=self.user, caption='new')))
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(created), 2)
+
+    def test_ties_on_created_at_are_broken_by_id(self):
+        Post.objects.filter(user=self.user).update(created_at=self.posts[0].created_at)
+        expected = sorted((post.id for post in self.posts), reverse=True)
+        self.assertEqual(self.walk(), expected)
+
+        # Walking back from the last page returns the same pages
+        data, _ = self.get(self.url, page_size=5)
+        data, _ = self.get(data['next'])
+        data, last = self.get(data['next'])
+        self.assertIsNone(data['next'])
+        data, middle = self.get(data['previous'])
+        self.assertEqual(middle, expected[5:10])
+        data, first = self.get(data['previous'])
+        self.assertEqual(first, expected[:5])
+        self.assertIsNone(data['previous'])
+
+    def test_invalid_cursors_are_rejected(self):
+        paginator = KeysetPagination()
+        paginator.fields = ['created_at']
+        paginator.base_url = 'http://testserver' + self.url
+        short_cursor = parse_qs(urlparse(paginator.encode_cursor(self.posts[0], False, 1)).query)['cursor'][0]
+        for cursor in ('garbage', short_cursor):
+            response = self.client.get(self.url, {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+class TimelineTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='pass1234')
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='pass1234')
+        cls.stranger = User.objects.create_user(username='stranger', email='stranger@example.com', password='pass1234')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def create_post(self, user, caption, is_public=True):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/posts/', {'caption': caption, 'is_public': is_public})
+        self.assertEqual(response.status_code, 201)
+
+    def feed_captions(self, user):
+        self.client.force_authenticate(user)
+        return [post['caption'] for post in self.client.get('/api/posts/').data['results']]
+
+    def test_posts_fan_out_to_followers_only(self):
+        self.client.force_authenticate(self.reader)
+        self.client.post(f'/api/friends/follow/{self.author.id}/')
+        self.create_post(self.author, 'hello')
+        self.create_post(self.author, 'secret', is_public=False)
+        self.create_post(self.stranger, 'unrelated')
+
+        self.assertEqual(self.feed_captions(self.reader), ['hello'])
+        self.assertEqual(self.feed_captions(self.author), ['secret', 'hello'])
+
+    def test_high_fanout_authors_are_merged_at_read_time(self):
+        Follow.objects.create(follower=self.reader, following=self.author)
+        User.objects.filter(id=self.author.id).update(followers_count=10 ** 9)
+        self.author.refresh_from_db()
+        self.create_post(self.author, 'celebrity')
+
+        self.assertFalse(self.reader.timeline_entries.exists())
+        self.assertEqual(self.feed_captions(self.reader), ['celebrity'])
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=1)
+    def test_high_fanout_counts_unflushed_followers(self):
+        for follower in (self.reader, self.stranger):
+            self.client.force_authenticate(follower)
+            self.client.post(f'/api/friends/follow/{self.author.id}/')
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)  # still pending in shards
+        self.create_post(self.author, 'celebrity')
+
+        self.assertFalse(self.reader.timeline_entries.exists())
+        self.assertEqual(self.feed_captions(self.reader), ['celebrity'])
+
+    def test_unfollow_removes_author_posts(self):
+        self.client.force_authenticate(self.reader)
+        self.client.post(f'/api/friends/follow/{self.author.id}/')
+        self.create_post(self.author, 'hello')
+        self.client.force_authenticate(self.reader)
+        self.client.post(f'/api/friends/follow/{self.author.id}/')
+
+        self.assertEqual(self.feed_captions(self.reader), [])
+
+    def test_only_visibility_changes_touch_other_timelines(self):
+        Follow.objects.create(follower=self.reader, following=self.author)
+        self.create_post(self.author, 'draft', is_public=False)
+        post = Post.objects.get(caption='draft')
+        self.assertFalse(self.reader.timeline_entries.exists())
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.patch(f'/api/posts/{post.id}/', {'caption': 'still a draft'})
+        self.assertFalse([query for query in context.captured_queries if 'posts_timelineentry' in query['sql']])
+
+        self.client.patch(f'/api/posts/{post.id}/', {'is_public': True})
+        self.assertEqual(self.feed_captions(self.reader), ['still a draft'])
+        self.client.force_authenticate(self.author)
+        with CaptureQueriesContext(connection) as context:
+            self.client.patch(f'/api/posts/{post.id}/', {'caption': 'published'})
+        self.assertFalse([query for query in context.captured_queries if 'posts_timelineentry' in query['sql']])
+
+        self.client.patch(f'/api/posts/{post.id}/', {'is_public': False})
+        self.assertEqual(self.feed_captions(self.reader), [])
+        self.assertEqual(self.feed_captions(self.author), ['published'])
+
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_timelines_are_trimmed_on_write(self):
+        Follow.objects.create(follower=self.reader, following=self.author)
+        for caption in ('one', 'two', 'three'):
+            self.create_post(self.author, caption)
+        self.assertEqual(self.feed_captions(self.reader), ['three', 'two'])
+        self.assertEqual(self.author.timeline_entries.count(), 2)
+
+        for caption in ('four', 'five', 'six'):
+            Post.objects.create(user=self.stranger, caption=caption)
+        self.client.force_authenticate(self.reader)
+        self.client.post(f'/api/friends/follow/{self.stranger.id}/')
+        self.assertEqual(self.feed_captions(self.reader), ['six', 'five'])
+
+
+class CommentThreadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='pass1234')
+        cls.post = Post.objects.create(user=cls.user, caption='Thread')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def reply(self, parent=None, text='reply'):
+        response = self.client.post(
+            f'/api/posts/{self.post.id}/comments/',
+            {'post': self.post.id, 'text': text, 'parent': parent},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def build_chain(self, length):
+        parent = self.reply()
+        for _ in range(length - 1):
+            parent = self.reply(parent)
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f'/api/posts/{self.post.id}/comments/', {'depth': 10})
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_thread_loads_in_constant_queries(self):
+        self.build_chain(3)
+        shallow = self.count_list_queries()
+        self.build_chain(8)
+        self.assertEqual(self.count_list_queries(), shallow)
+
+    def test_depth_limit_and_load_more(self):
+        root = self.reply()
+        child = self.reply(root)
+        grandchild = self.reply(child)
+
+        data = self.client.get(f'/api/posts/{self.post.id}/comments/', {'depth': 1}).data['results'][0]
+        self.assertEqual(data['replies_count'], 1)
+        self.assertEqual(data['replies'][0]['id'], child)
+        self.assertEqual(data['replies'][0]['replies'], [])
+        self.assertEqual(data['replies'][0]['replies_count'], 1)
+
+        more = self.client.get(f'/api/posts/comments/{child}/replies/').data['results']
+        self.assertEqual([comment['id'] for comment in more], [grandchild])
+        self.assertEqual(more[0]['depth'], 2)
+
+
+class FeedCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='pass1234')
+        cls.post = Post.objects.create(user=cls.user, caption='Cached')
+        timeline.rebuild_timeline(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_feed(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/posts/')
+        return response.data['results'], len(context.captured_queries)
+
+    def test_second_read_is_served_from_cache(self):
+        first, _ = self.get_feed()
+        second, queries = self.get_feed()
+        self.assertEqual(first, second)
+        self.assertEqual(queries, 0)
+
+    def test_like_invalidates_cached_page(self):
+        self.get_feed()
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        results, queries = self.get_feed()
+        self.assertGreater(queries, 0)
+        self.assertTrue(results[0]['is_liked'])
+        self.assertEqual(results[0]['likes_count'], 1)
+
+    def test_miss_scans_the_page_once(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/posts/')
+        page_scans = [
+            query for query in context.captured_queries
+            if '"posts_timelineentry"' in query['sql'] and 'LIMIT' in query['sql']
+        ]
+        self.assertEqual(len(page_scans), 1)
+
+    def test_like_during_a_miss_is_not_cached_stale(self):
+        build = PostListCreateView.build_fast_data
+
+        def build_then_like(view, rows):
+            data = build(view, rows)
+            # A like lands after the page was loaded but before it is cached
+            sharded.increment(Post, self.post.id, 'likes_count')
+            feed_cache.bump_post(self.post.id)
+            return data
+
+        with mock.patch.object(PostListCreateView, 'build_fast_data', build_then_like):
+            stale, _ = self.get_feed()
+        self.assertEqual(stale[0]['likes_count'], 0)
+
+        results, queries = self.get_feed()
+        self.assertGreater(queries, 0)
+        self.assertEqual(results[0]['likes_count'], 1)
+
+    def test_new_post_invalidates_cached_page(self):
+        self.get_feed()
+        self.client.post('/api/posts/', {'caption': 'Fresh'})
+        results, _ = self.get_feed()
+        self.assertEqual([post['caption'] for post in results], ['Fresh', 'Cached'])
+
+
+@override_settings(MEDIA_URL='/media/')
+class FastListPathTests(TestCase):
+    """The serializer-free list path must render exactly the serializers' bytes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='pass1234')
+        author = User.objects.create_user(username='autor_ü', email='author@example.com', password='pass1234')
+        User.objects.filter(id=author.id).update(profile_picture='profile_pictures/me.png', is_verified=True)
+        Follow.objects.create(follower=cls.user, following=author)
+        for i in range(5):
+            post = Post.objects.create(user=author, caption=f'Caption {i} ✓ "quoted"', image='posts/p.jpg' if i % 2 else None)
+            Like.objects.create(user=cls.user, post=post)
+        cls.author = author
+        timeline.rebuild_timeline(cls.user)
+        sharded.increment(Post, post.id, 'likes_count', 7)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertSameBytes(self, url):
+        responses = []
+        for fast in (False, True):
+            cache.clear()
+            with self.settings(FAST_LIST_RESPONSES=fast):
+                responses.append(self.client.get(url).content)
+        self.assertEqual(responses[0], responses[1])
+
+    def test_feed(self):
+        self.assertSameBytes('/api/posts/?page_size=3')
+
+    def test_user_posts(self):
+        self.assertSameBytes(f'/api/posts/user/{self.author.id}/')
+
+
+class ImageRenditionTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.user = User.objects.create_user(username='author', email='author@example.com', password='pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_upload_generates_renditions_after_commit(self):
+        upload = io.BytesIO()
+        Image.new('RGB', (3000, 2000), 'red').save(upload, 'JPEG')
+        upload.name = 'photo.jpg'
+        upload.seek(0)
+
+        with self.settings(MEDIA_ROOT=self.media_root, IMAGE_RENDITIONS_ASYNC=False):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/posts/', {'caption': 'Photo', 'image': upload}, format='multipart')
+            self.assertEqual(response.status_code, 201)
+
+            post = Post.objects.get()
+            self.assertEqual(set(post.image_renditions), {'thumbnail', 'feed', 'full'})
+            with Image.open(os.path.join(self.media_root, post.image_renditions['feed']['webp'])) as feed:
+                self.assertEqual(feed.size, (1080, 720))
+
+            data = self.client.get(f'/api/posts/{post.id}/').data
+            self.assertTrue(data['image_renditions']['thumbnail']['jpeg'].endswith('/thumbnail.jpeg'))
+
+            # A new image replaces the renditions, and the old files go away once the new set is saved
+            first_set = post.image_renditions
+            upload.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(f'/api/posts/{post.id}/', {'image': upload}, format='multipart')
+            post.refresh_from_db()
+            self.assertEqual(set(post.image_renditions), {'thumbnail', 'feed', 'full'})
+            self.assertFalse(os.path.exists(os.path.join(self.media_root, first_set['feed']['webp'])))
+            second_set = post.image_renditions
+
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(f'/api/posts/{post.id}/', {'image': None}, format='json')
+            self.assertEqual(response.status_code, 200)
+            post.refresh_from_db()
+            self.assertFalse(post.image)
+            self.assertEqual(post.image_renditions, {})
+            self.assertFalse(os.path.exists(os.path.join(self.media_root, second_set['thumbnail']['jpeg'])))
+
+    def test_posts_without_renditions_skip_the_reset(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/posts/', {'caption': 'Text only'})
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse([query for query in context.captured_queries if 'image_renditions' in query['sql'] and query['sql'].startswith('UPDATE')])
+
+
+class PostSearchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author', email='author@example.com', password='pass1234')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='pass1234')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, caption, **extra):
+        response = self.client.post('/api/posts/', {'caption': caption, **extra}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Post.objects.latest('id')
+
+    def search(self, query, **params):
+        response = self.client.get('/api/posts/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def result_ids(self, query):
+        return [post['id'] for post in self.search(query).data['results']]
+
+    def test_index_follows_create_update_delete(self):
+        post = self.create('Sunset over the harbour')
+        self.assertEqual(self.result_ids('harbour'), [post.id])
+
+        self.client.patch(f'/api/posts/{post.id}/', {'caption': 'Sunrise in the mountains'}, format='json')
+        self.assertEqual(self.result_ids('harbour'), [])
+        self.assertEqual(self.result_ids('mountains'), [post.id])
+
+        self.client.delete(f'/api/posts/{post.id}/')
+        self.assertEqual(self.result_ids('mountains'), [])
+
+    def test_index_follows_orm_writes_and_cascades(self):
+        author = User.objects.create_user(username='leaving', email='leaving@example.com', password='pass1234')
+        post = Post.objects.create(user=author, caption='Lighthouse at dusk')
+        self.assertEqual(self.result_ids('lighthouse'), [post.id])
+
+        post.caption = 'Harbour at dawn'
+        post.save()
+        self.assertEqual(self.result_ids('lighthouse'), [])
+        self.assertEqual(self.result_ids('dawn'), [post.id])
+
+        author.delete()
+        self.assertEqual(self.result_ids('dawn'), [])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM posts_post_fts WHERE rowid = %s', [post.id])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_results_are_ranked(self):
+        weak = self.create('Coffee with friends, then a long walk home through the old town')
+        strong = self.create('Coffee coffee coffee')
+        self.create('Tea in the garden')
+        self.assertEqual(self.result_ids('coffee'), [strong.id, weak.id])
+        self.assertEqual(self.result_ids('COFFEE friends'), [weak.id])
+
+    def test_private_posts_of_others_are_hidden(self):
+        mine = self.create('Private garden notes', is_public=False)
+        self.client.force_authenticate(self.other)
+        theirs = self.create('Garden party')
+        self.assertEqual(self.result_ids('garden'), [theirs.id])
+        self.client.force_authenticate(self.user)
+        self.assertCountEqual(self.result_ids('garden'), [mine.id, theirs.id])
+
+    def test_cursor_pagination(self):
+        for i in range(7):
+            self.create(f'Travel diary day {i}')
+
+        seen, params = [], {'page_size': 3}
+        while True:
+            response = self.search('travel', **params)
+            seen.extend(post['id'] for post in response.data['results'])
+            if not response.data['next']:
+                break
+            params['cursor'] = parse_qs(urlparse(response.data['next']).query)['cursor'][0]
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+    def test_common_terms_rank_newest_candidates(self):
+        posts = [self.create(f'Weekend {"weekend " * i}') for i in range(5)]
+        with self.settings(POST_SEARCH_MAX_CANDIDATES=3):
+            self.assertEqual(self.result_ids('weekend'), [post.id for post in reversed(posts[2:])])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.create('Tickets: "sold out" NEAR the stage')
+        self.assertEqual(len(self.search('"sold) out* NEAR(').data['results']), 1)
+        self.assertEqual(self.client.get('/api/posts/search/', {'q': ''}).status_code, 400)
+        self.assertEqual(self.client.get('/api/posts/search/', {'q': 'x', 'cursor': 'bogus'}).status_code, 400)
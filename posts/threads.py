@@ -0,0 +1,55 @@
+"""
+Comment thread loading.
+
+Every comment stores the top-level comment of its thread (root) and its depth,
+so the replies under any set of comments, down to a depth limit, come back in
+a single query and the tree is assembled in memory. Comments at the depth
+limit still report replies_count; clients fetch the rest of a deep branch
+page by page from the replies endpoint.
+"""
+from django.db.models import Q
+from .models import Comment
+
+DEFAULT_DEPTH = 3
+MAX_DEPTH = 10
+
+
+def attach_replies(comments, depth=DEFAULT_DEPTH):
+    """Load up to `depth` levels of replies under each comment in one query"""
+    comments = list(comments)
+    for comment in comments:
+        comment.loaded_replies = []
+    if not comments or depth < 1:
+        return comments
+
+    condition = Q()
+    for comment in comments:
+        condition |= Q(
+            root_id=comment.root_id or comment.id,
+            depth__gt=comment.depth,
+            depth__lte=comment.depth + depth
+        )
+    descendants = Comment.objects.filter(condition).select_related('user').order_by('-created_at', '-id')
+
+    nodes = {comment.id: comment for comment in comments}
+    children = {}
+    for reply in descendants:
+        reply.loaded_replies = []
+        children.setdefault(reply.parent_id, []).append(reply)
+
+    # Walk down from the requested comments so other branches of a shared thread are ignored
+    pending = list(nodes.values())
+    while pending:
+        node = pending.pop()
+        node.loaded_replies = children.get(node.id, [])
+        pending.extend(node.loaded_replies)
+    return comments
+
+
+def iter_thread(comments):
+    """Yield the given comments and every reply loaded beneath them"""
+    pending = list(comments)
+    while pending:
+        comment = pending.pop()
+        yield comment
+        pending.extend(getattr(comment, 'loaded_replies', []))
@@ -0,0 +1,161 @@
+"""
+Home timeline materialization.
+
+New posts are fanned out on write into the TimelineEntry rows of the author,
+their followers and their accepted friends, so reading the feed only touches
+the reader's own timeline instead of the whole posts table. Authors with more
+than TIMELINE_FANOUT_MAX_FOLLOWERS followers are not fanned out; their posts
+are merged into the feed at read time instead.
+
+Every write that adds entries trims the timelines it touched back to
+TIMELINE_MAX_LENGTH, so the table stays bounded without a periodic job.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Q
+from counters import sharded
+from friends.models import Follow, FriendEdge
+from . import feed_cache
+from .models import Post, TimelineEntry
+
+User = get_user_model()
+
+
+def is_high_fanout(user):
+    return sharded.get_total(user, 'followers_count') > settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+
+
+def get_friend_ids(user_id):
+    return set(FriendEdge.objects.filter(user_id=user_id).values_list('friend_id', flat=True))
+
+
+def get_audience_ids(user_id):
+    """Users whose timelines receive this user's posts"""
+    follower_ids = Follow.objects.filter(following_id=user_id).values_list('follower_id', flat=True)
+    return set(follower_ids) | get_friend_ids(user_id)
+
+
+def get_source_ids(user_id):
+    """Users whose posts appear in this user's timeline"""
+    following_ids = Follow.objects.filter(follower_id=user_id).values_list('following_id', flat=True)
+    return set(following_ids) | get_friend_ids(user_id)
+
+
+def fan_out_post(post, batch_size=1000):
+    """Deliver a new post to its author's timeline and, if public, to their audience"""
+    recipient_ids = {post.user_id}
+    if post.is_public:
+        if is_high_fanout(post.user):
+            feed_cache.bump_author_posts(post.user_id)
+        else:
+            recipient_ids |= get_audience_ids(post.user_id)
+
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, created_at=post.created_at) for user_id in recipient_ids],
+        batch_size=batch_size,
+        ignore_conflicts=True
+    )
+    trim_timelines(recipient_ids, batch_size)
+    feed_cache.bump_feeds(recipient_ids)
+
+
+def refresh_post(post, was_public):
+    """Re-apply visibility after a post was edited; only a change of is_public touches other timelines"""
+    feed_cache.bump_post(post.id)
+    if post.is_public and not was_public:
+        fan_out_post(post)
+    elif was_public and not post.is_public:
+        TimelineEntry.objects.filter(post=post).exclude(user_id=post.user_id).delete()
+
+
+def add_source(user_id, author):
+    """Pull an author's recent posts into a timeline after a follow or new friendship"""
+    if not is_high_fanout(author):
+        posts = Post.objects.filter(
+            user=author,
+            is_public=True
+        ).order_by('-created_at')[:settings.TIMELINE_MAX_LENGTH]
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, post=post, created_at=post.created_at) for post in posts],
+            ignore_conflicts=True
+        )
+        trim_timeline(user_id)
+    feed_cache.bump_feeds([user_id])
+
+
+def remove_source(user_id, author_id):
+    """Drop an author's posts from a timeline once no follow or friendship links them"""
+    if author_id in get_source_ids(user_id):
+        return
+    TimelineEntry.objects.filter(user_id=user_id, post__user_id=author_id).delete()
+    feed_cache.bump_feeds([user_id])
+
+
+def rebuild_timeline(user):
+    """Backfill a timeline from scratch with the newest posts of its sources"""
+    sources = sharded.annotate_total(
+        User.objects.filter(id__in=get_source_ids(user.id)), 'followers_count'
+    ).filter(
+        followers_count_total__lte=settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    ).values_list('id', flat=True)
+    posts = Post.objects.filter(
+        Q(user=user) | Q(user_id__in=list(sources), is_public=True)
+    ).only('id', 'created_at').order_by('-created_at')[:settings.TIMELINE_MAX_LENGTH]
+
+    with transaction.atomic():
+        # Readers never see the timeline empty between the delete and the insert
+        TimelineEntry.objects.filter(user=user).delete()
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user=user, post_id=post.id, created_at=post.created_at) for post in posts]
+        )
+    feed_cache.bump_feeds([user.id])
+
+
+def trim_timeline(user_id):
+    """Delete entries beyond TIMELINE_MAX_LENGTH; returns the number removed"""
+    boundary = TimelineEntry.objects.filter(
+        user_id=user_id
+    ).order_by('-created_at').values_list('created_at', flat=True)[settings.TIMELINE_MAX_LENGTH:][:1]
+    boundary = list(boundary)
+    if not boundary:
+        return 0
+    deleted, _ = TimelineEntry.objects.filter(user_id=user_id, created_at__lte=boundary[0]).delete()
+    return deleted
+
+
+def trim_timelines(user_ids, batch_size=1000):
+    """Trim the timelines that grew past TIMELINE_MAX_LENGTH, one count query per batch of users"""
+    user_ids = list(user_ids)
+    removed = 0
+    for start in range(0, len(user_ids), batch_size):
+        over = TimelineEntry.objects.filter(
+            user_id__in=user_ids[start:start + batch_size]
+        ).values('user_id').annotate(
+            entries=Count('id')
+        ).filter(entries__gt=settings.TIMELINE_MAX_LENGTH).values_list('user_id', flat=True)
+        for user_id in over:
+            removed += trim_timeline(user_id)
+    return removed
+
+
+def get_high_fanout_source_ids(user):
+    """Sources of this user's timeline whose posts are merged at read time"""
+    sources = User.objects.filter(
+        Q(id__in=Follow.objects.filter(follower=user).values('following_id')) |
+        Q(id__in=FriendEdge.objects.filter(user=user).values('friend_id'))
+    )
+    return list(sharded.annotate_total(sources, 'followers_count').filter(
+        followers_count_total__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    ).values_list('id', flat=True))
+
+
+def get_feed_queryset(user, high_fanout_ids=None):
+    """Posts in the user's materialized timeline plus high-fanout sources merged at read time"""
+    if high_fanout_ids is None:
+        high_fanout_ids = get_high_fanout_source_ids(user)
+
+    condition = Q(id__in=TimelineEntry.objects.filter(user=user).values('post_id'))
+    if high_fanout_ids:
+        condition |= Q(user_id__in=high_fanout_ids, is_public=True)
+    return Post.objects.filter(condition)
@@ -1,11 +1,14 @@
 from django.urls import path
 from .views import (
     PostListCreateView,
+    FeedCacheStatsView,
     PostDetailView,
+    PostSearchView,
     UserPostsView,
     LikePostView,
     CommentListCreateView,
     CommentDetailView,
+    CommentRepliesView,
     LikeCommentView
 )
 
@@ -14,6 +17,8 @@ urlpatterns = [
     path('', PostListCreateView.as_view(), name='post-list-create'),
     path('<int:pk>/', PostDetailView.as_view(), name='post-detail'),
     path('user/<int:user_id>/', UserPostsView.as_view(), name='user-posts'),
+    path('search/', PostSearchView.as_view(), name='post-search'),
+    path('feed/cache-stats/', FeedCacheStatsView.as_view(), name='feed-cache-stats'),
 
     # Likes
     path('<int:post_id>/like/', LikePostView.as_view(), name='like-post'),
@@ -21,5 +26,6 @@ urlpatterns = [
     # Comments
     path('<int:post_id>/comments/', CommentListCreateView.as_view(), name='comment-list-create'),
     path('comments/<int:pk>/', CommentDetailView.as_view(), name='comment-detail'),
+    path('comments/<int:comment_id>/replies/', CommentRepliesView.as_view(), name='comment-replies'),
     path('comments/<int:comment_id>/like/', LikeCommentView.as_view(), name='like-comment'),
 ]
\ No newline at end of file
@@ -1,37 +1,67 @@
 from rest_framework import generics, status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import replace_query_param
+from django.contrib.auth import get_user_model
+from counters import sharded
+from social_backend.fastpath import FastListMixin
+from social_backend.pagination import KeysetPagination
+from social_backend import renditions
+from . import feed_cache, search, threads, timeline
 from .models import Post, Like, Comment, CommentLike
 from .serializers import (
     PostSerializer,
     PostCreateSerializer,
     LikeSerializer,
-    CommentSerializer
+    CommentSerializer,
+    POST_FAST_COLUMNS,
+    build_post_list
 )
 
+User = get_user_model()
 
-class PostListCreateView(generics.ListCreateAPIView):
+
+class PostListCreateView(FastListMixin, generics.ListCreateAPIView):
     """List all posts (feed) and create new post"""
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    fast_columns = POST_FAST_COLUMNS
+
+    def build_fast_data(self, rows):
+        return build_post_list(rows, self.request)
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return PostCreateSerializer
         return PostSerializer
 
+    def list(self, request, *args, **kwargs):
+        cursor = self.paginator.decode_cursor(request)
+        page_key = feed_cache.get_page_key(request, cursor['p'] if cursor else 0)
+        data = feed_cache.get_page(page_key)
+        if data is not None:
+            return Response(data)
+
+        self.high_fanout_ids = timeline.get_high_fanout_source_ids(request.user)
+        snapshot = feed_cache.snapshot_time()
+        response = super().list(request, *args, **kwargs)
+        feed_cache.set_page(page_key, response.data, snapshot, self.high_fanout_ids)
+        return response
+
     def get_queryset(self):
-        # Get posts from user and their friends
-        user = self.request.user
-        return Post.objects.filter(
-            Q(user=user) | Q(is_public=True)
+        # Get posts from the user's materialized timeline
+        return timeline.get_feed_queryset(
+            self.request.user,
+            getattr(self, 'high_fanout_ids', None)
         ).select_related('user').order_by('-created_at')
 
     def perform_create(self, serializer):
         post = serializer.save(user=self.request.user)
+        renditions.schedule(post, 'image')
+        timeline.fan_out_post(post)
         # Update user's post count
-        self.request.user.posts_count += 1
-        self.request.user.save()
+        sharded.increment(User, post.user_id, 'posts_count')
 
 
 class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -45,21 +75,67 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
             return PostCreateSerializer
         return PostSerializer
 
+    def perform_update(self, serializer):
+        was_public = serializer.instance.is_public
+        post = serializer.save()
+        if 'image' in serializer.validated_data:
+            renditions.schedule(post, 'image')
+        timeline.refresh_post(post, was_public)
+
     def perform_destroy(self, instance):
         # Update user's post count
-        instance.user.posts_count -= 1
-        instance.user.save()
+        sharded.decrement(User, instance.user_id, 'posts_count')
+        feed_cache.bump_post(instance.id)
         instance.delete()
 
 
-class UserPostsView(generics.ListAPIView):
+class UserPostsView(FastListMixin, generics.ListAPIView):
     """Get all posts by a specific user"""
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    fast_columns = POST_FAST_COLUMNS
+
+    def build_fast_data(self, rows):
+        return build_post_list(rows, self.request)
 
     def get_queryset(self):
         user_id = self.kwargs.get('user_id')
-        return Post.objects.filter(user_id=user_id).order_by('-created_at')
+        return Post.objects.filter(user_id=user_id).select_related('user').order_by('-created_at')
+
+
+class PostSearchView(APIView):
+    """Ranked full-text search over post captions"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'Search query (q) is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        after = None
+        if request.query_params.get('cursor'):
+            try:
+                after = search.decode_cursor(request.query_params['cursor'])
+            except ValueError:
+                return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+
+        page_size = KeysetPagination().get_page_size(request)
+        hits, floor = search.get_backend().search(query, request.user, after, page_size + 1)
+        has_more = len(hits) > page_size
+        hits = hits[:page_size]
+
+        posts = Post.objects.select_related('user').in_bulk([post_id for post_id, _ in hits])
+        results = [posts[post_id] for post_id, _ in hits if post_id in posts]
+        serializer = PostSerializer(results, many=True, context={'request': request})
+
+        next_url = None
+        if has_more:
+            post_id, score = hits[-1]
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'cursor', search.encode_cursor(score, post_id, floor)
+            )
+        return Response({'next': next_url, 'results': serializer.data})
 
 
 class LikePostView(APIView):
@@ -84,26 +160,50 @@ class LikePostView(APIView):
         if not created:
             # Unlike
             like.delete()
-            post.likes_count -= 1
-            post.save()
+            sharded.decrement(Post, post.id, 'likes_count')
+            feed_cache.bump_post(post.id)
             return Response(
                 {'message': 'Post unliked', 'liked': False},
                 status=status.HTTP_200_OK
             )
         else:
             # Like
-            post.likes_count += 1
-            post.save()
+            sharded.increment(Post, post.id, 'likes_count')
+            feed_cache.bump_post(post.id)
             return Response(
                 {'message': 'Post liked', 'liked': True},
                 status=status.HTTP_201_CREATED
             )
 
 
-class CommentListCreateView(generics.ListCreateAPIView):
+class FeedCacheStatsView(APIView):
+    """Hit/miss metrics of the feed response cache"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(feed_cache.get_stats(), status=status.HTTP_200_OK)
+
+
+class CommentThreadMixin:
+    """Loads the reply trees of a page of comments in one query"""
+
+    def get_thread_depth(self):
+        try:
+            depth = int(self.request.query_params.get('depth', threads.DEFAULT_DEPTH))
+        except ValueError:
+            depth = threads.DEFAULT_DEPTH
+        return max(0, min(depth, threads.MAX_DEPTH))
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        return threads.attach_replies(queryset if page is None else page, self.get_thread_depth())
+
+
+class CommentListCreateView(CommentThreadMixin, generics.ListCreateAPIView):
     """List and create comments on a post"""
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         post_id = self.kwargs.get('post_id')
@@ -111,16 +211,22 @@ class CommentListCreateView(generics.ListCreateAPIView):
         return Comment.objects.filter(
             post_id=post_id,
             parent__isnull=True
-        ).order_by('-created_at')
+        ).select_related('user').order_by('-created_at')
 
     def perform_create(self, serializer):
         post_id = self.kwargs.get('post_id')
         post = Post.objects.get(id=post_id)
+        parent = serializer.validated_data.get('parent')
+        if parent is not None and parent.post_id != post.id:
+            raise ValidationError({'parent': 'Parent comment belongs to a different post'})
+
         comment = serializer.save(user=self.request.user, post=post)
+        if parent is not None:
+            sharded.increment(Comment, parent.id, 'replies_count')
 
         # Update post's comment count
-        post.comments_count += 1
-        post.save()
+        sharded.increment(Post, post.id, 'comments_count')
+        feed_cache.bump_post(post.id)
 
 
 class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -131,11 +237,25 @@ class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     def perform_destroy(self, instance):
         # Update post's comment count
-        instance.post.comments_count -= 1
-        instance.post.save()
+        sharded.decrement(Post, instance.post_id, 'comments_count')
+        feed_cache.bump_post(instance.post_id)
+        if instance.parent_id:
+            sharded.decrement(Comment, instance.parent_id, 'replies_count')
         instance.delete()
 
 
+class CommentRepliesView(CommentThreadMixin, generics.ListAPIView):
+    """Page through the direct replies of a comment (load more replies)"""
+    serializer_class = CommentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return Comment.objects.filter(
+            parent_id=self.kwargs.get('comment_id')
+        ).select_related('user').order_by('-created_at')
+
+
 class LikeCommentView(APIView):
     """Like or unlike a comment"""
     permission_classes = [permissions.IsAuthenticated]
@@ -156,15 +276,13 @@ class LikeCommentView(APIView):
 
         if not created:
             like.delete()
-            comment.likes_count -= 1
-            comment.save()
+            sharded.decrement(Comment, comment.id, 'likes_count')
             return Response(
                 {'message': 'Comment unliked', 'liked': False},
                 status=status.HTTP_200_OK
             )
         else:
-            comment.likes_count += 1
-            comment.save()
+            sharded.increment(Comment, comment.id, 'likes_count')
             return Response(
                 {'message': 'Comment liked', 'liked': True},
                 status=status.HTTP_201_CREATED
@@ -9,14 +9,21 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_backend.settings')
 django_asgi_app = get_asgi_application()
 
 # Import routing after Django setup
+from chat.middleware import JWTAuthMiddleware
+from friends import graph
 from .routing import websocket_urlpatterns
 
+# Build the friend graph in the background before requests need it
+graph.warm()
+
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AllowedHostsOriginValidator(
         AuthMiddlewareStack(
-            URLRouter(websocket_urlpatterns)
+            JWTAuthMiddleware(
+                URLRouter(websocket_urlpatterns)
+            )
         )
     ),
 })
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""
+Serializer-free read path for large list endpoints.
+
+Views using FastListMixin fetch only the columns they render with .values()
+(joined rows included) and build response dicts directly, skipping
+ModelSerializer instantiation and field introspection. The builders format
+every value exactly like the serializers they replace, so the rendered JSON is
+byte-for-byte identical; set FAST_LIST_RESPONSES = False to go back to the
+serializers.
+"""
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.response import Response
+from .renditions import rendition_urls
+
+datetime_field = serializers.DateTimeField()
+
+USER_MINIMAL_FIELDS = ('id', 'username', 'profile_picture', 'profile_picture_renditions', 'is_verified')
+
+
+def format_datetime(value):
+    return datetime_field.to_representation(value)
+
+
+def file_url(field, name, request):
+    """Same output as FileField/ImageField serializer fields for a stored name"""
+    if not name:
+        return None
+    url = field.storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def user_minimal_columns(prefix):
+    return [f'{prefix}__{field}' for field in USER_MINIMAL_FIELDS]
+
+
+def user_minimal(row, prefix, request, profile_picture_field):
+    """Same output as UserMinimalSerializer for a joined user"""
+    return {
+        'id': row[f'{prefix}__id'],
+        'username': row[f'{prefix}__username'],
+        'profile_picture': file_url(profile_picture_field, row[f'{prefix}__profile_picture'], request),
+        'profile_picture_renditions': rendition_urls(
+            profile_picture_field, row[f'{prefix}__profile_picture_renditions'], request
+        ),
+        'is_verified': row[f'{prefix}__is_verified'],
+    }
+
+
+class FastListMixin:
+    """List view mixin that renders rows from .values() instead of serializers"""
+    fast_columns = ()
+
+    def build_fast_data(self, rows):
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        if not settings.FAST_LIST_RESPONSES:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).values(*self.fast_columns)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.build_fast_data(page))
+        return Response(self.build_fast_data(list(queryset)))
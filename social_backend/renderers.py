@@ -0,0 +1,30 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer producing the same bytes as DRF's, encoded with orjson.
+
+    Only the compact, non-ASCII-escaped form DRF uses by default goes through
+    orjson; pretty-printed output (e.g. the browsable API) and anything orjson
+    cannot encode fall back to the standard renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        if self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same strict javascript subset escaping as JSONRenderer
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
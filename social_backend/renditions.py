@@ -0,0 +1,147 @@
+"""
+Image rendition pipeline.
+
+After an upload is committed, schedule() hands the image to a small thread
+pool that writes a fixed set of downscaled renditions (WebP plus a JPEG
+fallback) next to the original and records their storage names in the
+model's `<field>_renditions` JSON column. The upload request never waits for
+Pillow; until the renditions exist the map is empty and clients keep using
+the original. Renditions of a replaced or removed image are deleted from
+storage once they are no longer referenced.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# name -> (max width/height in px, crop to a square)
+RENDITIONS = {
+    'thumbnail': (150, True),
+    'feed': (1080, False),
+    'full': (2048, False),
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_RENDITION_WORKERS,
+            thread_name_prefix='renditions'
+        )
+    return _executor
+
+
+def schedule(instance, field_name):
+    """Generate renditions for instance.<field_name> once the current transaction commits"""
+    file = getattr(instance, field_name)
+    renditions_field = f'{field_name}_renditions'
+    model, pk = type(instance), instance.pk
+    previous = getattr(instance, renditions_field) or {}
+    if previous:
+        # Drop renditions of the previous image right away; clients fall back to the original
+        model.objects.filter(pk=pk).update(**{renditions_field: {}})
+        setattr(instance, renditions_field, {})
+
+    if not file:
+        if previous:
+            storage = model._meta.get_field(field_name).storage
+            transaction.on_commit(lambda: delete_files(storage, previous))
+        return
+
+    name = file.name
+    if settings.IMAGE_RENDITIONS_ASYNC:
+        transaction.on_commit(lambda: get_executor().submit(run, model, pk, field_name, name, previous))
+    else:
+        transaction.on_commit(lambda: generate_for(model, pk, field_name, name, previous))
+
+
+def run(model, pk, field_name, name, previous=None):
+    close_old_connections()
+    try:
+        generate_for(model, pk, field_name, name, previous)
+    except Exception:
+        logger.exception('Rendition generation failed for %s %s.%s', model._meta.label, pk, field_name)
+    finally:
+        close_old_connections()
+
+
+def generate_for(model, pk, field_name, name, previous=None):
+    field = model._meta.get_field(field_name)
+    renditions = generate(field.storage, name)
+    # Only record the renditions if the image was not replaced meanwhile
+    if not model.objects.filter(pk=pk, **{field_name: name}).update(**{f'{field_name}_renditions': renditions}):
+        delete_files(field.storage, renditions)
+    # The previous image's set is superseded either way
+    delete_files(field.storage, previous or {})
+    return renditions
+
+
+def delete_files(storage, renditions):
+    """Delete every file of a `<field>_renditions` map from storage"""
+    for names in renditions.values():
+        for name in names.values():
+            try:
+                storage.delete(name)
+            except Exception:
+                logger.exception('Deleting rendition %s failed', name)
+
+
+def render(image, size, crop, image_format, options):
+    if crop:
+        image = ImageOps.fit(image, (size, size))
+    else:
+        image = image.copy()
+        image.thumbnail((size, size))
+
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    output = io.BytesIO()
+    image.save(output, image_format, **options)
+    return output.getvalue()
+
+
+def generate(storage, name):
+    """Write every rendition of a stored image; returns {rendition: {format: storage name}}"""
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    base, _ = os.path.splitext(name)
+    renditions = {}
+    for rendition, (size, crop) in RENDITIONS.items():
+        renditions[rendition] = {}
+        for extension, (image_format, options) in FORMATS.items():
+            content = render(image, size, crop, image_format, options)
+            renditions[rendition][extension] = storage.save(
+                f'renditions/{base}/{rendition}.{extension}',
+                ContentFile(content)
+            )
+    return renditions
+
+
+def rendition_urls(field, renditions, request):
+    """Absolute URL map for a `<field>_renditions` value, formatted like FileField URLs"""
+    urls = {}
+    for rendition, names in (renditions or {}).items():
+        urls[rendition] = {}
+        for extension, name in names.items():
+            url = field.storage.url(name)
+            urls[rendition][extension] = request.build_absolute_uri(url) if request is not None else url
+    return urls
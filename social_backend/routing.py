@@ -2,5 +2,6 @@ from django.urls import path
 from chat import consumers
 
 websocket_urlpatterns = [
+    path('ws/chat/', consumers.UserConsumer.as_asgi()),
     path('ws/chat/<int:room_id>/', consumers.ChatConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -38,6 +38,8 @@ INSTALLED_APPS = [
     'posts',
     'friends',
     'chat',
+    'counters',
+    'uploads',
 ]
 
 MIDDLEWARE = [
@@ -117,6 +119,16 @@ if CLOUDINARY_URL:
     }
     DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
+# Image renditions (thumbnail/feed/full, generated off the request thread)
+IMAGE_RENDITIONS_ASYNC = True
+IMAGE_RENDITION_WORKERS = 2
+
+# Resumable chunked uploads
+CHUNKED_UPLOAD_TEMP_DIR = BASE_DIR / 'chunked_uploads'
+CHUNKED_UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024
+CHUNKED_UPLOAD_EXPIRY = timedelta(days=1)  # Unfinished sessions older than this are purged
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -128,10 +140,63 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'social_backend.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
 
+# Home timeline (fan-out on write)
+TIMELINE_MAX_LENGTH = 500  # Entries kept per user; older ones are trimmed as new ones arrive
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10000  # Above this, posts are merged in at read time instead
+
+# Feed response cache
+FEED_CACHE_PAGES = 3  # Only the first pages of each feed are cached
+FEED_CACHE_TIMEOUT = 300
+
+# Sharded engagement counters (run `flush_counters --interval 10` as a worker, see README)
+COUNTER_SHARDS = 8
+
+# Presence (accounts.presence): online until PRESENCE_TTL seconds after the last heartbeat.
+# Kept in the default cache, which must be shared (REDIS_URL) when DEBUG is off
+PRESENCE_TTL = 60
+PRESENCE_FLUSH_SECONDS = 30  # last_seen reaches the users table in batches this often
+PRESENCE_LAST_SEEN_TIMEOUT = 7 * 24 * 3600
+
+# Build list responses from .values() rows instead of serializers (see social_backend.fastpath)
+FAST_LIST_RESPONSES = config('FAST_LIST_RESPONSES', default=True, cast=bool)
+
+# Post search: queries matching more posts than this rank only the newest ones
+POST_SEARCH_MAX_CANDIDATES = 5000
+
+# User typeahead: matches ranked per query, and the rank bonus for the viewer's friends
+USER_SEARCH_MAX_CANDIDATES = 200
+USER_SEARCH_FRIEND_BOOST = 2
+
+# In-memory friend graph: reload from the database after this many seconds or overlay changes
+FRIEND_GRAPH_MAX_AGE = 300
+FRIEND_GRAPH_MAX_PENDING = 10000
+
+# "People you may know": suggestions kept per user and worker processes for the batch job
+FRIEND_SUGGESTIONS_TOP_K = 20
+FRIEND_SUGGESTIONS_WORKERS = 4
+
+# Bulk follow/unfollow and contact import: most user IDs or contact hashes per request
+BULK_FOLLOW_MAX_IDS = 1000
+
+# Chat write-behind (see chat.writer): broadcast messages first and persist them in batches.
+# A crash loses at most the unflushed buffer; MAX_PENDING bounds it by making senders wait.
+CHAT_WRITE_BEHIND = config('CHAT_WRITE_BEHIND', default=False, cast=bool)
+CHAT_WRITE_BEHIND_FLUSH_MS = config('CHAT_WRITE_BEHIND_FLUSH_MS', default=50, cast=int)
+CHAT_WRITE_BEHIND_BATCH_SIZE = config('CHAT_WRITE_BEHIND_BATCH_SIZE', default=500, cast=int)
+CHAT_WRITE_BEHIND_MAX_PENDING = config('CHAT_WRITE_BEHIND_MAX_PENDING', default=5000, cast=int)
+# Snowflake message IDs (see chat.snowflake): each process leases its own worker ID (0-1023) from the
+# database. Set CHAT_WORKER_ID only to pin one, and then to a different value in every process
+CHAT_WORKER_ID = config('CHAT_WORKER_ID', default=None, cast=lambda value: None if value in (None, '') else int(value))
+CHAT_WORKER_LEASE_SECONDS = config('CHAT_WORKER_LEASE_SECONDS', default=600, cast=int)
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
@@ -176,6 +241,15 @@ if 'DATABASE_URL' in os.environ:
         conn_health_checks=True,
     )
 
+# Shared cache for production (feed cache, versions, metrics and presence); locmem otherwise
+if 'REDIS_URL' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+
 # Production security settings
 if not DEBUG:
     # Allowed hosts - UPDATED
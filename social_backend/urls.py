@@ -11,6 +11,7 @@ urlpatterns = [
     path('api/posts/', include('posts.urls')),
     path('api/friends/', include('friends.urls')),
     path('api/chat/', include('chat.urls')),
+    path('api/uploads/', include('uploads.urls')),
 ]
 
 # Serve media files in development
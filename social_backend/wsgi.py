@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_backend.settings')
 
 application = get_wsgi_application()
+
+# Build the friend graph in the background before requests need it
+from friends import graph  # noqa: E402
+
+graph.warm()
@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import UploadSession
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'target', 'object_id', 'filename', 'received_bytes', 'total_size', 'status', 'created_at']
+    list_filter = ['target', 'status', 'created_at']
+    search_fields = ['user__username', 'filename']
+    ordering = ['-created_at']
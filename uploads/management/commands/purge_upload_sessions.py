@@ -0,0 +1,27 @@
+import glob
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from uploads.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Deletes unfinished upload sessions older than CHUNKED_UPLOAD_EXPIRY and their part files'
+
+    def handle(self, *args, **options):
+        expired = UploadSession.objects.filter(
+            status='uploading',
+            updated_at__lt=timezone.now() - settings.CHUNKED_UPLOAD_EXPIRY
+        )
+        count = 0
+        for session in expired.iterator():
+            # The part file and any chunk scratch files left by a crashed request
+            for path in [session.part_path, *glob.glob(f'{glob.escape(session.part_path)}.*')]:
+                if os.path.exists(path):
+                    os.remove(path)
+            session.delete()
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Purged {count} expired upload sessions'))
@@ -0,0 +1,49 @@
+import os
+
+from django.conf import settings
+from django.db import models
+
+
+class UploadSession(models.Model):
+    """Resumable chunked upload of a Post video or a chat Message file"""
+    TARGET_CHOICES = (
+        ('post_video', 'Post video'),
+        ('message_file', 'Message file'),
+    )
+    STATUS_CHOICES = (
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    target = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    object_id = models.BigIntegerField()  # Post or Message the file is attached to
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    chunk_size = models.IntegerField()
+    checksum = models.CharField(max_length=64, blank=True)  # SHA-256 of the whole file, optional
+
+    received_chunks = models.IntegerField(default=0)
+    received_bytes = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploading')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.filename}) by {self.user.username}"
+
+    @property
+    def total_chunks(self):
+        return -(-self.total_size // self.chunk_size)
+
+    @property
+    def part_path(self):
+        return os.path.join(settings.CHUNKED_UPLOAD_TEMP_DIR, f'{self.id}.part')
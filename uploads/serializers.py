@@ -0,0 +1,31 @@
+from django.conf import settings
+from rest_framework import serializers
+from .models import UploadSession
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer for UploadSession model"""
+    total_chunks = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'target', 'object_id', 'filename', 'total_size', 'checksum',
+            'chunk_size', 'total_chunks', 'received_chunks', 'received_bytes',
+            'status', 'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'chunk_size', 'received_chunks', 'received_bytes',
+            'status', 'created_at', 'updated_at'
+        ]
+
+    def validate_total_size(self, value):
+        if value <= 0 or value > settings.CHUNKED_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f'Size must be between 1 and {settings.CHUNKED_UPLOAD_MAX_SIZE} bytes')
+        return value
+
+    def validate_checksum(self, value):
+        value = value.lower()
+        if value and (len(value) != 64 or any(c not in '0123456789abcdef' for c in value)):
+            raise serializers.ValidationError('Checksum must be a SHA-256 hex digest')
+        return value
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase
+from rest_framework.test import APIClient
+from accounts.models import User
+from posts.models import Post
+
+
+class ChunkedUploadTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = self.settings(
+            MEDIA_ROOT=f'{directory}/media',
+            CHUNKED_UPLOAD_TEMP_DIR=f'{directory}/parts',
+            CHUNKED_UPLOAD_CHUNK_SIZE=4
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username='author', email='author@example.com', password='pass1234')
+        self.post = Post.objects.create(user=self.user, caption='Video')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def put_chunk(self, upload_id, index, data, checksum=None):
+        return self.client.generic(
+            'PUT',
+            f'/api/uploads/{upload_id}/chunks/{index}/',
+            data,
+            content_type='application/octet-stream',
+            HTTP_X_CHUNK_CHECKSUM=checksum or hashlib.sha256(data).hexdigest()
+        )
+
+    def test_resumable_upload_attaches_file_to_post(self):
+        content = b'0123456789'
+        response = self.client.post('/api/uploads/', {
+            'target': 'post_video',
+            'object_id': self.post.id,
+            'filename': 'clip.mp4',
+            'total_size': len(content),
+            'checksum': hashlib.sha256(content).hexdigest(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.data['id']
+        self.assertEqual(response.data['total_chunks'], 3)
+
+        self.assertEqual(self.put_chunk(upload_id, 0, content[:4]).status_code, 200)
+        self.assertEqual(self.put_chunk(upload_id, 2, content[8:]).status_code, 409)
+        self.assertEqual(self.put_chunk(upload_id, 1, content[4:8], checksum='0' * 64).status_code, 400)
+
+        # Resume from the server's view of progress
+        progress = self.client.get(f'/api/uploads/{upload_id}/').data
+        self.assertEqual((progress['received_chunks'], progress['received_bytes']), (1, 4))
+        self.put_chunk(upload_id, 1, content[4:8])
+        self.put_chunk(upload_id, 2, content[8:])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'complete')
+        self.assertFalse(os.listdir(settings.CHUNKED_UPLOAD_TEMP_DIR))
+        self.assertEqual(self.client.post(f'/api/uploads/{upload_id}/complete/').status_code, 404)
+        self.assertEqual(self.put_chunk(upload_id, 2, content[8:]).status_code, 404)
+
+        self.post.refresh_from_db()
+        with self.post.video.open('rb') as video:
+            self.assertEqual(video.read(), content)
+
+    def test_cannot_target_someone_elses_post(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass1234')
+        self.client.force_authenticate(other)
+        response = self.client.post('/api/uploads/', {
+            'target': 'post_video',
+            'object_id': self.post.id,
+            'filename': 'clip.mp4',
+            'total_size': 10,
+        }, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_repeated_chunk_is_stored_once(self):
+        response = self.client.post('/api/uploads/', {
+            'target': 'post_video',
+            'object_id': self.post.id,
+            'filename': 'clip.mp4',
+            'total_size': 8,
+        }, format='json')
+        upload_id = response.data['id']
+
+        for _ in range(2):
+            response = self.put_chunk(upload_id, 0, b'0123')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['received_chunks'], response.data['received_bytes']), (1, 4))
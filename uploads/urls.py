@@ -0,0 +1,14 @@
+from django.urls import path
+from .views import (
+    UploadSessionCreateView,
+    UploadSessionDetailView,
+    UploadChunkView,
+    UploadCompleteView
+)
+
+urlpatterns = [
+    path('', UploadSessionCreateView.as_view(), name='upload-create'),
+    path('<int:upload_id>/', UploadSessionDetailView.as_view(), name='upload-detail'),
+    path('<int:upload_id>/chunks/<int:index>/', UploadChunkView.as_view(), name='upload-chunk'),
+    path('<int:upload_id>/complete/', UploadCompleteView.as_view(), name='upload-complete'),
+]
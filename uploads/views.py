@@ -0,0 +1,223 @@
+import hashlib
+import os
+import shutil
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from rest_framework import status, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from chat.models import Message
+from posts import feed_cache
+from posts.models import Post
+from .models import UploadSession
+from .serializers import UploadSessionSerializer
+
+# target -> (model, file field, owner field)
+TARGETS = {
+    'post_video': (Post, 'video', 'user'),
+    'message_file': (Message, 'file', 'sender'),
+}
+READ_BLOCK_SIZE = 64 * 1024
+
+
+def get_session(request, upload_id, lock=False):
+    sessions = UploadSession.objects.select_for_update() if lock else UploadSession.objects
+    try:
+        return sessions.get(id=upload_id, user=request.user)
+    except UploadSession.DoesNotExist:
+        return None
+
+
+class UploadSessionCreateView(APIView):
+    """Start a resumable upload for a post video or a message file"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = UploadSessionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        model, _, owner_field = TARGETS[serializer.validated_data['target']]
+        if not model.objects.filter(
+            id=serializer.validated_data['object_id'],
+            **{owner_field: request.user}
+        ).exists():
+            return Response(
+                {'error': 'Target not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        session = serializer.save(user=request.user, chunk_size=settings.CHUNKED_UPLOAD_CHUNK_SIZE)
+        os.makedirs(settings.CHUNKED_UPLOAD_TEMP_DIR, exist_ok=True)
+        open(session.part_path, 'wb').close()
+
+        return Response(
+            UploadSessionSerializer(session).data,
+            status=status.HTTP_201_CREATED
+        )
+
+
+class UploadSessionDetailView(APIView):
+    """Upload progress, used by clients to resume after a dropped connection"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, upload_id):
+        session = get_session(request, upload_id)
+        if session is None:
+            return Response(
+                {'error': 'Upload not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_200_OK)
+
+
+class UploadChunkView(APIView):
+    """
+    Append one chunk, sent as the raw request body.
+
+    Chunks must arrive in order. The body is streamed to a scratch file and
+    checked against the X-Chunk-Checksum header (SHA-256 hex, required) before
+    the session is touched, so memory use does not depend on the chunk or file
+    size and a bad or short body changes nothing and can simply be resent.
+
+    Only appending the verified chunk to the part file and advancing the
+    session happen under the session's row lock, so a slow client never holds
+    it, and a duplicate request for the same chunk (a client retrying after a
+    timeout) finds it already stored instead of appending it twice.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = []
+
+    def put(self, request, upload_id, index):
+        session = get_session(request, upload_id)
+        response = self.check_index(session, index)
+        if response is not None:
+            return response
+
+        checksum = request.headers.get('X-Chunk-Checksum', '').lower()
+        if not checksum:
+            return Response(
+                {'error': 'X-Chunk-Checksum header is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        expected_size = min(session.chunk_size, session.total_size - session.received_bytes)
+        chunk_path = f'{session.part_path}.{uuid.uuid4().hex}'
+        try:
+            digest = hashlib.sha256()
+            written = 0
+            with open(chunk_path, 'wb') as chunk:
+                while written <= expected_size:
+                    block = request.stream.read(READ_BLOCK_SIZE) if request.stream else b''
+                    if not block:
+                        break
+                    chunk.write(block)
+                    digest.update(block)
+                    written += len(block)
+
+            if written != expected_size or digest.hexdigest() != checksum:
+                return Response(
+                    {'error': f'Chunk rejected: expected {expected_size} bytes matching X-Chunk-Checksum'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            with transaction.atomic():
+                session = get_session(request, upload_id, lock=True)
+                # Checked again under the lock: a duplicate may have stored this chunk meanwhile
+                response = self.check_index(session, index)
+                if response is not None:
+                    return response
+
+                with open(chunk_path, 'rb') as chunk, open(session.part_path, 'r+b') as part:
+                    part.seek(session.received_bytes)
+                    part.truncate()
+                    shutil.copyfileobj(chunk, part, READ_BLOCK_SIZE)
+                session.received_chunks += 1
+                session.received_bytes += written
+                session.save(update_fields=['received_chunks', 'received_bytes', 'updated_at'])
+        finally:
+            if os.path.exists(chunk_path):
+                os.remove(chunk_path)
+
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_200_OK)
+
+    def check_index(self, session, index):
+        """The response for a chunk that cannot be appended now, or None"""
+        if session is None or session.status != 'uploading':
+            return Response(
+                {'error': 'Upload not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if index < session.received_chunks:
+            # Already stored, e.g. a retry after the response was lost
+            return Response(UploadSessionSerializer(session).data, status=status.HTTP_200_OK)
+        if index != session.received_chunks or index >= session.total_chunks:
+            return Response(
+                {'error': f'Expected chunk {session.received_chunks}'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return None
+
+
+class UploadCompleteView(APIView):
+    """
+    Verify the assembled file and attach it to its post or message.
+
+    Runs under the session's row lock, so a concurrent chunk or a second
+    completion waits and then finds the session complete; the part file is
+    only removed once that is committed.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, upload_id):
+        with transaction.atomic():
+            return self.complete(request, get_session(request, upload_id, lock=True))
+
+    def complete(self, request, session):
+        if session is None or session.status != 'uploading':
+            return Response(
+                {'error': 'Upload not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        if session.received_bytes != session.total_size:
+            return Response(
+                {'error': f'Upload incomplete: {session.received_bytes} of {session.total_size} bytes received'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        model, field_name, owner_field = TARGETS[session.target]
+        try:
+            instance = model.objects.get(id=session.object_id, **{owner_field: request.user})
+        except model.DoesNotExist:
+            return Response(
+                {'error': 'Target not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        with open(session.part_path, 'rb') as part:
+            if session.checksum:
+                digest = hashlib.sha256()
+                for block in iter(lambda: part.read(READ_BLOCK_SIZE), b''):
+                    digest.update(block)
+                if digest.hexdigest() != session.checksum:
+                    return Response(
+                        {'error': 'File checksum mismatch'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                part.seek(0)
+
+            # Storage backends copy File objects chunk by chunk
+            getattr(instance, field_name).save(session.filename, File(part), save=False)
+        instance.save(update_fields=[field_name])
+
+        session.status = 'complete'
+        session.save(update_fields=['status', 'updated_at'])
+        part_path = session.part_path
+        transaction.on_commit(lambda: os.remove(part_path))
+        if model is Post:
+            transaction.on_commit(lambda: feed_cache.bump_post(instance.id))
+
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_200_OK)